@@ -1,19 +1,29 @@
+import time
+_import_started = time.perf_counter()
+
 from flask import Flask
 from flask_sqlalchemy import SQLAlchemy
 from flask_login import LoginManager
 from flask_migrate import Migrate
 from flask_mail import Mail
 from flask_wtf.csrf import CSRFProtect
+from werkzeug.middleware.proxy_fix import ProxyFix
+from app import sqlite_profile, startup
+from app.replica import RoutingSession, replica_router
+from app.perf import slow_query_log, sql_profiler
+from app.metrics import metrics
 import os
 
 # Initialize extensions
-db = SQLAlchemy()
+db = SQLAlchemy(session_options={'class_': RoutingSession})
 login_manager = LoginManager()
 migrate = Migrate()
 mail = Mail()
 csrf = CSRFProtect()
 
 def create_app():
+    timer = startup.StartupTimer(_import_started)
+    timer.mark('imports')
     app = Flask(__name__)
     
     # Configuration
@@ -36,6 +46,52 @@ def create_app():
     app.config['SQLALCHEMY_DATABASE_URI'] = database_url
     app.config['SQLALCHEMY_TRACK_MODIFICATIONS'] = False
     
+    # SQLite tuning - "production" enables WAL, busy_timeout and friends
+    app.config['SQLITE_PROFILE'] = os.environ.get('SQLITE_PROFILE', 'default')
+    app.config['SQLITE_BUSY_TIMEOUT'] = int(os.environ.get('SQLITE_BUSY_TIMEOUT', 5000))  # ms
+    app.config['SQLITE_MMAP_SIZE'] = int(os.environ.get('SQLITE_MMAP_SIZE', 256 * 1024 * 1024))
+    app.config['SQLITE_CACHE_SIZE'] = int(os.environ.get('SQLITE_CACHE_SIZE', -64000))  # negative = KiB
+    app.config['SQLITE_POOL_SIZE'] = int(os.environ.get('SQLITE_POOL_SIZE', 5))
+    app.config['SQLITE_MAX_OVERFLOW'] = int(os.environ.get('SQLITE_MAX_OVERFLOW', 10))
+    sqlite_profile.configure_engine_options(app)
+    
+    # Read replica for catalog pages and reports (REPLICA_ENDPOINTS are fnmatch patterns)
+    app.config['REPLICA_DATABASE_URL'] = os.environ.get('REPLICA_DATABASE_URL')
+    app.config['REPLICA_ENDPOINTS'] = os.environ.get('REPLICA_ENDPOINTS', 'main.*,admin.reports')
+    app.config['REPLICA_READ_YOUR_WRITES'] = float(os.environ.get('REPLICA_READ_YOUR_WRITES', 5))
+    app.config['REPLICA_MAX_LAG'] = float(os.environ.get('REPLICA_MAX_LAG', 10))
+    app.config['REPLICA_LAG_CHECK_INTERVAL'] = float(os.environ.get('REPLICA_LAG_CHECK_INTERVAL', 2))
+    replica_router.configure(app)
+    
+    # Production relies on Alembic migrations (run by deploy.py) instead of
+    # create_all on every worker boot
+    production = os.environ.get('FLASK_ENV') == 'production'
+    app.config['DB_CREATE_ALL'] = os.environ.get('DB_CREATE_ALL', str(not production)).lower() == 'true'
+    # Per-request SQL profiling shown on /admin/perf (adds a little overhead)
+    app.config['SQL_PROFILING'] = os.environ.get('SQL_PROFILING', 'False').lower() == 'true'
+    app.config['SQL_PROFILING_BUFFER_SIZE'] = int(os.environ.get('SQL_PROFILING_BUFFER_SIZE', 500))
+    app.config['SQL_PROFILING_REPEAT_THRESHOLD'] = int(os.environ.get('SQL_PROFILING_REPEAT_THRESHOLD', 3))
+    # Slow statements (with EXPLAIN output) on /admin/perf; a shared file covers all workers
+    app.config['SLOW_QUERY_LOG'] = os.environ.get('SLOW_QUERY_LOG', 'True').lower() == 'true'
+    app.config['SLOW_QUERY_THRESHOLD_MS'] = float(os.environ.get('SLOW_QUERY_THRESHOLD_MS', 250))
+    app.config['SLOW_QUERY_LOG_SIZE'] = int(os.environ.get('SLOW_QUERY_LOG_SIZE', 500))
+    app.config['SLOW_QUERY_LOG_FILE'] = os.environ.get('SLOW_QUERY_LOG_FILE')
+    app.config['SLOW_QUERY_LOG_MAX_BYTES'] = int(os.environ.get('SLOW_QUERY_LOG_MAX_BYTES', 5 * 1024 * 1024))
+    
+    # Prometheus metrics on /metrics; set METRICS_MULTIPROC_DIR with several workers
+    app.config['METRICS_ENABLED'] = os.environ.get('METRICS_ENABLED', 'True').lower() == 'true'
+    app.config['METRICS_MULTIPROC_DIR'] = os.environ.get('METRICS_MULTIPROC_DIR')
+    app.config['METRICS_FLUSH_INTERVAL'] = float(os.environ.get('METRICS_FLUSH_INTERVAL', 5))
+    # Scrapes need the METRICS_TOKEN bearer token or an address in METRICS_ALLOW (networks)
+    app.config['METRICS_TOKEN'] = os.environ.get('METRICS_TOKEN')
+    app.config['METRICS_ALLOW'] = os.environ.get('METRICS_ALLOW', '127.0.0.1,::1')
+    
+    app.config['STARTUP_REPORT'] = os.environ.get('STARTUP_REPORT', 'False').lower() == 'true'
+    # Compiled templates shared by all workers; deploy.py fills it, '' disables. Kept
+    # under the instance folder - a shared /tmp path could be pre-created by another user
+    app.config['JINJA_BYTECODE_CACHE_DIR'] = os.environ.get(
+        'JINJA_BYTECODE_CACHE_DIR', os.path.join(app.instance_path, 'jinja-cache'))
+    
     # Email configuration - Use environment variables for production
     app.config['MAIL_SERVER'] = os.environ.get('MAIL_SERVER', 'smtp.gmail.com')
     app.config['MAIL_PORT'] = int(os.environ.get('MAIL_PORT', 587))
@@ -52,18 +108,138 @@ def create_app():
     app.config['UPLOAD_FOLDER'] = upload_folder
     os.makedirs(upload_folder, exist_ok=True)
     
+    # Password hashing and login throttling
+    app.config['PASSWORD_HASH_METHOD'] = os.environ.get('PASSWORD_HASH_METHOD', 'scrypt:32768:8:1')
+    app.config['LOGIN_HASH_WORKERS'] = int(os.environ.get('LOGIN_HASH_WORKERS', 2))
+    app.config['LOGIN_HASH_QUEUE'] = int(os.environ.get('LOGIN_HASH_QUEUE', 8))
+    app.config['LOGIN_IP_BURST'] = int(os.environ.get('LOGIN_IP_BURST', 20))
+    app.config['LOGIN_IP_PER_MINUTE'] = float(os.environ.get('LOGIN_IP_PER_MINUTE', 10))
+    app.config['LOGIN_EMAIL_BURST'] = int(os.environ.get('LOGIN_EMAIL_BURST', 5))
+    app.config['LOGIN_EMAIL_PER_MINUTE'] = float(os.environ.get('LOGIN_EMAIL_PER_MINUTE', 2))
+    # Proxies in front of the app whose X-Forwarded-For/-Proto to trust (1 on Render), so
+    # login throttling sees the client's address rather than the proxy's; 0 trusts none
+    app.config['PROXY_FIX_X_FOR'] = int(os.environ.get('PROXY_FIX_X_FOR', 0))
+    app.config['PROXY_FIX_X_PROTO'] = int(os.environ.get('PROXY_FIX_X_PROTO', app.config['PROXY_FIX_X_FOR']))
+    if app.config['PROXY_FIX_X_FOR'] or app.config['PROXY_FIX_X_PROTO']:
+        app.wsgi_app = ProxyFix(app.wsgi_app, x_for=app.config['PROXY_FIX_X_FOR'],
+                                x_proto=app.config['PROXY_FIX_X_PROTO'])
+    
+    # User cache for Flask-Login's user_loader (TTL in seconds, 0 disables)
+    app.config['USER_CACHE_TTL'] = int(os.environ.get('USER_CACHE_TTL', 30))
+    app.config['USER_CACHE_SIZE'] = int(os.environ.get('USER_CACHE_SIZE', 1024))
+    
+    # Rendered product cards etc. ({% cache %}); FRAGMENT_CACHE_DIR shares them between workers
+    app.config['FRAGMENT_CACHE_ENABLED'] = os.environ.get('FRAGMENT_CACHE_ENABLED', 'True').lower() == 'true'
+    app.config['FRAGMENT_CACHE_MAX_BYTES'] = int(os.environ.get('FRAGMENT_CACHE_MAX_BYTES', 16 * 1024 * 1024))
+    app.config['FRAGMENT_CACHE_DIR'] = os.environ.get('FRAGMENT_CACHE_DIR')
+    app.config['FRAGMENT_CACHE_DIR_MAX_BYTES'] = int(os.environ.get('FRAGMENT_CACHE_DIR_MAX_BYTES', 256 * 1024 * 1024))
+    
+    # gzip/brotli (brotli needs the optional `brotli` package)
+    app.config['COMPRESS_ENABLED'] = os.environ.get('COMPRESS_ENABLED', 'True').lower() == 'true'
+    app.config['COMPRESS_LEVEL'] = int(os.environ.get('COMPRESS_LEVEL', 6))
+    app.config['COMPRESS_BROTLI_LEVEL'] = int(os.environ.get('COMPRESS_BROTLI_LEVEL', 4))
+    app.config['COMPRESS_MIN_SIZE'] = int(os.environ.get('COMPRESS_MIN_SIZE', 500))  # bytes
+    
+    # In-memory catalog snapshot for /products and /api/products
+    app.config['CATALOG_SNAPSHOT'] = os.environ.get('CATALOG_SNAPSHOT', 'True').lower() == 'true'
+    app.config['CATALOG_REFRESH_INTERVAL'] = float(os.environ.get('CATALOG_REFRESH_INTERVAL', 5))  # seconds
+    # Share one memory-mapped snapshot file between all workers on the host
+    app.config['CATALOG_FILE'] = os.environ.get('CATALOG_FILE')
+    app.config['CATALOG_FILE_CHECK_INTERVAL'] = float(os.environ.get('CATALOG_FILE_CHECK_INTERVAL', 1))  # seconds
+    
+    # Best-selling sort: scores halve every half-life (decay_popularity.py runs the decay)
+    app.config['POPULARITY_HALF_LIFE_DAYS'] = float(os.environ.get('POPULARITY_HALF_LIFE_DAYS', 7))
+    app.config['POPULARITY_DECAY_INTERVAL_HOURS'] = float(os.environ.get('POPULARITY_DECAY_INTERVAL_HOURS', 24))
+    
+    # archive_orders.py moves finished orders out of the hot tables
+    app.config['ORDER_ARCHIVE_AFTER_DAYS'] = float(os.environ.get('ORDER_ARCHIVE_AFTER_DAYS', 90))
+    app.config['ORDER_ARCHIVE_CHUNK_SIZE'] = int(os.environ.get('ORDER_ARCHIVE_CHUNK_SIZE', 1000))
+    
+    # compact_inventory.py folds the stock ledger into snapshots
+    app.config['INVENTORY_COMPACT_GRACE_SECONDS'] = float(os.environ.get('INVENTORY_COMPACT_GRACE_SECONDS', 60))
+    app.config['INVENTORY_COMPACT_CHUNK_SIZE'] = int(os.environ.get('INVENTORY_COMPACT_CHUNK_SIZE', 1000))
+    
+    # Bulk CSV import on /farmer/products/import; images are fetched in the background
+    app.config['PRODUCT_IMPORT_CHUNK_SIZE'] = int(os.environ.get('PRODUCT_IMPORT_CHUNK_SIZE', 500))  # rows per transaction
+    app.config['PRODUCT_IMPORT_MAX_ERRORS'] = int(os.environ.get('PRODUCT_IMPORT_MAX_ERRORS', 1000))  # rows listed in the report
+    app.config['IMAGE_IMPORT_WORKERS'] = int(os.environ.get('IMAGE_IMPORT_WORKERS', 2))
+    app.config['IMAGE_IMPORT_TIMEOUT'] = float(os.environ.get('IMAGE_IMPORT_TIMEOUT', 10))  # seconds
+    app.config['IMAGE_IMPORT_MAX_BYTES'] = int(os.environ.get('IMAGE_IMPORT_MAX_BYTES', 5 * 1024 * 1024))
+    
+    # Admission control: per-worker request slots by route priority, with some kept for checkout
+    app.config['ADMISSION_ENABLED'] = os.environ.get('ADMISSION_ENABLED', 'True').lower() == 'true'
+    app.config['ADMISSION_CAPACITY'] = capacity = int(os.environ.get('ADMISSION_CAPACITY', 16))  # concurrent requests per worker
+    app.config['ADMISSION_RESERVED'] = int(os.environ.get('ADMISSION_RESERVED', max(capacity // 4, 1)))  # slots only critical routes may take
+    app.config['ADMISSION_LOW_LIMIT'] = int(os.environ.get('ADMISSION_LOW_LIMIT', max(capacity // 2, 1)))  # most slots browsing may hold
+    app.config['ADMISSION_CRITICAL_WAIT'] = float(os.environ.get('ADMISSION_CRITICAL_WAIT', 5))  # seconds
+    app.config['ADMISSION_NORMAL_WAIT'] = float(os.environ.get('ADMISSION_NORMAL_WAIT', 0.5))  # seconds
+    app.config['ADMISSION_RETRY_AFTER'] = int(os.environ.get('ADMISSION_RETRY_AFTER', 5))  # seconds
+    app.config['ADMISSION_CRITICAL_ENDPOINTS'] = os.environ.get(
+        'ADMISSION_CRITICAL_ENDPOINTS', 'orders.checkout,orders.update_order_status')
+    app.config['ADMISSION_LOW_ENDPOINTS'] = os.environ.get(
+        'ADMISSION_LOW_ENDPOINTS', 'main.index,main.products,main.search,main.api_products,main.product_detail')
+    app.config['ADMISSION_EXEMPT_ENDPOINTS'] = os.environ.get(
+        'ADMISSION_EXEMPT_ENDPOINTS', 'static,main.health_check,main.metrics_endpoint,orders.order_stream')
+    
+    # Cache warm-up run by deploy.py and by each gunicorn worker before it takes traffic (0 disables)
+    app.config['WARMUP_BUDGET_SECONDS'] = float(os.environ.get('WARMUP_BUDGET_SECONDS', 20))
+    
+    # Live order status over server-sent events (/api/orders/stream)
+    app.config['ORDER_EVENTS_ENABLED'] = os.environ.get('ORDER_EVENTS_ENABLED', 'True').lower() == 'true'
+    app.config['ORDER_EVENTS_POLL_INTERVAL'] = float(os.environ.get('ORDER_EVENTS_POLL_INTERVAL', 1))  # seconds
+    app.config['ORDER_EVENTS_RETENTION'] = int(os.environ.get('ORDER_EVENTS_RETENTION', 3600))  # seconds
+    app.config['ORDER_STREAM_KEEPALIVE'] = float(os.environ.get('ORDER_STREAM_KEEPALIVE', 15))  # seconds
+    app.config['ORDER_STREAM_MAX_AGE'] = float(os.environ.get('ORDER_STREAM_MAX_AGE', 300))  # seconds
+    app.config['ORDER_STREAM_MAX_CONNECTIONS'] = int(os.environ.get('ORDER_STREAM_MAX_CONNECTIONS', 1000))  # per worker
+    
+    timer.mark('config')
+    
     # Initialize extensions with app
     db.init_app(app)
+    with app.app_context():
+        for engine in db.engines.values():
+            sqlite_profile.init_app(app, engine)
+        sql_profiler.init_app(app, *db.engines.values())
+        slow_query_log.init_app(app, *db.engines.values())
+        metrics.init_app(app, *db.engines.values())
+        replica_router.init_app(app, db)
     login_manager.init_app(app)
     migrate.init_app(app, db)
     mail.init_app(app)
     csrf.init_app(app)
     
+    from app.user_cache import user_cache
+    user_cache.init_app(app)
+    
+    from app.login_security import hash_pool, login_throttle
+    hash_pool.init_app(app)
+    login_throttle.init_app(app)
+    
+    from app.fragment_cache import fragment_cache
+    fragment_cache.init_app(app)
+    
+    from app.compression import compressor
+    compressor.init_app(app)
+    
+    from app.admission import admission
+    admission.init_app(app)
+    
+    from app.catalog import catalog
+    catalog.init_app(app, db)
+    
+    from app.order_events import order_events
+    order_events.init_app(app, db)
+    
+    from app.images import image_importer
+    image_importer.init_app(app, db)
+    
     # Configure login manager
     login_manager.login_view = 'auth.login'
     login_manager.login_message = 'Please log in to access this page.'
     login_manager.login_message_category = 'info'
     
+    timer.mark('extensions')
+    
     # Import and register blueprints
     from app.routes.auth import auth_bp
     from app.routes.products import products_bp
@@ -76,12 +252,19 @@ def create_app():
     app.register_blueprint(orders_bp)
     app.register_blueprint(admin_bp)
     app.register_blueprint(main_bp)
+    admission.check_endpoints(app)
     
     # Import models to ensure they are registered with SQLAlchemy
-    from app.models import User, Product, Order, OrderItem
+    from app.models import User, Product, Order, OrderItem, OrderEvent, ArchivedOrder, ArchivedOrderItem, InventoryMovement, InventorySnapshot
+    timer.mark('blueprints')
     
     # Create database tables
-    with app.app_context():
-        db.create_all()
+    if app.config['DB_CREATE_ALL']:
+        with app.app_context():
+            db.create_all()
+        timer.mark('create_all')
+    
+    startup.configure_template_cache(app)
+    startup.init_app(app, timer)
     
     return app 
\ No newline at end of file
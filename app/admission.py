@@ -0,0 +1,149 @@
+from flask import g, render_template, request
+from fnmatch import fnmatchcase
+from app.fast_json import json_response
+from app.metrics import metrics
+import threading
+import time
+
+CRITICAL, NORMAL, LOW = 'critical', 'normal', 'low'
+
+class AdmissionControl:
+    """Per-worker concurrency limits by route priority.
+    
+    Every request takes a slot from a shared pool of `capacity`. The last
+    `reserved` slots are only handed to critical requests (checkout, order
+    status), and low-priority browsing may hold at most `low_limit` slots,
+    so a burst of /products traffic can't starve checkout. When there is no
+    slot, low-priority requests are turned away at once with a 503 and
+    Retry-After; normal and critical requests wait up to their class's
+    timeout for one.
+    """
+    
+    def __init__(self):
+        self.enabled = False
+        self.capacity = 16
+        self.reserved = 4
+        self.low_limit = 8
+        self.waits = {CRITICAL: 5.0, NORMAL: 0.5, LOW: 0.0}
+        self.retry_after = 5
+        self.patterns = {CRITICAL: [], LOW: []}
+        self.exempt = []
+        self.in_flight = {CRITICAL: 0, NORMAL: 0, LOW: 0}
+        self._total = 0
+        self._slot_freed = threading.Condition()
+        self._classes = {}  # endpoint -> class
+        self._busy_page = None
+    
+    def init_app(self, app):
+        self.enabled = app.config['ADMISSION_ENABLED']
+        self.capacity = app.config['ADMISSION_CAPACITY']
+        self.reserved = min(app.config['ADMISSION_RESERVED'], self.capacity - 1)
+        self.low_limit = app.config['ADMISSION_LOW_LIMIT']
+        self.waits = {CRITICAL: app.config['ADMISSION_CRITICAL_WAIT'], NORMAL: app.config['ADMISSION_NORMAL_WAIT'],
+                      LOW: 0.0}
+        self.retry_after = app.config['ADMISSION_RETRY_AFTER']
+        self.patterns = {CRITICAL: _split(app.config['ADMISSION_CRITICAL_ENDPOINTS']),
+                         LOW: _split(app.config['ADMISSION_LOW_ENDPOINTS'])}
+        self.exempt = _split(app.config['ADMISSION_EXEMPT_ENDPOINTS'])
+        self._classes = {}
+        self._busy_page = None
+        if not self.enabled:
+            return
+        
+        @app.before_request
+        def admit_request():
+            priority = self.classify(request.endpoint)
+            if priority is None:
+                return None
+            if not self.acquire(priority):
+                return self.shed(priority)
+            g.admission_class = priority
+        
+        @app.teardown_request
+        def release_request(exc):
+            priority = g.pop('admission_class', None)
+            if priority is not None:
+                self.release(priority)
+    
+    def check_endpoints(self, app):
+        """Fail on endpoint patterns that match no route; call once the blueprints are registered"""
+        if not self.enabled:
+            return
+        endpoints = {rule.endpoint for rule in app.url_map.iter_rules()}
+        for setting, patterns in (('ADMISSION_EXEMPT_ENDPOINTS', self.exempt),
+                                  ('ADMISSION_CRITICAL_ENDPOINTS', self.patterns[CRITICAL]),
+                                  ('ADMISSION_LOW_ENDPOINTS', self.patterns[LOW])):
+            for pattern in patterns:
+                if not any(fnmatchcase(endpoint, pattern) for endpoint in endpoints):
+                    raise ValueError(f"{setting}: {pattern!r} matches no endpoint")
+    
+    def classify(self, endpoint):
+        """The priority class of an endpoint, or None if it bypasses admission"""
+        if endpoint is None:
+            return None
+        priority = self._classes.get(endpoint, '')
+        if priority == '':
+            if any(fnmatchcase(endpoint, pattern) for pattern in self.exempt):
+                priority = None
+            elif any(fnmatchcase(endpoint, pattern) for pattern in self.patterns[CRITICAL]):
+                priority = CRITICAL
+            elif any(fnmatchcase(endpoint, pattern) for pattern in self.patterns[LOW]):
+                priority = LOW
+            else:
+                priority = NORMAL
+            self._classes[endpoint] = priority
+        return priority
+    
+    def _has_slot(self, priority):
+        if priority == CRITICAL:
+            return self._total < self.capacity
+        if self._total >= self.capacity - self.reserved:
+            return False
+        return priority != LOW or self.in_flight[LOW] < self.low_limit
+    
+    def acquire(self, priority):
+        """Take a slot for a request of this class, waiting up to its timeout; False if none came free"""
+        with self._slot_freed:
+            if not self._has_slot(priority):
+                wait = self.waits[priority]
+                if wait <= 0:
+                    return False
+                metrics.inc('admission_queue_depth', priority=priority)
+                try:
+                    deadline = time.monotonic() + wait
+                    while not self._has_slot(priority):
+                        remaining = deadline - time.monotonic()
+                        if remaining <= 0:
+                            return False
+                        self._slot_freed.wait(remaining)
+                finally:
+                    metrics.dec('admission_queue_depth', priority=priority)
+            self._total += 1
+            self.in_flight[priority] += 1
+        metrics.inc('admission_in_flight', priority=priority)
+        return True
+    
+    def release(self, priority):
+        with self._slot_freed:
+            self._total -= 1
+            self.in_flight[priority] -= 1
+            self._slot_freed.notify_all()
+        metrics.dec('admission_in_flight', priority=priority)
+    
+    def shed(self, priority):
+        """The fast 503 for a request turned away"""
+        metrics.inc('admission_shed_total', priority=priority, endpoint=request.endpoint)
+        headers = {'Retry-After': str(self.retry_after), 'Cache-Control': 'no-store'}
+        if request.path.startswith('/api/') or not request.accept_mimetypes.accept_html:
+            response = json_response({'success': False, 'message': 'Busy, please retry shortly'}, 503)
+            response.headers.update(headers)
+            return response
+        if self._busy_page is None:
+            # Rendered once; it holds nothing user-specific
+            self._busy_page = render_template('busy.html', retry_after=self.retry_after)
+        return self._busy_page, 503, headers
+
+def _split(patterns):
+    return [p.strip() for p in patterns.split(',') if p.strip()]
+
+admission = AdmissionControl()
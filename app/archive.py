@@ -0,0 +1,65 @@
+from datetime import datetime, timedelta
+from sqlalchemy import delete, insert, literal, select, union_all
+from app.models import ArchivedOrder, ArchivedOrderItem, Order, OrderItem, OrderStatus
+
+# Orders in these states never change again
+ARCHIVED_STATUSES = (OrderStatus.COMPLETED, OrderStatus.CANCELLED)
+
+def archive_orders(engine, older_than_days, chunk_size=1000, limit=None):
+    """Move finished orders last updated more than older_than_days ago, with
+    their items, into the archive tables.
+    
+    Each chunk is copied and deleted in its own transaction, so the job can
+    be stopped at any point and readers never see an order in both places
+    or neither. Returns the number of orders moved.
+    """
+    cutoff = datetime.utcnow() - timedelta(days=older_than_days)
+    order_columns = [c.name for c in Order.__table__.columns]
+    item_columns = [c.name for c in OrderItem.__table__.columns]
+    moved = 0
+    while limit is None or moved < limit:
+        size = chunk_size if limit is None else min(chunk_size, limit - moved)
+        with engine.begin() as conn:
+            # order and order_item are AUTOINCREMENT tables, so the ids moved
+            # out are never reused
+            ids = conn.execute(select(Order.id).where(
+                Order.status.in_(ARCHIVED_STATUSES),
+                Order.updated_at < cutoff
+            ).order_by(Order.id).limit(size).with_for_update()).scalars().all()
+            if not ids:
+                break
+            now = datetime.utcnow()
+            conn.execute(insert(ArchivedOrder).from_select(
+                order_columns + ['archived_at'],
+                select(*[Order.__table__.c[name] for name in order_columns], literal(now)).where(Order.id.in_(ids))))
+            conn.execute(insert(ArchivedOrderItem).from_select(
+                item_columns,
+                select(*[OrderItem.__table__.c[name] for name in item_columns]).where(OrderItem.order_id.in_(ids))))
+            conn.execute(delete(OrderItem).where(OrderItem.order_id.in_(ids)))
+            conn.execute(delete(Order).where(Order.id.in_(ids)))
+        moved += len(ids)
+    return moved
+
+def get_order(order_id, *options):
+    """The order with this id, from the order table or else the archive.
+    
+    Loader options apply to the order table query only.
+    """
+    order = Order.query.options(*options).filter_by(id=order_id).first()
+    if order is None:
+        order = ArchivedOrder.query.filter_by(id=order_id).first()
+    return order
+
+def all_orders():
+    """Live and archived orders as one selectable, for reports"""
+    return union_all(*[
+        select(model.id, model.buyer_id, model.farmer_id, model.status, model.total_price, model.created_at)
+        for model in (Order, ArchivedOrder)
+    ]).subquery('all_orders')
+
+def all_order_items():
+    """Live and archived order items as one selectable, for reports"""
+    return union_all(*[
+        select(model.id, model.order_id, model.product_id, model.quantity, model.price)
+        for model in (OrderItem, ArchivedOrderItem)
+    ]).subquery('all_order_items')
@@ -0,0 +1,480 @@
+from bisect import bisect_left, bisect_right
+from datetime import datetime, timedelta
+from sqlalchemy import case, event, func, inspect, or_, select
+import math
+import threading
+import time
+
+NO_CATEGORY = 0xFFFFFFFF
+
+# Rows updated this long before the last seen updated_at are re-read on
+# refresh, covering transactions that committed out of timestamp order
+PATCH_OVERLAP = timedelta(seconds=60)
+
+# Product columns a local commit must change to be applied before the next
+# read; stock and popularity changes (every checkout) wait for the periodic
+# refresh instead
+CATALOG_COLUMNS = ('name', 'description', 'price', 'unit', 'organic', 'image', 'category', 'available',
+                   'created_at', 'farmer_id')
+
+# Fields /api/products can return (?fields=), and the ones it returns by default
+API_FIELDS = ('id', 'name', 'description', 'price', 'unit', 'organic', 'category', 'image',
+              'farmer_name', 'location')
+DEFAULT_API_FIELDS = ('id', 'name', 'price', 'image', 'farmer_name', 'location')
+
+def product_api_dict(product):
+    """All API_FIELDS for a Product or ProductRecord"""
+    return {
+        'id': product.id,
+        'name': product.name,
+        'description': product.description,
+        'price': product.price,
+        'unit': product.unit,
+        'organic': bool(product.organic),
+        'category': product.category,
+        'image': product.image,
+        'farmer_name': product.farmer.username,
+        'location': product.farmer.location,
+    }
+
+class FarmerRecord:
+    __slots__ = ('id', 'username', 'location', 'is_approved', 'cache_version', 'location_lower')
+    
+    def __init__(self, id, username, location, is_approved, cache_version):
+        self.id = id
+        self.username = username
+        self.location = location
+        self.is_approved = is_approved
+        self.cache_version = cache_version
+        self.location_lower = (location or '').lower()
+
+class ProductRecord:
+    """Read-only copy of a visible product, shaped like Product for templates"""
+    
+    __slots__ = ('id', 'name', 'description', 'price', 'unit', 'organic', 'image', 'category',
+                 'created_at', 'updated_at', 'popularity_score', 'farmer_id', 'farmer', 'search_text',
+                 '_api_dict')
+    
+    def __init__(self, row, farmer):
+        self.id = row.id
+        self.name = row.name
+        self.description = row.description
+        self.price = row.price
+        self.unit = row.unit
+        self.organic = bool(row.organic)
+        self.image = row.image
+        self.category = row.category
+        self.created_at = row.created_at
+        self.updated_at = row.updated_at
+        self.popularity_score = row.popularity_score or 0.0
+        self.farmer_id = row.farmer_id
+        self.farmer = farmer
+        self.search_text = f'{row.name or ""}\x00{row.description or ""}'.lower()
+        self._api_dict = None
+    
+    def api_dict(self):
+        # Built once per record and reused by every API response
+        if self._api_dict is None:
+            self._api_dict = product_api_dict(self)
+        return self._api_dict
+    
+    def index_key(self):
+        # Fields the snapshot's indexes depend on, but for popularity_score,
+        # which changes with every sale - the popular order is re-sorted on
+        # its own (see CatalogSnapshot.replace)
+        return (self.name, self.price, self.category, self.organic, self.created_at)
+
+class Page:
+    """The subset of Flask-SQLAlchemy's Pagination the templates use"""
+    
+    def __init__(self, items, page, per_page, total):
+        self.items = items
+        self.page = page
+        self.per_page = per_page
+        self.total = total
+    
+    @property
+    def pages(self):
+        return max(1, math.ceil(self.total / self.per_page)) if self.per_page else 1
+    
+    @property
+    def has_prev(self):
+        return self.page > 1
+    
+    @property
+    def has_next(self):
+        return self.page < self.pages
+    
+    @property
+    def prev_num(self):
+        return self.page - 1 if self.has_prev else None
+    
+    @property
+    def next_num(self):
+        return self.page + 1 if self.has_next else None
+
+class SnapshotQueries:
+    """Filtering, sorting and pagination shared by the in-memory and mmap snapshots.
+    
+    Subclasses provide `orders` and `ranks` (sort name -> position sequence),
+    `prices` (in price order), `by_category`, `category_index` and the
+    per-position `category_ids` and `organic_flags`, plus `record(i)` and
+    `search_positions(needle, search_location)`.
+    """
+    
+    def query(self, search='', category='', min_price=None, max_price=None, organic=None,
+              sort='id', search_location=False):
+        """Positions of matching records in the requested order"""
+        if sort not in self.orders:
+            sort = 'id'
+        positions, ordered_by = None, 'id'
+        
+        # Start from the narrowest index
+        if min_price is not None or max_price is not None:
+            lo = bisect_left(self.prices, min_price) if min_price is not None else 0
+            hi = bisect_right(self.prices, max_price) if max_price is not None else len(self.prices)
+            positions, ordered_by = self.orders['price_asc'][lo:hi], 'price_asc'
+            if category:
+                category_id = self.category_index.get(category, -1)
+                category_ids = self.category_ids
+                positions = [i for i in positions if category_ids[i] == category_id]
+        elif category:
+            positions = self.by_category.get(category, ())
+        
+        if search:
+            matches = self.search_positions(search.lower(), search_location)
+            if positions is None:
+                positions = matches
+            else:
+                matches = set(matches)
+                positions = [i for i in positions if i in matches]
+        if organic is not None:
+            if positions is None:
+                positions, ordered_by = self.orders[sort], sort
+            organic_flags = self.organic_flags
+            positions = [i for i in positions if bool(organic_flags[i]) == organic]
+        
+        if positions is None:
+            return self.orders[sort]
+        if sort != ordered_by:
+            if sort == 'price_desc' and ordered_by == 'price_asc':
+                positions = positions[::-1]
+            elif sort == 'id':
+                positions = sorted(positions)
+            else:
+                positions = sorted(positions, key=self.ranks[sort].__getitem__)
+        return positions
+    
+    def page(self, positions, page, per_page):
+        page = max(page, 1)
+        start = (page - 1) * per_page
+        items = [self.record(i) for i in positions[start:start + per_page]]
+        return Page(items, page, per_page, len(positions))
+
+class CatalogSnapshot(SnapshotQueries):
+    """Immutable catalog of visible products with category and sort indexes.
+    
+    Never modified after construction - refreshes build a new snapshot and
+    swap the reference, so readers need no locking.
+    """
+    
+    def __init__(self, records, stamp):
+        self.records = tuple(sorted(records, key=lambda r: r.id))
+        self.stamp = stamp
+        self.built_at = datetime.utcnow()
+        records = self.records
+        n = len(records)
+        self.position = {r.id: i for i, r in enumerate(records)}
+        
+        by_category = {}
+        for i, r in enumerate(records):
+            if r.category:
+                by_category.setdefault(r.category, []).append(i)
+        self.by_category = {category: tuple(positions) for category, positions in by_category.items()}
+        self.categories = sorted(self.by_category)
+        self.category_index = {category: k for k, category in enumerate(self.categories)}
+        self.category_ids = [self.category_index.get(r.category, NO_CATEGORY) for r in records]
+        self.organic_flags = [r.organic for r in records]
+        
+        price_order = sorted(range(n), key=lambda i: (records[i].price, records[i].id))
+        self.orders = {
+            'id': range(n),
+            'newest': tuple(sorted(range(n), key=lambda i: (records[i].created_at or datetime.min, records[i].id),
+                                   reverse=True)),
+            'price_asc': tuple(price_order),
+            'price_desc': tuple(reversed(price_order)),
+            'name': tuple(sorted(range(n), key=lambda i: ((records[i].name or '').lower(), records[i].id))),
+        }
+        self.prices = [records[i].price for i in price_order]
+        self.ranks = {sort: _ranks(order) for sort, order in self.orders.items() if sort != 'id'}
+        self._sort_popular()
+    
+    def _sort_popular(self):
+        records = self.records
+        order = tuple(sorted(range(len(records)), key=lambda i: (records[i].popularity_score, records[i].id),
+                             reverse=True))
+        self.orders['popular'] = order
+        self.ranks['popular'] = _ranks(order)
+    
+    def __len__(self):
+        return len(self.records)
+    
+    def record(self, position):
+        return self.records[position]
+    
+    def get(self, product_id):
+        position = self.position.get(product_id)
+        return None if position is None else self.records[position]
+    
+    def search_positions(self, needle, search_location=False):
+        records = self.records
+        return [i for i in range(len(records))
+                if needle in records[i].search_text
+                or (search_location and needle in records[i].farmer.location_lower)]
+    
+    def replace(self, changed, stamp):
+        """New snapshot with records swapped in place (index keys must be unchanged).
+        
+        Sales only change popularity scores, so only the popular order is
+        re-sorted, and only when a score moved; refreshes run at most every
+        refresh interval, which bounds how often that happens.
+        """
+        snapshot = object.__new__(CatalogSnapshot)
+        snapshot.__dict__.update(self.__dict__)
+        records = list(self.records)
+        rescored = False
+        for record in changed:
+            position = self.position[record.id]
+            rescored |= records[position].popularity_score != record.popularity_score
+            records[position] = record
+        snapshot.records = tuple(records)
+        snapshot.stamp = stamp
+        snapshot.built_at = datetime.utcnow()
+        if rescored:
+            snapshot.orders, snapshot.ranks = dict(self.orders), dict(self.ranks)
+            snapshot._sort_popular()
+        return snapshot
+
+def _ranks(order):
+    rank = [0] * len(order)
+    for r, i in enumerate(order):
+        rank[i] = r
+    return rank
+
+class Catalog:
+    """Holds the current CatalogSnapshot and keeps it in step with the database.
+    
+    Commits in this process that touch products or farmers are applied
+    before the next read. Changes made by other workers are picked up by
+    comparing a cheap stamp query every CATALOG_REFRESH_INTERVAL seconds:
+    changed products are patched in, while deleted products or any farmer
+    change trigger a full rebuild.
+    
+    With CATALOG_FILE set, the snapshot lives in a memory-mapped file shared
+    by every worker instead (see app.catalog_file); local changes only mark
+    it dirty for the background builder.
+    """
+    
+    def __init__(self):
+        self.enabled = False
+        self.refresh_interval = 5
+        self._db = None
+        self._snapshot = None
+        self.shared = None
+        self._farmers = {}
+        self._checked_at = 0.0
+        self._dirty_products = set()
+        self._rebuild_pending = False
+        self._lock = threading.Lock()
+    
+    def init_app(self, app, db):
+        self.enabled = app.config['CATALOG_SNAPSHOT']
+        self.refresh_interval = app.config['CATALOG_REFRESH_INTERVAL']
+        self._db = db
+        self._snapshot = None
+        self.shared = None
+        if not self.enabled:
+            return
+        if app.config['CATALOG_FILE']:
+            from app.catalog_file import SharedCatalogFile
+            self.shared = SharedCatalogFile(self, app, app.config['CATALOG_FILE'], self.refresh_interval,
+                                            app.config['CATALOG_FILE_CHECK_INTERVAL'])
+        
+        event.listen(db.session, 'after_flush', self._after_flush)
+        event.listen(db.session, 'do_orm_execute', self._do_orm_execute)
+        event.listen(db.session, 'after_commit', self._after_commit)
+        event.listen(db.session, 'after_rollback', self._after_rollback)
+    
+    def snapshot(self):
+        if self.shared is not None:
+            if self._dirty_products or self._rebuild_pending:
+                self._dirty_products, self._rebuild_pending = set(), False
+                self.shared.mark_dirty()
+            return self.shared.snapshot()
+        
+        if self._snapshot is None:
+            with self._lock:
+                if self._snapshot is None:
+                    # Anything committed so far is part of the first build
+                    self._dirty_products, self._rebuild_pending = set(), False
+                    self._snapshot = self.build_snapshot()
+                    self._checked_at = time.monotonic()
+            return self._snapshot
+        
+        local_changes = self._dirty_products or self._rebuild_pending
+        if local_changes or time.monotonic() - self._checked_at >= self.refresh_interval:
+            # Our own writes are applied before answering; periodic checks are
+            # left to whichever thread gets there first
+            if self._lock.acquire(blocking=bool(local_changes)):
+                try:
+                    self._refresh()
+                finally:
+                    self._lock.release()
+        return self._snapshot
+    
+    def invalidate(self):
+        """Force a full rebuild on the next read"""
+        with self._lock:
+            self._rebuild_pending = True
+    
+    # Loading
+    
+    def _columns(self):
+        from app.models import Product
+        return (Product.id, Product.name, Product.description, Product.price, Product.unit,
+                Product.organic, Product.image, Product.category, Product.available,
+                Product.created_at, Product.updated_at, Product.popularity_score, Product.farmer_id)
+    
+    def _load_farmers(self, conn):
+        from app.models import User, UserRole
+        rows = conn.execute(select(User.id, User.username, User.location, User.is_approved,
+                                   User.cache_version).where(User.role == UserRole.FARMER))
+        return {row.id: FarmerRecord(row.id, row.username, row.location, bool(row.is_approved),
+                                     row.cache_version or 0) for row in rows}
+    
+    def _read_stamp(self, conn):
+        from app.models import Product, User, UserRole
+        products = conn.execute(select(func.count(Product.id), func.max(Product.id),
+                                       func.max(Product.updated_at))).one()
+        farmers = conn.execute(select(func.count(User.id), func.sum(func.coalesce(User.cache_version, 0)),
+                                      func.sum(case((User.is_approved == True, 1), else_=0)))
+                               .where(User.role == UserRole.FARMER)).one()
+        return {'product_count': products[0], 'max_product_id': products[1] or 0,
+                'max_updated_at': products[2], 'farmers': tuple(farmers)}
+    
+    def _visible(self, row, farmers):
+        farmer = farmers.get(row.farmer_id)
+        return bool(row.available) and farmer is not None and farmer.is_approved
+    
+    def read_stamp(self):
+        with self._db.engines[None].connect() as conn:
+            return self._read_stamp(conn)
+    
+    def build_snapshot(self):
+        """A fresh CatalogSnapshot straight from the primary database"""
+        from app.models import Product
+        with self._db.engines[None].connect() as conn:
+            stamp = self._read_stamp(conn)
+            farmers = self._load_farmers(conn)
+            rows = conn.execute(select(*self._columns()).where(Product.available == True))
+            records = [ProductRecord(row, farmers[row.farmer_id]) for row in rows
+                       if self._visible(row, farmers)]
+        self._farmers = farmers
+        return CatalogSnapshot(records, stamp)
+    
+    def _refresh(self):
+        from app.models import Product
+        dirty, self._dirty_products = self._dirty_products, set()
+        rebuild_pending, self._rebuild_pending = self._rebuild_pending, False
+        self._checked_at = time.monotonic()
+        snapshot = self._snapshot
+        old = snapshot.stamp
+        
+        try:
+            with self._db.engines[None].connect() as conn:
+                stamp = self._read_stamp(conn)
+                if rebuild_pending or stamp['farmers'] != old['farmers']:
+                    self._snapshot = self.build_snapshot()
+                    return
+                if not dirty and stamp == old:
+                    return
+                
+                conditions = [Product.id > old['max_product_id']]
+                if dirty:
+                    conditions.append(Product.id.in_(dirty))
+                if old['max_updated_at'] is not None:
+                    conditions.append(Product.updated_at > old['max_updated_at'] - PATCH_OVERLAP)
+                rows = conn.execute(select(*self._columns()).where(or_(*conditions))).all()
+        except Exception as e:
+            print(f"Catalog refresh failed: {e}")
+            self._dirty_products |= dirty
+            self._rebuild_pending |= rebuild_pending
+            return
+        
+        inserted = sum(1 for row in rows if row.id > old['max_product_id'])
+        found = {row.id for row in rows}
+        if stamp['product_count'] != old['product_count'] + inserted or (dirty - found):
+            # Products were deleted
+            self._snapshot = self.build_snapshot()
+            return
+        
+        changed, structural = [], False
+        for row in rows:
+            current = snapshot.get(row.id)
+            if not self._visible(row, self._farmers):
+                structural |= current is not None
+                continue
+            record = ProductRecord(row, self._farmers[row.farmer_id])
+            if current is None or current.index_key() != record.index_key():
+                structural = True
+            changed.append(record)
+        
+        if structural:
+            # Membership or sort keys changed - re-index the patched records
+            records = {r.id: r for r in snapshot.records}
+            for row in rows:
+                records.pop(row.id, None)
+            records.update((r.id, r) for r in changed)
+            self._snapshot = CatalogSnapshot(records.values(), stamp)
+        else:
+            self._snapshot = snapshot.replace(changed, stamp)
+    
+    # Session hooks
+    
+    def _after_flush(self, session, flush_context):
+        from app.models import Product, User, UserRole
+        info = session.info.setdefault('catalog_changes', {'products': set(), 'rebuild': False})
+        dirty = session.dirty
+        for obj in list(session.new) + list(dirty) + list(session.deleted):
+            if isinstance(obj, Product):
+                if obj in dirty and not _changes_catalog(obj):
+                    continue
+                info['products'].add(obj.id)
+            elif isinstance(obj, User) and obj.role == UserRole.FARMER:
+                info['rebuild'] = True
+    
+    def _do_orm_execute(self, orm_execute_state):
+        # Bulk query.update()/delete() never show up in a flush
+        from app.models import Product, User
+        if not (orm_execute_state.is_update or orm_execute_state.is_delete):
+            return
+        mapper = orm_execute_state.bind_mapper
+        if mapper is not None and mapper.class_ in (Product, User):
+            info = orm_execute_state.session.info.setdefault('catalog_changes', {'products': set(), 'rebuild': False})
+            info['rebuild'] = True
+    
+    def _after_commit(self, session):
+        info = session.info.pop('catalog_changes', None)
+        if info:
+            self._dirty_products |= info['products']
+            self._rebuild_pending |= info['rebuild']
+    
+    def _after_rollback(self, session):
+        session.info.pop('catalog_changes', None)
+
+def _changes_catalog(product):
+    # Attribute history is still intact in after_flush
+    attrs = inspect(product).attrs
+    return any(attrs[name].history.has_changes() for name in CATALOG_COLUMNS)
+
+catalog = Catalog()
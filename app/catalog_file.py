@@ -0,0 +1,369 @@
+from bisect import bisect_left, bisect_right
+from collections import namedtuple
+from datetime import datetime, timedelta
+from app.catalog import NO_CATEGORY, FarmerRecord, ProductRecord, SnapshotQueries
+import fcntl
+import json
+import mmap
+import os
+import struct
+import threading
+import time
+
+MAGIC = b'FMCATLG2'
+# magic, generation, metadata length
+HEADER = struct.Struct('<8sQI4x')
+# id, price, farmer, name, description, image, unit (offset + length each),
+# category, created_at, updated_at (microseconds since the epoch), popularity, organic
+RECORD = struct.Struct('<IdIIIIIIIIIIqqdB7x')
+# id, username, location (offset + length each), cache_version, is_approved
+FARMER = struct.Struct('<IIIIIIB3x')
+# name (offset + length), first position in the category array, count
+CATEGORY = struct.Struct('<IIII')
+
+EPOCH = datetime(1970, 1, 1)
+NO_TIME = -(2 ** 63)
+SEARCH_FIELD_SEP = b'\x00'
+SEARCH_LOCATION_SEP = b'\x02'
+SEARCH_RECORD_SEP = b'\x01'
+
+_Row = namedtuple('_Row', 'id name description price unit organic image category '
+                          'created_at updated_at popularity_score farmer_id')
+
+def _micros(value):
+    return NO_TIME if value is None else (value - EPOCH) // timedelta(microseconds=1)
+
+def _datetime(micros):
+    return None if micros == NO_TIME else EPOCH + timedelta(microseconds=micros)
+
+def _align(buffer, size=8):
+    buffer.extend(b'\0' * (-len(buffer) % size))
+
+class _Strings:
+    """Deduplicated UTF-8 string table"""
+    
+    def __init__(self):
+        self.data = bytearray()
+        self._offsets = {}
+    
+    def add(self, text):
+        if not text:
+            return 0, 0
+        encoded = text.encode('utf-8')
+        offset = self._offsets.get(encoded)
+        if offset is None:
+            offset = self._offsets[encoded] = len(self.data)
+            self.data.extend(encoded)
+        return offset, len(encoded)
+
+def write_catalog_file(path, snapshot, generation=None):
+    """Serialize a CatalogSnapshot and atomically replace the file at path"""
+    generation = generation or time.time_ns()
+    records = snapshot.records
+    strings = _Strings()
+    
+    farmers = {}
+    for r in records:
+        farmers.setdefault(r.farmer.id, r.farmer)
+    farmer_list = sorted(farmers.values(), key=lambda f: f.id)
+    farmer_index = {f.id: i for i, f in enumerate(farmer_list)}
+    
+    sections = {}
+    body = bytearray()
+    
+    def section(name, data):
+        _align(body)
+        sections[name] = [len(body), len(data)]
+        body.extend(data)
+    
+    record_data = bytearray()
+    for r in records:
+        record_data += RECORD.pack(
+            r.id, r.price, farmer_index[r.farmer.id],
+            *strings.add(r.name), *strings.add(r.description), *strings.add(r.image), *strings.add(r.unit),
+            snapshot.category_index.get(r.category, NO_CATEGORY),
+            _micros(r.created_at), _micros(r.updated_at), r.popularity_score, 1 if r.organic else 0)
+    section('records', record_data)
+    # Columns the filters scan, kept contiguous so they can be cast without copying
+    section('ids', struct.pack(f'<{len(records)}I', *(r.id for r in records)))
+    section('category_ids', struct.pack(f'<{len(records)}I', *snapshot.category_ids))
+    section('organic', bytes(1 if r.organic else 0 for r in records))
+    
+    farmer_data = bytearray()
+    for f in farmer_list:
+        farmer_data += FARMER.pack(f.id, *strings.add(f.username), *strings.add(f.location),
+                                   f.cache_version or 0, 1 if f.is_approved else 0)
+    section('farmers', farmer_data)
+    
+    category_data, category_positions = bytearray(), []
+    for category in snapshot.categories:
+        positions = snapshot.by_category[category]
+        category_data += CATEGORY.pack(*strings.add(category), len(category_positions), len(positions))
+        category_positions.extend(positions)
+    section('categories', category_data)
+    section('category_positions', struct.pack(f'<{len(category_positions)}I', *category_positions))
+    
+    for sort in ('newest', 'price_asc', 'name', 'popular'):
+        section(f'order_{sort}', struct.pack(f'<{len(records)}I', *snapshot.orders[sort]))
+    for sort in ('newest', 'price_asc', 'price_desc', 'name', 'popular'):
+        section(f'rank_{sort}', struct.pack(f'<{len(records)}I', *snapshot.ranks[sort]))
+    section('prices', struct.pack(f'<{len(records)}d', *snapshot.prices))
+    
+    # Lower-cased "name \0 description \2 location \1" per record, searched with mmap.find
+    search, starts = bytearray(), []
+    for r in records:
+        starts.append(len(search))
+        search += (f'{r.name or ""}\x00{r.description or ""}'.lower().encode('utf-8')
+                   .replace(SEARCH_RECORD_SEP, b' ').replace(SEARCH_LOCATION_SEP, b' '))
+        search += SEARCH_LOCATION_SEP + r.farmer.location_lower.encode('utf-8') + SEARCH_RECORD_SEP
+    section('search_starts', struct.pack(f'<{len(starts)}Q', *starts))
+    section('search', search)
+    section('strings', strings.data)
+    
+    meta = json.dumps({
+        'count': len(records),
+        'farmers': len(farmer_list),
+        'categories': snapshot.categories,
+        'sections': sections,
+        'stamp': snapshot.stamp,
+        'built_at': datetime.utcnow().isoformat(timespec='seconds'),
+    }, default=str).encode('utf-8')
+    header = bytearray(HEADER.pack(MAGIC, generation, len(meta)) + meta)
+    _align(header)
+    
+    tmp_path = f'{path}.{os.getpid()}.tmp'
+    with open(tmp_path, 'wb') as f:
+        f.write(header)
+        f.write(body)
+    os.replace(tmp_path, path)
+    return generation
+
+def read_generation(path):
+    """The generation in the file header, or None if there is no valid file"""
+    try:
+        with open(path, 'rb') as f:
+            magic, generation, _ = HEADER.unpack(f.read(HEADER.size))
+    except (OSError, struct.error):
+        return None
+    return generation if magic == MAGIC else None
+
+class MappedCatalogSnapshot(SnapshotQueries):
+    """Read-only view of a catalog file.
+    
+    The file is mmapped and every index is a memoryview into it, so all
+    workers share the same pages from the OS page cache. Records are only
+    decoded when a page of results is rendered or an id is looked up, and
+    then kept, with their API dict, for as long as this generation is mapped.
+    """
+    
+    def __init__(self, path):
+        with open(path, 'rb') as f:
+            self._mmap = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        magic, self.generation, meta_length = HEADER.unpack_from(self._mmap, 0)
+        if magic != MAGIC:
+            raise ValueError(f'{path} is not a catalog file')
+        meta = json.loads(self._mmap[HEADER.size:HEADER.size + meta_length])
+        self.count = meta['count']
+        self.stamp = meta['stamp']
+        self.built_at = meta['built_at']
+        self.categories = meta['categories']
+        self.category_index = {category: k for k, category in enumerate(self.categories)}
+        base = HEADER.size + meta_length
+        base += -base % 8
+        view = memoryview(self._mmap)
+        self._sections = {name: view[base + offset:base + offset + length]
+                          for name, (offset, length) in meta['sections'].items()}
+        self._strings = self._sections['strings']
+        self._records = self._sections['records']
+        self._search = self._mmap
+        self._search_base = base + meta['sections']['search'][0]
+        self._search_end = self._search_base + meta['sections']['search'][1]
+        self._search_starts = self._sections['search_starts'].cast('Q')
+        
+        n = self.count
+        self.orders = {
+            'id': range(n),
+            'newest': self._sections['order_newest'].cast('I'),
+            'price_asc': self._sections['order_price_asc'].cast('I'),
+            'price_desc': self._sections['order_price_asc'].cast('I')[::-1],
+            'name': self._sections['order_name'].cast('I'),
+            'popular': self._sections['order_popular'].cast('I'),
+        }
+        self.ranks = {
+            'newest': self._sections['rank_newest'].cast('I'),
+            'price_asc': self._sections['rank_price_asc'].cast('I'),
+            'price_desc': self._sections['rank_price_desc'].cast('I'),
+            'name': self._sections['rank_name'].cast('I'),
+            'popular': self._sections['rank_popular'].cast('I'),
+        }
+        self.prices = self._sections['prices'].cast('d')
+        self.category_ids = self._sections['category_ids'].cast('I')
+        self.organic_flags = self._sections['organic']
+        self._ids = self._sections['ids'].cast('I')
+        self._decoded = {}  # position -> ProductRecord
+        
+        positions = self._sections['category_positions'].cast('I')
+        self.by_category = {}
+        for k, category in enumerate(self.categories):
+            _, _, start, length = CATEGORY.unpack_from(self._sections['categories'], k * CATEGORY.size)
+            self.by_category[category] = positions[start:start + length]
+        
+        self._farmers = []
+        for k in range(meta['farmers']):
+            (farmer_id, name_offset, name_length, location_offset, location_length,
+             cache_version, is_approved) = FARMER.unpack_from(self._sections['farmers'], k * FARMER.size)
+            self._farmers.append(FarmerRecord(farmer_id, self._string(name_offset, name_length),
+                                              self._string(location_offset, location_length),
+                                              bool(is_approved), cache_version))
+    
+    def __len__(self):
+        return self.count
+    
+    def _string(self, offset, length):
+        return str(self._strings[offset:offset + length], 'utf-8') if length else None
+    
+    def record(self, position):
+        record = self._decoded.get(position)
+        if record is None:
+            record = self._decoded[position] = self._decode(position)
+        return record
+    
+    def _decode(self, position):
+        (product_id, price, farmer, name_offset, name_length, description_offset, description_length,
+         image_offset, image_length, unit_offset, unit_length, category_id, created_at, updated_at,
+         popularity_score, organic) = RECORD.unpack_from(self._records, position * RECORD.size)
+        farmer = self._farmers[farmer]
+        row = _Row(product_id, self._string(name_offset, name_length),
+                   self._string(description_offset, description_length), price,
+                   self._string(unit_offset, unit_length), bool(organic),
+                   self._string(image_offset, image_length),
+                   self.categories[category_id] if category_id != NO_CATEGORY else None,
+                   _datetime(created_at), _datetime(updated_at), popularity_score, farmer.id)
+        return ProductRecord(row, farmer)
+    
+    def get(self, product_id):
+        # Records are in id order
+        position = bisect_left(self._ids, product_id)
+        if position < self.count and self._ids[position] == product_id:
+            return self.record(position)
+        return None
+    
+    def search_positions(self, needle, search_location=False):
+        needle = needle.encode('utf-8')
+        if not needle or any(sep in needle for sep in (SEARCH_FIELD_SEP, SEARCH_LOCATION_SEP, SEARCH_RECORD_SEP)):
+            return []
+        data, starts, base = self._search, self._search_starts, self._search_base
+        matches = []
+        pos = data.find(needle, base, self._search_end)
+        while pos != -1:
+            # Map the hit back to its record, then skip the rest of that record -
+            # the location comes last, so a hit there means no earlier one
+            position = bisect_right(starts, pos - base) - 1
+            if search_location or pos < data.find(SEARCH_LOCATION_SEP, base + starts[position]):
+                matches.append(position)
+            pos = data.find(needle, data.find(SEARCH_RECORD_SEP, pos) + 1, self._search_end)
+        return matches
+
+class SharedCatalogFile:
+    """Keeps one catalog file per deployment and maps it in every worker.
+    
+    The file is only written by one elected worker, which holds the builder
+    lock. A worker that commits a catalog change marks the file dirty; the
+    builder checks for the mark every check_interval, so a burst of edits
+    costs one rebuild and no request waits for one. Changes made outside
+    the app are picked up by comparing the catalog stamp every
+    refresh_interval. Every worker remaps the file when the generation in
+    its header changes.
+    """
+    
+    def __init__(self, catalog, app, path, refresh_interval, check_interval):
+        self.catalog = catalog
+        self.app = app
+        self.path = path
+        self.refresh_interval = refresh_interval
+        self.check_interval = check_interval
+        self._snapshot = None
+        self._checked_at = 0.0
+        self._lock = threading.Lock()
+        self._builder_pid = None
+        self._dirty_path = path + '.dirty'
+        os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+    
+    def snapshot(self):
+        """The mapped snapshot, remapped if the file has a new generation"""
+        self._start_builder()
+        now = time.monotonic()
+        if self._snapshot is not None and now - self._checked_at < self.check_interval:
+            return self._snapshot
+        with self._lock:
+            if self._snapshot is None or now - self._checked_at >= self.check_interval:
+                self._checked_at = now
+                generation = read_generation(self.path)
+                if generation is None:
+                    self.build()
+                    generation = read_generation(self.path)
+                if self._snapshot is None or self._snapshot.generation != generation:
+                    self._snapshot = MappedCatalogSnapshot(self.path)
+        return self._snapshot
+    
+    def mark_dirty(self):
+        """Have the builder rewrite the file on its next check"""
+        open(self._dirty_path, 'a').close()
+    
+    def _take_dirty(self):
+        try:
+            os.remove(self._dirty_path)
+        except FileNotFoundError:
+            return False
+        return True
+    
+    def build(self, force=False):
+        """Write a new generation if the catalog changed since the current file"""
+        with open(self.path + '.write.lock', 'a') as lock:
+            fcntl.flock(lock, fcntl.LOCK_EX)
+            try:
+                with self.app.app_context():
+                    if not force and read_generation(self.path) is not None:
+                        # Stamps round-trip through JSON in the file header
+                        stamp = json.loads(json.dumps(self.catalog.read_stamp(), default=str))
+                        if MappedCatalogSnapshot(self.path).stamp == stamp:
+                            return False
+                    write_catalog_file(self.path, self.catalog.build_snapshot())
+                    return True
+            finally:
+                fcntl.flock(lock, fcntl.LOCK_UN)
+    
+    def _start_builder(self):
+        # Once per process, after gunicorn forks
+        if self._builder_pid == os.getpid():
+            return
+        with self._lock:
+            if self._builder_pid == os.getpid():
+                return
+            self._builder_pid = os.getpid()
+        threading.Thread(target=self._builder_loop, name='catalog-builder', daemon=True).start()
+    
+    def _builder_loop(self):
+        lock = open(self.path + '.builder.lock', 'a')
+        while True:
+            try:
+                fcntl.flock(lock, fcntl.LOCK_EX | fcntl.LOCK_NB)
+                break
+            except OSError:
+                # Another worker is the builder; take over if it exits
+                time.sleep(self.refresh_interval)
+        
+        checked_at = time.monotonic()
+        while True:
+            time.sleep(self.check_interval)
+            # Taken before building, so a change committed meanwhile is built next time
+            dirty = self._take_dirty()
+            if not dirty and time.monotonic() - checked_at < self.refresh_interval:
+                continue
+            checked_at = time.monotonic()
+            try:
+                self.build(force=dirty)
+            except Exception as e:
+                print(f"Catalog file build failed: {e}")
+                if dirty:
+                    self.mark_dirty()
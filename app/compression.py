@@ -0,0 +1,103 @@
+from flask import request
+import gzip
+import zlib
+
+try:
+    import brotli
+except ImportError:  # optional - `pip install brotli` enables br
+    brotli = None
+
+COMPRESSIBLE_MIMETYPES = {
+    'text/html', 'text/css', 'text/plain', 'text/csv', 'text/xml', 'text/javascript',
+    'application/json', 'application/javascript', 'application/xml', 'image/svg+xml',
+}
+
+class Compressor:
+    """gzip/brotli response compression chosen from Accept-Encoding.
+    
+    Buffered responses smaller than COMPRESS_MIN_SIZE are sent as they are.
+    Streamed responses are compressed chunk by chunk with a sync flush, so a
+    long export still reaches the client as it is generated. Only text-like
+    mimetypes are compressed - images and archives already are.
+    """
+    
+    def __init__(self):
+        self.enabled = True
+        self.level = 6
+        self.brotli_level = 4
+        self.min_size = 500
+        self.mimetypes = COMPRESSIBLE_MIMETYPES
+    
+    def init_app(self, app):
+        self.enabled = app.config['COMPRESS_ENABLED']
+        self.level = app.config['COMPRESS_LEVEL']
+        self.brotli_level = app.config['COMPRESS_BROTLI_LEVEL']
+        self.min_size = app.config['COMPRESS_MIN_SIZE']
+        if not self.enabled:
+            return
+        
+        @app.after_request
+        def compress_response(response):
+            return self.compress(response)
+    
+    def choose_encoding(self):
+        # The client's q-values decide; on a tie the earlier offer (br, then gzip) wins,
+        # and a client that prefers identity gets the body as it is
+        offers = (['br'] if brotli is not None else []) + ['gzip', 'identity']
+        encoding = request.accept_encodings.best_match(offers)
+        return None if encoding == 'identity' else encoding
+    
+    def compress(self, response):
+        if (response.status_code < 200 or response.status_code in (204, 206, 304)
+                or request.method == 'HEAD'
+                or response.direct_passthrough
+                or 'Content-Encoding' in response.headers
+                or response.mimetype not in self.mimetypes):
+            return response
+        response.vary.add('Accept-Encoding')
+        encoding = self.choose_encoding()
+        if encoding is None:
+            return response
+        
+        if response.is_streamed:
+            if response.content_length is not None and response.content_length < self.min_size:
+                return response
+            response.response = self._stream(response.response, encoding)
+            response.headers.pop('Content-Length', None)
+        else:
+            data = response.get_data()
+            if len(data) < self.min_size:
+                return response
+            if encoding == 'br':
+                response.set_data(brotli.compress(data, quality=self.brotli_level))
+            else:
+                response.set_data(gzip.compress(data, compresslevel=self.level, mtime=0))
+        
+        response.headers['Content-Encoding'] = encoding
+        etag, weak = response.get_etag()
+        if etag and not weak:
+            # The compressed body is no longer byte-identical to the original
+            response.set_etag(etag, weak=True)
+        return response
+    
+    def _stream(self, chunks, encoding):
+        if encoding == 'br':
+            compressor = brotli.Compressor(quality=self.brotli_level)
+            for chunk in chunks:
+                if isinstance(chunk, str):
+                    chunk = chunk.encode('utf-8')
+                data = compressor.process(chunk) + compressor.flush()
+                if data:
+                    yield data
+            yield compressor.finish()
+        else:
+            compressor = zlib.compressobj(self.level, zlib.DEFLATED, 16 + zlib.MAX_WBITS)
+            for chunk in chunks:
+                if isinstance(chunk, str):
+                    chunk = chunk.encode('utf-8')
+                data = compressor.compress(chunk) + compressor.flush(zlib.Z_SYNC_FLUSH)
+                if data:
+                    yield data
+            yield compressor.flush()
+
+compressor = Compressor()
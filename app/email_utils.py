@@ -1,12 +1,16 @@
 from flask import current_app, render_template
 from flask_mail import Message
 from app import mail
+from app.metrics import metrics
 from threading import Thread
 
 def send_async_email(app, msg):
     """Send email asynchronously"""
-    with app.app_context():
-        mail.send(msg)
+    try:
+        with app.app_context():
+            mail.send(msg)
+    finally:
+        metrics.dec('email_queue_depth')
 
 def send_email(subject, recipients, template, **kwargs):
     """Send email using template"""
@@ -15,6 +19,7 @@ def send_email(subject, recipients, template, **kwargs):
         msg.html = render_template(f'emails/{template}.html', **kwargs)
         
         # Send email asynchronously
+        metrics.inc('email_queue_depth')
         Thread(target=send_async_email, args=(current_app._get_current_object(), msg)).start()
         return True
     except Exception as e:
@@ -0,0 +1,17 @@
+from flask import current_app
+import json
+
+try:
+    import orjson
+except ImportError:  # optional - `pip install orjson` speeds up the product API
+    orjson = None
+
+def dumps(payload):
+    """Compact JSON bytes, through orjson when it is installed"""
+    if orjson is not None:
+        return orjson.dumps(payload)
+    return json.dumps(payload, separators=(',', ':')).encode('utf-8')
+
+def json_response(payload, status=200):
+    """Like jsonify, without key sorting or pretty-printing"""
+    return current_app.response_class(dumps(payload), status=status, mimetype='application/json')
@@ -0,0 +1,157 @@
+from collections import OrderedDict
+from jinja2 import nodes
+from jinja2.ext import Extension
+from markupsafe import Markup
+from app.metrics import metrics
+import hashlib
+import os
+import threading
+
+class FragmentCache:
+    """Rendered template fragments in a per-process LRU bounded by bytes.
+    
+    Keys are built from whatever makes the fragment change (e.g. a product's
+    id and updated_at), so entries never expire - a changed object simply
+    renders under a new key and the stale entry ages out of the LRU. With
+    FRAGMENT_CACHE_DIR set, fragments are also written to that directory so
+    other workers can pick them up instead of rendering them again.
+    """
+    
+    def __init__(self, max_bytes=16 * 1024 * 1024):
+        self.enabled = True
+        self.max_bytes = max_bytes
+        self.shared_dir = None
+        self.shared_max_bytes = 256 * 1024 * 1024
+        self.size = 0
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+        self._shared_writes = 0
+    
+    def init_app(self, app):
+        self.enabled = app.config['FRAGMENT_CACHE_ENABLED']
+        self.max_bytes = app.config['FRAGMENT_CACHE_MAX_BYTES']
+        self.shared_dir = app.config['FRAGMENT_CACHE_DIR']
+        self.shared_max_bytes = app.config['FRAGMENT_CACHE_DIR_MAX_BYTES']
+        if self.shared_dir:
+            os.makedirs(self.shared_dir, exist_ok=True)
+        self.clear()
+        app.jinja_env.add_extension(FragmentCacheExtension)
+        app.jinja_env.fragment_cache = self
+    
+    def get(self, key):
+        with self._lock:
+            html = self._entries.get(key)
+            if html is not None:
+                self._entries.move_to_end(key)
+                return html
+        if self.shared_dir:
+            html = self._read_shared(key)
+            if html is not None:
+                self._store(key, html)
+            return html
+        return None
+    
+    def set(self, key, html):
+        self._store(key, html)
+        if self.shared_dir:
+            self._write_shared(key, html)
+    
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self.size = 0
+    
+    def __len__(self):
+        return len(self._entries)
+    
+    def _store(self, key, html):
+        size = len(html.encode('utf-8'))
+        if size > self.max_bytes:
+            return
+        with self._lock:
+            previous = self._entries.pop(key, None)
+            if previous is not None:
+                self.size -= len(previous.encode('utf-8'))
+            self._entries[key] = html
+            self.size += size
+            while self.size > self.max_bytes:
+                _, evicted = self._entries.popitem(last=False)
+                self.size -= len(evicted.encode('utf-8'))
+    
+    def _path(self, key):
+        return os.path.join(self.shared_dir, hashlib.sha1(key.encode('utf-8')).hexdigest() + '.html')
+    
+    def _read_shared(self, key):
+        try:
+            with open(self._path(key), encoding='utf-8') as f:
+                return f.read()
+        except OSError:
+            return None
+    
+    def _write_shared(self, key, html):
+        path = self._path(key)
+        tmp_path = f'{path}.{os.getpid()}.{threading.get_ident()}.tmp'
+        try:
+            with open(tmp_path, 'w', encoding='utf-8') as f:
+                f.write(html)
+            os.replace(tmp_path, path)
+        except OSError as e:
+            print(f"Fragment cache write failed: {e}")
+            return
+        self._shared_writes += 1
+        if self._shared_writes % 256 == 0:
+            self._prune_shared()
+    
+    def _prune_shared(self):
+        # Oldest files first until the directory is back under its budget
+        files = []
+        for entry in os.scandir(self.shared_dir):
+            if entry.name.endswith('.html'):
+                try:
+                    stat = entry.stat()
+                except OSError:
+                    continue
+                files.append((stat.st_mtime, stat.st_size, entry.path))
+        total = sum(size for _, size, _ in files)
+        for _, size, path in sorted(files):
+            if total <= self.shared_max_bytes:
+                break
+            try:
+                os.remove(path)
+            except OSError:
+                pass
+            total -= size
+
+class FragmentCacheExtension(Extension):
+    """{% cache key, parts... %}...{% endcache %}
+    
+    The body is rendered once per distinct key and served from the
+    environment's fragment_cache afterwards.
+    """
+    
+    tags = {'cache'}
+    
+    def parse(self, parser):
+        lineno = next(parser.stream).lineno
+        parts = [parser.parse_expression()]
+        while parser.stream.skip_if('comma'):
+            parts.append(parser.parse_expression())
+        body = parser.parse_statements(['name:endcache'], drop_needle=True)
+        return nodes.CallBlock(self.call_method('_render', [nodes.List(parts)]),
+                               [], [], body).set_lineno(lineno)
+    
+    def _render(self, parts, caller):
+        cache = getattr(self.environment, 'fragment_cache', None)
+        if cache is None or not cache.enabled:
+            return caller()
+        key = '\x1f'.join(str(part) for part in parts)
+        html = cache.get(key)
+        if html is None:
+            metrics.inc('fragment_cache_requests_total', result='miss')
+            html = str(caller())
+            cache.set(key, html)
+        else:
+            metrics.inc('fragment_cache_requests_total', result='hit')
+        return Markup(html)
+
+fragment_cache = FragmentCache()
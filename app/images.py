@@ -0,0 +1,190 @@
+from concurrent.futures import ThreadPoolExecutor
+from sqlalchemy import select, update
+from app.metrics import metrics
+import http.client
+import ipaddress
+import os
+import shutil
+import socket
+import threading
+import urllib.parse
+import uuid
+
+ALLOWED_EXTENSIONS = {'png', 'jpg', 'jpeg', 'gif'}
+CONTENT_TYPES = {'image/png': 'png', 'image/jpeg': 'jpg', 'image/gif': 'gif'}
+REDIRECT_STATUSES = {301, 302, 303, 307, 308}
+MAX_REDIRECTS = 3
+
+def resize(filepath):
+    """Shrink an uploaded image in place for the web"""
+    # PIL is imported here to keep it out of worker boot
+    from PIL import Image
+    with Image.open(filepath) as img:
+        img.thumbnail((800, 800))  # Max dimensions
+        img.save(filepath, quality=85, optimize=True)
+
+def public_address(host, port):
+    """An address host resolves to, or raises ValueError if any of them isn't a public one"""
+    try:
+        addresses = [info[4][0] for info in socket.getaddrinfo(host, port, type=socket.SOCK_STREAM)]
+    except socket.gaierror as e:
+        raise ValueError(f"can't resolve {host}: {e}")
+    for address in addresses:
+        ip = ipaddress.ip_address(address.split('%')[0])
+        if ip.version == 6 and ip.ipv4_mapped:
+            ip = ip.ipv4_mapped
+        # Rules out loopback, private, link-local (cloud metadata), shared and reserved ranges
+        if not ip.is_global or ip.is_multicast:
+            raise ValueError(f"{host} resolves to a non-public address")
+    return addresses[0]
+
+class _PinnedHTTPConnection(http.client.HTTPConnection):
+    """Connects to an address checked beforehand instead of resolving the host again"""
+    
+    def __init__(self, host, address, **kwargs):
+        super().__init__(host, **kwargs)
+        self.address = address
+    
+    def connect(self):
+        self.sock = socket.create_connection((self.address, self.port), self.timeout)
+
+class _PinnedHTTPSConnection(http.client.HTTPSConnection):
+    def __init__(self, host, address, **kwargs):
+        super().__init__(host, **kwargs)
+        self.address = address
+    
+    def connect(self):
+        # The certificate is still checked against the host name
+        sock = socket.create_connection((self.address, self.port), self.timeout)
+        self.sock = self._context.wrap_socket(sock, server_hostname=self.host)
+
+class ImageImporter:
+    """Fetches and resizes images for bulk-imported products off the request thread.
+    
+    Jobs run on a small thread pool once the product rows are committed;
+    each one writes the file to UPLOAD_FOLDER, resizes it and points the
+    product at it. A failed image leaves the product without one.
+    """
+    
+    def __init__(self, workers=2, timeout=10, max_bytes=5 * 1024 * 1024):
+        self.workers = workers
+        self.timeout = timeout
+        self.max_bytes = max_bytes
+        self.upload_folder = None
+        self._engine = None
+        self._executor = None
+        self._lock = threading.Lock()
+    
+    def init_app(self, app, db):
+        self.workers = app.config['IMAGE_IMPORT_WORKERS']
+        self.timeout = app.config['IMAGE_IMPORT_TIMEOUT']
+        self.max_bytes = app.config['IMAGE_IMPORT_MAX_BYTES']
+        self.upload_folder = app.config['UPLOAD_FOLDER']
+        with app.app_context():
+            self._engine = db.engines[None]
+    
+    def unique_path(self, name):
+        """A new file path in the upload folder, and the path stored on the product"""
+        unique_filename = f"{uuid.uuid4().hex}_{name}"
+        return os.path.join(self.upload_folder, unique_filename), f"uploads/{unique_filename}"
+    
+    def copy(self, source, name):
+        """Copy an open file (e.g. a zip member) into the upload folder"""
+        filepath, image = self.unique_path(name)
+        with open(filepath, 'wb') as f:
+            shutil.copyfileobj(source, f)
+        return filepath, image
+    
+    def fetch(self, product_id, url):
+        """Download url and use it as the product's image"""
+        self._submit(self._fetch, product_id, url)
+    
+    def attach(self, product_id, filepath, image):
+        """Resize a file already in the upload folder and use it as the product's image"""
+        self._submit(self._attach, product_id, filepath, image)
+    
+    def _submit(self, fn, *args):
+        with self._lock:
+            # Created lazily so the threads are started after gunicorn forks
+            if self._executor is None:
+                self._executor = ThreadPoolExecutor(max_workers=self.workers, thread_name_prefix='image-import')
+            metrics.inc('image_processing_queue_depth')
+            self._executor.submit(self._run, fn, *args)
+    
+    def _run(self, fn, *args):
+        try:
+            fn(*args)
+        except Exception as e:
+            print(f"Image import for product {args[0]} failed: {e}")
+        finally:
+            metrics.dec('image_processing_queue_depth')
+    
+    def _open(self, url):
+        # URLs come from farmers' CSV files, so every hop is checked to point
+        # at a public address, and the connection goes to the address checked
+        for _ in range(MAX_REDIRECTS + 1):
+            parts = urllib.parse.urlsplit(url)
+            if parts.scheme not in ('http', 'https') or not parts.hostname:
+                raise ValueError(f"{url} is not an http(s) URL")
+            port = parts.port or (443 if parts.scheme == 'https' else 80)
+            address = public_address(parts.hostname, port)
+            connection_class = _PinnedHTTPSConnection if parts.scheme == 'https' else _PinnedHTTPConnection
+            connection = connection_class(parts.hostname, address, port=port, timeout=self.timeout)
+            path = (parts.path or '/') + (f'?{parts.query}' if parts.query else '')
+            try:
+                connection.request('GET', path, headers={'Accept': ', '.join(CONTENT_TYPES)})
+                response = connection.getresponse()
+            except Exception:
+                connection.close()
+                raise
+            location = response.getheader('Location')
+            if response.status in REDIRECT_STATUSES and location:
+                connection.close()
+                url = urllib.parse.urljoin(url, location)
+                continue
+            if response.status != 200:
+                connection.close()
+                raise ValueError(f"{url} returned HTTP {response.status}")
+            return connection, response
+        raise ValueError(f"{url} redirected more than {MAX_REDIRECTS} times")
+    
+    def _fetch(self, product_id, url):
+        connection, response = self._open(url)
+        try:
+            extension = CONTENT_TYPES.get(response.headers.get_content_type())
+            if extension is None:
+                raise ValueError(f"{url} is not a PNG, JPEG or GIF image")
+            filepath, image = self.unique_path(f"import.{extension}")
+            with open(filepath, 'wb') as f:
+                copied = 0
+                while chunk := response.read(64 * 1024):
+                    copied += len(chunk)
+                    if copied > self.max_bytes:
+                        break
+                    f.write(chunk)
+        finally:
+            connection.close()
+        if copied > self.max_bytes:
+            os.remove(filepath)
+            raise ValueError(f"{url} is larger than {self.max_bytes} bytes")
+        self._attach(product_id, filepath, image)
+    
+    def _attach(self, product_id, filepath, image):
+        from app.models import Product
+        try:
+            resize(filepath)
+        except Exception:
+            os.remove(filepath)
+            raise
+        with self._engine.begin() as conn:
+            old = conn.execute(select(Product.image).where(Product.id == product_id)).scalar()
+            updated = conn.execute(update(Product).where(Product.id == product_id).values(image=image)).rowcount
+        if not updated:
+            # The product was deleted meanwhile
+            os.remove(filepath)
+        elif old and old != image:
+            old_path = os.path.join(self.upload_folder, old.replace('uploads/', ''))
+            if os.path.exists(old_path):
+                os.remove(old_path)
+
+image_importer = ImageImporter()
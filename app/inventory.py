@@ -0,0 +1,123 @@
+from datetime import datetime, timedelta
+from sqlalchemy import bindparam, func, insert, select, update
+from app.models import InventoryMovement, InventorySnapshot, Product
+
+# InventoryMovement.reason values
+INITIAL = 'initial'
+SALE = 'sale'
+RESTOCK = 'restock'
+ADJUSTMENT = 'adjustment'
+CANCELLATION = 'cancellation'
+
+def append(session, product_id, delta, reason, order_id=None):
+    """Add a movement to the session; it's inserted with the rest of the flush"""
+    if delta:
+        session.add(InventoryMovement(product_id=product_id, delta=delta, reason=reason, order_id=order_id))
+
+def adjust(session, product, delta, reason, order_id=None):
+    """Record a movement and apply it to Product.quantity.
+    
+    The quantity is updated as quantity + delta in SQL, so concurrent
+    checkouts and edits add up instead of overwriting each other.
+    Product.quantity stays the cheap read for pages; the ledger is the
+    record it is reconciled against.
+    """
+    if delta:
+        product.quantity = Product.quantity + delta
+        append(session, product.id, delta, reason, order_id)
+
+def _tail(product_ids=None):
+    # Movements after each product's snapshot, summed per product
+    m, s = InventoryMovement, InventorySnapshot
+    query = (select(m.product_id, func.sum(m.delta).label('delta'))
+             .select_from(m).outerjoin(s, s.product_id == m.product_id)
+             .where(m.id > func.coalesce(s.last_movement_id, 0)))
+    if product_ids is not None:
+        query = query.where(m.product_id.in_(product_ids))
+    return query.group_by(m.product_id)
+
+def stock(conn, product_ids):
+    """Ledger stock per product id: the latest snapshot plus the movements after it.
+    
+    Two indexed queries however long the ledger has grown; what
+    Product.quantity is checked against for a few products, where
+    reconcile() checks them all.
+    """
+    product_ids = list(product_ids)
+    result = dict.fromkeys(product_ids, 0)
+    for product_id, quantity in conn.execute(select(InventorySnapshot.product_id, InventorySnapshot.quantity)
+                                             .where(InventorySnapshot.product_id.in_(product_ids))):
+        result[product_id] = quantity
+    for product_id, delta in conn.execute(_tail(product_ids)):
+        result[product_id] += delta
+    return result
+
+def open_balances(conn):
+    """Snapshot the current quantity of products the ledger has never seen"""
+    m, s = InventoryMovement, InventorySnapshot
+    untracked = select(Product.id, func.coalesce(Product.quantity, 0), 0, func.now()).where(
+        ~select(s.product_id).where(s.product_id == Product.id).exists(),
+        ~select(m.id).where(m.product_id == Product.id).exists())
+    return conn.execute(insert(s).from_select(['product_id', 'quantity', 'last_movement_id', 'taken_at'],
+                                              untracked)).rowcount
+
+def compact(engine, grace_seconds=60, chunk_size=1000):
+    """Fold movements into snapshots so reading stock only sums a short tail.
+    
+    Only a prefix of the ledger is folded: movements from the last
+    grace_seconds, and anything after the first of them, are left for the
+    next run, so a transaction still in flight can't commit a movement
+    behind a snapshot. Movements are kept for history. Returns the number
+    of products compacted and movements folded.
+    """
+    m, s = InventoryMovement, InventorySnapshot
+    with engine.connect() as conn:
+        cutoff = datetime.utcnow() - timedelta(seconds=grace_seconds)
+        first_recent = conn.execute(select(func.min(m.id)).where(m.created_at >= cutoff)).scalar()
+        last_id = first_recent - 1 if first_recent is not None else conn.execute(select(func.max(m.id))).scalar()
+    if not last_id:
+        return 0, 0
+    
+    products = folded = 0
+    while True:
+        with engine.begin() as conn:
+            rows = conn.execute(
+                select(m.product_id, func.sum(m.delta), func.max(m.id), func.count(m.id), s.product_id)
+                .select_from(m).outerjoin(s, s.product_id == m.product_id)
+                .where(m.id > func.coalesce(s.last_movement_id, 0), m.id <= last_id)
+                .group_by(m.product_id, s.product_id).order_by(m.product_id).limit(chunk_size)).all()
+            if not rows:
+                break
+            now = datetime.utcnow()
+            existing = [{'pid': pid, 'delta': delta, 'last': last, 'now': now}
+                        for pid, delta, last, _, snapshot in rows if snapshot is not None]
+            new = [{'product_id': pid, 'quantity': delta, 'last_movement_id': last, 'taken_at': now}
+                   for pid, delta, last, _, snapshot in rows if snapshot is None]
+            if existing:
+                conn.execute(update(s).where(s.product_id == bindparam('pid')).values(
+                    quantity=s.quantity + bindparam('delta'), last_movement_id=bindparam('last'),
+                    taken_at=bindparam('now')), existing)
+            if new:
+                conn.execute(insert(s), new)
+        products += len(rows)
+        folded += sum(count for _, _, _, count, _ in rows)
+    return products, folded
+
+def reconcile(conn, fix=False):
+    """Products whose Product.quantity disagrees with the ledger, as
+    (product id, quantity, ledger stock); with fix, Product.quantity is
+    set to the ledger's value.
+    """
+    s = InventorySnapshot
+    tail = _tail().subquery()
+    ledger = func.coalesce(s.quantity, 0) + func.coalesce(tail.c.delta, 0)
+    mismatches = conn.execute(
+        select(Product.id, Product.quantity, ledger)
+        .outerjoin(s, s.product_id == Product.id)
+        .outerjoin(tail, tail.c.product_id == Product.id)
+        .where(func.coalesce(Product.quantity, 0) != ledger)).all()
+    if fix and mismatches:
+        conn.execute(update(Product).where(Product.id == bindparam('pid')).values(
+            quantity=bindparam('ledger'), updated_at=Product.updated_at),
+            [{'pid': pid, 'ledger': value} for pid, _, value in mismatches])
+    return mismatches
@@ -0,0 +1,128 @@
+from concurrent.futures import ThreadPoolExecutor
+from collections import OrderedDict
+import threading
+import time
+
+class HashPoolBusy(Exception):
+    """Raised when the password hashing pool has no room for another job"""
+
+class HashPool:
+    """Bounded thread pool for password hashing with admission control.
+    
+    At most `workers` hashes run at once and at most `queue_size` more may
+    wait; anything beyond that is rejected immediately instead of tying up
+    the request thread behind a credential-stuffing burst.
+    """
+    
+    def __init__(self, workers=2, queue_size=8, timeout=10):
+        self.workers = workers
+        self.queue_size = queue_size
+        self.timeout = timeout
+        self._executor = None
+        self._slots = None
+        self._lock = threading.Lock()
+    
+    def init_app(self, app):
+        self.workers = app.config.get('LOGIN_HASH_WORKERS', self.workers)
+        self.queue_size = app.config.get('LOGIN_HASH_QUEUE', self.queue_size)
+        self.timeout = app.config.get('LOGIN_HASH_TIMEOUT', self.timeout)
+        self.shutdown()
+    
+    def run(self, fn, *args):
+        """Run fn(*args) on the pool and wait for the result"""
+        executor = self._get_executor()
+        if not self._slots.acquire(blocking=False):
+            raise HashPoolBusy()
+        try:
+            future = executor.submit(fn, *args)
+        except RuntimeError:
+            self._slots.release()
+            raise
+        future.add_done_callback(lambda _: self._slots.release())
+        return future.result(timeout=self.timeout)
+    
+    def shutdown(self):
+        with self._lock:
+            if self._executor is not None:
+                self._executor.shutdown(wait=False)
+            self._executor = None
+    
+    def _get_executor(self):
+        # Created lazily so the threads are started after gunicorn forks
+        with self._lock:
+            if self._executor is None:
+                self._executor = _executor_class()(max_workers=self.workers,
+                                                   thread_name_prefix='password-hash')
+                self._slots = threading.BoundedSemaphore(self.workers + self.queue_size)
+            return self._executor
+
+def _executor_class():
+    # Under gevent's monkey patching the stdlib pool would run hashes in
+    # greenlets and block the whole worker; gevent's own pool always uses
+    # real OS threads and its futures wait cooperatively
+    try:
+        from gevent import monkey
+    except ImportError:
+        return ThreadPoolExecutor
+    if monkey.is_module_patched('threading'):
+        from gevent.threadpool import ThreadPoolExecutor as GeventThreadPoolExecutor
+        return GeventThreadPoolExecutor
+    return ThreadPoolExecutor
+
+class TokenBucketLimiter:
+    """In-memory token buckets keyed by e.g. client IP or email.
+    
+    Each key may spend `burst` attempts at once and regains `per_minute`
+    attempts per minute. Only the `max_keys` most recently seen keys are
+    tracked.
+    """
+    
+    def __init__(self, burst, per_minute, max_keys=10000):
+        self.burst = burst
+        self.per_minute = per_minute
+        self.max_keys = max_keys
+        self._buckets = OrderedDict()
+        self._lock = threading.Lock()
+    
+    def allow(self, key):
+        """Take one token for key, returning False if the bucket is empty"""
+        if not key or self.burst <= 0:
+            return True
+        
+        now = time.monotonic()
+        with self._lock:
+            tokens, updated_at = self._buckets.pop(key, (self.burst, now))
+            tokens = min(self.burst, tokens + (now - updated_at) * self.per_minute / 60.0)
+            allowed = tokens >= 1
+            if allowed:
+                tokens -= 1
+            self._buckets[key] = (tokens, now)
+            while len(self._buckets) > self.max_keys:
+                self._buckets.popitem(last=False)
+            return allowed
+    
+    def clear(self):
+        with self._lock:
+            self._buckets.clear()
+
+class LoginThrottle:
+    """Per-IP and per-email login rate limiting"""
+    
+    def __init__(self):
+        self.by_ip = TokenBucketLimiter(burst=20, per_minute=10)
+        self.by_email = TokenBucketLimiter(burst=5, per_minute=2)
+    
+    def init_app(self, app):
+        self.by_ip = TokenBucketLimiter(app.config.get('LOGIN_IP_BURST', 20),
+                                        app.config.get('LOGIN_IP_PER_MINUTE', 10))
+        self.by_email = TokenBucketLimiter(app.config.get('LOGIN_EMAIL_BURST', 5),
+                                           app.config.get('LOGIN_EMAIL_PER_MINUTE', 2))
+    
+    def allow(self, ip, email):
+        # Spend from both buckets so every attempt counts against each key
+        ip_allowed = self.by_ip.allow(ip)
+        email_allowed = self.by_email.allow(email.strip().lower() if email else email)
+        return ip_allowed and email_allowed
+
+hash_pool = HashPool()
+login_throttle = LoginThrottle()
@@ -0,0 +1,301 @@
+from bisect import bisect_left
+from flask import Response, g, has_request_context, request
+from sqlalchemy import event
+import hmac
+import ipaddress
+import json
+import os
+import threading
+import time
+
+DEFAULT_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+DB_BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 1.0)
+
+# name -> (type, help, buckets)
+METRICS = {
+    'http_requests_total': ('counter', 'HTTP requests by endpoint and status', None),
+    'http_request_duration_seconds': ('histogram', 'HTTP request latency', DEFAULT_BUCKETS),
+    'http_requests_in_flight': ('gauge', 'Requests currently being handled', None),
+    'db_queries_total': ('counter', 'SQL statements executed', None),
+    'db_query_duration_seconds': ('histogram', 'SQL statement latency', DB_BUCKETS),
+    'checkout_outcomes_total': ('counter', 'Checkout attempts by outcome', None),
+    'email_queue_depth': ('gauge', 'E-mails waiting to be sent', None),
+    'image_processing_queue_depth': ('gauge', 'Uploaded images waiting to be processed', None),
+    'product_import_rows_total': ('counter', 'Bulk product import rows by outcome', None),
+    'fragment_cache_requests_total': ('counter', 'Template fragment cache lookups by result', None),
+    'order_streams_open': ('gauge', 'Open /api/orders/stream connections', None),
+    'admission_in_flight': ('gauge', 'Requests holding an admission slot, by priority', None),
+    'admission_queue_depth': ('gauge', 'Requests waiting for an admission slot, by priority', None),
+    'admission_shed_total': ('counter', 'Requests turned away with a 503 by admission control', None),
+}
+
+class _Shard:
+    """Metric values written by a single thread"""
+    
+    __slots__ = ('thread', 'values', 'histograms')
+    
+    def __init__(self, thread=None):
+        self.thread = thread
+        self.values = {}      # (name, labels) -> float, for counters and gauges
+        self.histograms = {}  # (name, labels) -> [bucket counts..., +Inf count, sum]
+
+class MetricsRegistry:
+    """Prometheus-style metrics sharded per thread.
+    
+    Every thread only ever writes to its own shard, so recording a value
+    takes no lock; shards are summed when metrics are scraped. With
+    METRICS_MULTIPROC_DIR set, each process also writes its totals to a file
+    in that directory so /metrics can aggregate across gunicorn workers.
+    """
+    
+    def __init__(self):
+        self.enabled = False
+        self.multiproc_dir = None
+        self.flush_interval = 5
+        self.token = None
+        self.allow = []
+        self._local = threading.local()
+        self._shards = []
+        self._retired = _Shard()
+        self._lock = threading.Lock()
+        self._flusher = None
+        self._flusher_pid = None
+    
+    def init_app(self, app, *engines):
+        self.enabled = app.config['METRICS_ENABLED']
+        self.multiproc_dir = app.config['METRICS_MULTIPROC_DIR']
+        self.flush_interval = app.config['METRICS_FLUSH_INTERVAL']
+        self.token = app.config['METRICS_TOKEN']
+        self.allow = [ipaddress.ip_network(network.strip(), strict=False)
+                      for network in app.config['METRICS_ALLOW'].split(',') if network.strip()]
+        if not self.enabled:
+            return
+        if self.multiproc_dir:
+            os.makedirs(self.multiproc_dir, exist_ok=True)
+        
+        for engine in engines:
+            event.listen(engine, 'before_cursor_execute', self._before_cursor_execute)
+            event.listen(engine, 'after_cursor_execute', self._after_cursor_execute)
+        
+        @app.before_request
+        def start_request_metrics():
+            self._start_flusher()
+            g.metrics_started = time.perf_counter()
+            self.inc('http_requests_in_flight', blueprint=request.blueprint or '')
+        
+        @app.after_request
+        def record_response_status(response):
+            g.metrics_status = response.status_code
+            return response
+        
+        @app.teardown_request
+        def finish_request_metrics(exc):
+            started = g.pop('metrics_started', None)
+            if started is None:
+                return
+            blueprint = request.blueprint or ''
+            endpoint = request.endpoint or 'unknown'
+            status = g.pop('metrics_status', 500)
+            self.dec('http_requests_in_flight', blueprint=blueprint)
+            self.inc('http_requests_total', blueprint=blueprint, endpoint=endpoint,
+                     method=request.method, status=str(status))
+            self.observe('http_request_duration_seconds', time.perf_counter() - started,
+                         blueprint=blueprint, endpoint=endpoint)
+    
+    # Recording
+    
+    def inc(self, name, value=1, **labels):
+        if not self.enabled:
+            return
+        values = self._shard().values
+        key = (name, tuple(sorted(labels.items())))
+        values[key] = values.get(key, 0) + value
+    
+    def dec(self, name, value=1, **labels):
+        self.inc(name, -value, **labels)
+    
+    def observe(self, name, value, **labels):
+        if not self.enabled:
+            return
+        histograms = self._shard().histograms
+        key = (name, tuple(sorted(labels.items())))
+        buckets = METRICS[name][2]
+        counts = histograms.get(key)
+        if counts is None:
+            counts = histograms[key] = [0] * (len(buckets) + 1) + [0.0]
+        counts[bisect_left(buckets, value)] += 1
+        counts[-1] += value
+    
+    # Aggregation
+    
+    def snapshot(self):
+        """Sum all thread shards of this process"""
+        values, histograms = {}, {}
+        with self._lock:
+            alive = []
+            for shard in self._shards:
+                if shard.thread.is_alive():
+                    alive.append(shard)
+                else:
+                    # Fold finished threads so short-lived threads don't pile up
+                    _merge(self._retired.values, self._retired.histograms,
+                           shard.values, shard.histograms)
+            self._shards = alive
+            shards = [self._retired] + alive
+        for shard in shards:
+            _merge(values, histograms, dict(shard.values),
+                   {k: list(v) for k, v in list(shard.histograms.items())})
+        return values, histograms
+    
+    def collect(self):
+        """Totals across all worker processes (or just this one)"""
+        values, histograms = self.snapshot()
+        if not self.multiproc_dir:
+            return values, histograms
+        
+        self._write_snapshot(values, histograms)
+        values, histograms = {}, {}
+        for filename in os.listdir(self.multiproc_dir):
+            if not filename.endswith('.json'):
+                continue
+            try:
+                with open(os.path.join(self.multiproc_dir, filename)) as f:
+                    data = json.load(f)
+            except (OSError, ValueError):
+                continue
+            pid_alive = _pid_alive(data['pid'])
+            file_values = {}
+            for name, labels, value in data['values']:
+                # Gauges of dead workers no longer describe anything
+                if METRICS[name][0] == 'gauge' and not pid_alive:
+                    continue
+                file_values[(name, tuple(map(tuple, labels)))] = value
+            file_histograms = {(name, tuple(map(tuple, labels))): counts
+                               for name, labels, counts in data['histograms']}
+            _merge(values, histograms, file_values, file_histograms)
+        return values, histograms
+    
+    def render(self):
+        """Prometheus text exposition format"""
+        values, histograms = self.collect()
+        lines = []
+        for name, (kind, help_text, buckets) in METRICS.items():
+            lines.append(f'# HELP {name} {help_text}')
+            lines.append(f'# TYPE {name} {kind}')
+            if kind == 'histogram':
+                for (metric, labels), counts in sorted(histograms.items()):
+                    if metric != name:
+                        continue
+                    cumulative = 0
+                    for bound, count in zip(buckets + ('+Inf',), counts):
+                        cumulative += count
+                        le = bound if bound == '+Inf' else repr(float(bound))
+                        lines.append(f'{name}_bucket{_labels(labels + (("le", le),))} {cumulative}')
+                    lines.append(f'{name}_sum{_labels(labels)} {counts[-1]}')
+                    lines.append(f'{name}_count{_labels(labels)} {cumulative}')
+            else:
+                for (metric, labels), value in sorted(values.items()):
+                    if metric == name:
+                        lines.append(f'{name}{_labels(labels)} {value}')
+        return '\n'.join(lines) + '\n'
+    
+    def response(self):
+        if not self._authorized():
+            return Response('Unauthorized\n', status=401, mimetype='text/plain')
+        return Response(self.render(), mimetype='text/plain; version=0.0.4')
+    
+    def _authorized(self):
+        # The METRICS_TOKEN bearer token, or a client in METRICS_ALLOW
+        if self.token:
+            authorization = request.headers.get('Authorization', '').encode('utf-8')
+            if hmac.compare_digest(authorization, f'Bearer {self.token}'.encode('utf-8')):
+                return True
+        try:
+            address = ipaddress.ip_address(request.remote_addr or '')
+        except ValueError:
+            return False
+        return any(address in network for network in self.allow)
+    
+    # Internals
+    
+    def _shard(self):
+        shard = getattr(self._local, 'shard', None)
+        if shard is None:
+            shard = self._local.shard = _Shard(threading.current_thread())
+            with self._lock:
+                self._shards.append(shard)
+        return shard
+    
+    def _before_cursor_execute(self, conn, cursor, statement, parameters, context, executemany):
+        if context is not None:
+            context._metrics_started = time.perf_counter()
+    
+    def _after_cursor_execute(self, conn, cursor, statement, parameters, context, executemany):
+        started = getattr(context, '_metrics_started', None)
+        if started is None:
+            return
+        blueprint = (request.blueprint or '') if has_request_context() else ''
+        self.inc('db_queries_total', blueprint=blueprint)
+        self.observe('db_query_duration_seconds', time.perf_counter() - started,
+                     blueprint=blueprint)
+    
+    def _start_flusher(self):
+        # Started from the first request so it runs in the forked worker
+        if not self.multiproc_dir or self._flusher_pid == os.getpid():
+            return
+        with self._lock:
+            if self._flusher_pid == os.getpid():
+                return
+            self._flusher_pid = os.getpid()
+        self._flusher = threading.Thread(target=self._flush_loop, name='metrics-flush', daemon=True)
+        self._flusher.start()
+    
+    def _flush_loop(self):
+        while True:
+            time.sleep(self.flush_interval)
+            try:
+                self._write_snapshot(*self.snapshot())
+            except OSError as e:
+                print(f"Metrics flush failed: {e}")
+    
+    def _write_snapshot(self, values, histograms):
+        pid = os.getpid()
+        data = {
+            'pid': pid,
+            'values': [[name, labels, value] for (name, labels), value in values.items()],
+            'histograms': [[name, labels, counts] for (name, labels), counts in histograms.items()],
+        }
+        path = os.path.join(self.multiproc_dir, f'{pid}.json')
+        tmp_path = f'{path}.{threading.get_ident()}.tmp'
+        with open(tmp_path, 'w') as f:
+            json.dump(data, f)
+        os.replace(tmp_path, path)
+
+def _merge(values, histograms, new_values, new_histograms):
+    for key, value in new_values.items():
+        values[key] = values.get(key, 0) + value
+    for key, counts in new_histograms.items():
+        existing = histograms.get(key)
+        if existing is None:
+            histograms[key] = list(counts)
+        else:
+            for i, count in enumerate(counts):
+                existing[i] += count
+
+def _labels(labels):
+    if not labels:
+        return ''
+    pairs = ','.join('{}="{}"'.format(k, str(v).replace('\\', '\\\\').replace('"', '\\"'))
+                     for k, v in labels)
+    return '{' + pairs + '}'
+
+def _pid_alive(pid):
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        pass
+    return True
+
+metrics = MetricsRegistry()
@@ -1,8 +1,13 @@
 from app import db, login_manager
+from flask import current_app, has_app_context
+from app.user_cache import user_cache
 from flask_login import UserMixin
 from werkzeug.security import generate_password_hash, check_password_hash
 from datetime import datetime
 import enum
+import functools
+
+DEFAULT_PASSWORD_HASH_METHOD = 'scrypt:32768:8:1'
 
 class UserRole(enum.Enum):
     BUYER = "buyer"
@@ -23,9 +28,24 @@ class DeliveryType(enum.Enum):
     PICKUP = "pickup"
     DELIVERY = "delivery"
 
+def password_hash_method():
+    """Werkzeug hash method string, e.g. 'scrypt:32768:8:1' or 'pbkdf2:sha256:600000'"""
+    if has_app_context():
+        return current_app.config['PASSWORD_HASH_METHOD']
+    return DEFAULT_PASSWORD_HASH_METHOD
+
+@functools.lru_cache(maxsize=None)
+def password_hash_prefix(method):
+    """The 'method:params' part of hashes made with method, werkzeug's defaults filled in"""
+    return generate_password_hash('', method=method).split('$', 1)[0]
+
 @login_manager.user_loader
 def load_user(user_id):
-    return User.query.get(int(user_id))
+    user = user_cache.get(int(user_id))
+    # Blocked users lose their session, not just the ability to log in again
+    if user is None or user.is_blocked:
+        return None
+    return user
 
 class User(UserMixin, db.Model):
     id = db.Column(db.Integer, primary_key=True)
@@ -38,6 +58,7 @@ class User(UserMixin, db.Model):
     location = db.Column(db.String(200))
     phone = db.Column(db.String(20))
     created_at = db.Column(db.DateTime, default=datetime.utcnow)
+    cache_version = db.Column(db.Integer, default=0)
     
     # Relationships
     products = db.relationship('Product', backref='farmer', lazy=True)
@@ -45,11 +66,24 @@ class User(UserMixin, db.Model):
     orders_as_farmer = db.relationship('Order', foreign_keys='Order.farmer_id', backref='farmer', lazy=True)
     
     def set_password(self, password):
-        self.password_hash = generate_password_hash(password)
+        self.password_hash = generate_password_hash(password, method=password_hash_method())
     
     def check_password(self, password):
         return check_password_hash(self.password_hash, password)
     
+    def password_needs_rehash(self):
+        """True if the stored hash was made with different hash parameters"""
+        if not self.password_hash:
+            return False
+        # 'pbkdf2:sha256' is written out as 'pbkdf2:sha256:600000', so compare
+        # against a real hash's prefix rather than the configured string
+        return self.password_hash.split('$', 1)[0] != password_hash_prefix(password_hash_method())
+    
+    def invalidate_cache(self):
+        """Bump the version so every worker reloads this user from the database"""
+        self.cache_version = (self.cache_version or 0) + 1
+        user_cache.evict(self.id)
+    
     def is_farmer(self):
         return self.role == UserRole.FARMER
     
@@ -60,7 +94,18 @@ class User(UserMixin, db.Model):
         return f'<User {self.username}>'
 
 class Product(db.Model):
+    # One index per listing sort key, so sorted pages are read in index order
+    __table_args__ = (
+        db.Index('ix_product_available_price', 'available', 'price', 'id'),
+        db.Index('ix_product_available_created_at', 'available', 'created_at', 'id'),
+        db.Index('ix_product_available_lower_name', 'available', db.text('lower(name)'), 'id'),
+        db.Index('ix_product_available_popularity', 'available', 'popularity_score', 'id'),
+        # Bulk import matches rows to products by farmer and SKU
+        db.Index('ix_product_farmer_id_sku', 'farmer_id', 'sku', unique=True),
+    )
+    
     id = db.Column(db.Integer, primary_key=True)
+    sku = db.Column(db.String(64))  # farmer's own code, unique per farmer
     name = db.Column(db.String(100), nullable=False)
     description = db.Column(db.Text)
     price = db.Column(db.Float, nullable=False)
@@ -76,6 +121,8 @@ class Product(db.Model):
     farmer_id = db.Column(db.Integer, db.ForeignKey('user.id'), nullable=False)
     created_at = db.Column(db.DateTime, default=datetime.utcnow)
     updated_at = db.Column(db.DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
+    # Units sold, decayed over time (see app/popularity.py)
+    popularity_score = db.Column(db.Float, nullable=False, default=0.0, server_default='0')
     
     # Relationships
     order_items = db.relationship('OrderItem', backref='product', lazy=True)
@@ -84,6 +131,9 @@ class Product(db.Model):
         return f'<Product {self.name}>'
 
 class Order(db.Model):
+    # AUTOINCREMENT, so the id of an order moved to the archive is never handed out again
+    __table_args__ = {'sqlite_autoincrement': True}
+    
     id = db.Column(db.Integer, primary_key=True)
     buyer_id = db.Column(db.Integer, db.ForeignKey('user.id'), nullable=False)
     farmer_id = db.Column(db.Integer, db.ForeignKey('user.id'), nullable=False)
@@ -96,6 +146,8 @@ class Order(db.Model):
     created_at = db.Column(db.DateTime, default=datetime.utcnow)
     updated_at = db.Column(db.DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
     
+    archived = False
+    
     # Relationships
     items = db.relationship('OrderItem', backref='order', lazy=True, cascade='all, delete-orphan')
     
@@ -112,6 +164,8 @@ class Order(db.Model):
         return f'<Order {self.id}>'
 
 class OrderItem(db.Model):
+    __table_args__ = {'sqlite_autoincrement': True}
+    
     id = db.Column(db.Integer, primary_key=True)
     order_id = db.Column(db.Integer, db.ForeignKey('order.id'), nullable=False)
     product_id = db.Column(db.Integer, db.ForeignKey('product.id'), nullable=False)
@@ -119,4 +173,101 @@ class OrderItem(db.Model):
     price = db.Column(db.Float, nullable=False)  # Price at time of order
     
     def __repr__(self):
-        return f'<OrderItem {self.id}>' 
\ No newline at end of file
+        return f'<OrderItem {self.id}>' 
+
+class ArchivedOrder(db.Model):
+    """A finished order moved out of the order table (see app/archive.py)"""
+    __tablename__ = 'order_archive'
+    archived = True
+    
+    id = db.Column(db.Integer, primary_key=True, autoincrement=False)  # the original order id
+    buyer_id = db.Column(db.Integer, db.ForeignKey('user.id'), nullable=False, index=True)
+    farmer_id = db.Column(db.Integer, db.ForeignKey('user.id'), nullable=False, index=True)
+    status = db.Column(db.Enum(OrderStatus))
+    total_price = db.Column(db.Float, default=0.0)
+    delivery_type = db.Column(db.Enum(DeliveryType))
+    delivery_address = db.Column(db.Text)
+    delivery_fee = db.Column(db.Float, default=0.0)
+    notes = db.Column(db.Text)
+    created_at = db.Column(db.DateTime, index=True)
+    updated_at = db.Column(db.DateTime)
+    archived_at = db.Column(db.DateTime, default=datetime.utcnow)
+    
+    # Relationships
+    buyer = db.relationship('User', foreign_keys=[buyer_id])
+    farmer = db.relationship('User', foreign_keys=[farmer_id])
+    items = db.relationship('ArchivedOrderItem', backref='order', lazy=True, cascade='all, delete-orphan')
+    
+    @property
+    def total(self):
+        return sum(item.price * item.quantity for item in self.items)
+    
+    def __repr__(self):
+        return f'<ArchivedOrder {self.id}>'
+
+class ArchivedOrderItem(db.Model):
+    __tablename__ = 'order_item_archive'
+    
+    id = db.Column(db.Integer, primary_key=True, autoincrement=False)  # the original item id
+    order_id = db.Column(db.Integer, db.ForeignKey('order_archive.id'), nullable=False, index=True)
+    product_id = db.Column(db.Integer, db.ForeignKey('product.id'), nullable=False, index=True)
+    quantity = db.Column(db.Integer, nullable=False)
+    price = db.Column(db.Float, nullable=False)
+    
+    # Relationships
+    product = db.relationship('Product')
+    
+    def __repr__(self):
+        return f'<ArchivedOrderItem {self.id}>'
+
+class InventoryMovement(db.Model):
+    """Append-only stock change (see app/inventory.py)"""
+    __tablename__ = 'inventory_movement'
+    __table_args__ = (
+        db.Index('ix_inventory_movement_product_id_id', 'product_id', 'id'),
+    )
+    
+    id = db.Column(db.Integer, primary_key=True)
+    product_id = db.Column(db.Integer, nullable=False)  # no FK - history outlives the product
+    delta = db.Column(db.Integer, nullable=False)
+    reason = db.Column(db.String(20), nullable=False)
+    order_id = db.Column(db.Integer)
+    created_at = db.Column(db.DateTime, default=datetime.utcnow, nullable=False, index=True)
+    
+    def __repr__(self):
+        return f'<InventoryMovement {self.product_id} {self.delta:+d} {self.reason}>'
+
+class InventorySnapshot(db.Model):
+    """A product's stock with every movement up to last_movement_id folded in"""
+    __tablename__ = 'inventory_snapshot'
+    
+    product_id = db.Column(db.Integer, primary_key=True, autoincrement=False)
+    quantity = db.Column(db.Integer, nullable=False)
+    last_movement_id = db.Column(db.Integer, nullable=False, default=0)
+    taken_at = db.Column(db.DateTime, default=datetime.utcnow, nullable=False)
+    
+    def __repr__(self):
+        return f'<InventorySnapshot {self.product_id} {self.quantity}>'
+
+class OrderEvent(db.Model):
+    """Change log of order statuses, read by every worker's order stream poller"""
+    __tablename__ = 'order_event'
+    
+    id = db.Column(db.Integer, primary_key=True)
+    order_id = db.Column(db.Integer, nullable=False)
+    buyer_id = db.Column(db.Integer, nullable=False)
+    farmer_id = db.Column(db.Integer, nullable=False)
+    status = db.Column(db.String(20), nullable=False)
+    created_at = db.Column(db.DateTime, default=datetime.utcnow, nullable=False, index=True)
+    
+    def __repr__(self):
+        return f'<OrderEvent {self.order_id} {self.status}>'
+
+class ReplicaHeartbeat(db.Model):
+    __tablename__ = 'replica_heartbeat'
+    
+    id = db.Column(db.Integer, primary_key=True)
+    beat_at = db.Column(db.Float, nullable=False)  # time.time() on the primary
+    
+    def __repr__(self):
+        return f'<ReplicaHeartbeat {self.beat_at}>'
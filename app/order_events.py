@@ -0,0 +1,224 @@
+from collections import deque
+from datetime import datetime, timedelta
+from sqlalchemy import event, func, insert, or_, select
+from sqlalchemy.orm import attributes
+from app.metrics import metrics
+import json
+import os
+import threading
+import time
+
+class Subscription:
+    """Events waiting for one open stream"""
+    
+    def __init__(self, user_id, last_id=0):
+        self.user_id = user_id
+        self.last_id = last_id
+        self._events = deque()
+        self._seen = set()
+        self._ready = threading.Condition()
+    
+    def push(self, events):
+        with self._ready:
+            for e in events:
+                if e['id'] > self.last_id and e['id'] not in self._seen:
+                    self._seen.add(e['id'])
+                    self._events.append(e)
+            if self._events:
+                self._ready.notify()
+    
+    def wait(self, timeout):
+        """Pending events in id order, or [] after timeout seconds"""
+        with self._ready:
+            if not self._events:
+                self._ready.wait(timeout)
+            events = sorted(self._events, key=lambda e: e['id'])
+            self._events.clear()
+        if events:
+            self.last_id = max(self.last_id, events[-1]['id'])
+        return events
+
+class OrderEventBroker:
+    """Pushes order status changes to the buyers and farmers watching them.
+    
+    Every flush that creates an order or changes its status writes a row to
+    the order_event table in the same transaction. Each worker runs one
+    poller thread that reads new rows every ORDER_EVENTS_POLL_INTERVAL
+    seconds (immediately after a commit in the same worker) and hands them
+    to the subscriptions of the users involved, so the cost is one small
+    query per worker however many streams are open.
+    """
+    
+    def __init__(self):
+        self.enabled = True
+        self.poll_interval = 1.0
+        self.keepalive = 15
+        self.max_age = 300
+        self.max_connections = 1000
+        self.retention = 3600
+        self._engine = None
+        self._subscriptions = {}  # user id -> set of Subscription
+        self._count = 0
+        self._lock = threading.Lock()
+        self._wake = threading.Event()
+        self._last_id = None
+        self._poller_pid = None
+    
+    def init_app(self, app, db):
+        self.enabled = app.config['ORDER_EVENTS_ENABLED']
+        self.poll_interval = app.config['ORDER_EVENTS_POLL_INTERVAL']
+        self.keepalive = app.config['ORDER_STREAM_KEEPALIVE']
+        self.max_age = app.config['ORDER_STREAM_MAX_AGE']
+        self.max_connections = app.config['ORDER_STREAM_MAX_CONNECTIONS']
+        self.retention = app.config['ORDER_EVENTS_RETENTION']
+        if not self.enabled:
+            return
+        with app.app_context():
+            # Always the primary - a lagging replica would delay or drop events
+            self._engine = db.engines[None]
+        event.listen(db.session, 'after_flush', self._after_flush)
+        event.listen(db.session, 'after_commit', self._after_commit)
+    
+    # Writing
+    
+    def _after_flush(self, session, flush_context):
+        from app.models import Order, OrderEvent
+        rows = []
+        for obj in session.new:
+            if isinstance(obj, Order):
+                rows.append(obj)
+        for obj in session.dirty:
+            if isinstance(obj, Order) and attributes.get_history(obj, 'status').has_changes():
+                rows.append(obj)
+        if not rows:
+            return
+        # Core insert - the ORM can't add objects while a flush is finishing
+        now = datetime.utcnow()
+        session.connection().execute(insert(OrderEvent), [
+            {'order_id': o.id, 'buyer_id': o.buyer_id, 'farmer_id': o.farmer_id,
+             'status': o.status.value if o.status else 'pending', 'created_at': now}
+            for o in rows])
+        session.info['order_events'] = True
+    
+    def _after_commit(self, session):
+        if session.info.pop('order_events', False):
+            # The poller also prunes the log, so it runs even with no streams open
+            self._start_poller()
+            if self._subscriptions:
+                self._wake.set()
+    
+    # Streams
+    
+    def subscribe(self, user_id, last_event_id=None):
+        """A Subscription for user_id, or None when this worker has too many streams open"""
+        self._start_poller()
+        with self._lock:
+            if self._count >= self.max_connections:
+                return None
+            if self._last_id is None:
+                self._last_id = self._max_id()
+            subscription = Subscription(user_id, self._last_id if last_event_id is None else last_event_id)
+            self._subscriptions.setdefault(user_id, set()).add(subscription)
+            self._count += 1
+        metrics.inc('order_streams_open')
+        if last_event_id is not None:
+            # Reconnecting client - replay what it missed
+            subscription.push(self._read(self._for_user(user_id), after=last_event_id))
+        return subscription
+    
+    def unsubscribe(self, subscription):
+        with self._lock:
+            subscriptions = self._subscriptions.get(subscription.user_id)
+            if subscriptions and subscription in subscriptions:
+                subscriptions.discard(subscription)
+                if not subscriptions:
+                    del self._subscriptions[subscription.user_id]
+                self._count -= 1
+                metrics.dec('order_streams_open')
+                if not self._count:
+                    # Nobody is listening - the next subscriber starts from the newest event
+                    self._last_id = None
+    
+    def stream(self, subscription):
+        """Server-sent events for a subscription; ends after max_age so clients reconnect"""
+        try:
+            yield f'retry: 5000\nid: {subscription.last_id}\n\n'
+            ends_at = time.monotonic() + self.max_age
+            while time.monotonic() < ends_at:
+                events = subscription.wait(min(self.keepalive, max(ends_at - time.monotonic(), 0)))
+                if not events:
+                    yield ': keepalive\n\n'
+                    continue
+                yield ''.join(f"id: {e['id']}\nevent: order\ndata: {json.dumps(e)}\n\n" for e in events)
+        finally:
+            self.unsubscribe(subscription)
+    
+    # Polling
+    
+    @staticmethod
+    def _for_user(user_id):
+        from app.models import OrderEvent
+        return or_(OrderEvent.buyer_id == user_id, OrderEvent.farmer_id == user_id)
+    
+    def _max_id(self):
+        from app.models import OrderEvent
+        with self._engine.connect() as conn:
+            return conn.execute(select(func.max(OrderEvent.id))).scalar() or 0
+    
+    def _read(self, *conditions, after):
+        from app.models import OrderEvent
+        query = (select(OrderEvent.id, OrderEvent.order_id, OrderEvent.buyer_id, OrderEvent.farmer_id,
+                        OrderEvent.status, OrderEvent.created_at)
+                 .where(OrderEvent.id > after, *conditions).order_by(OrderEvent.id))
+        with self._engine.connect() as conn:
+            return [{'id': row.id, 'order_id': row.order_id, 'buyer_id': row.buyer_id,
+                     'farmer_id': row.farmer_id, 'status': row.status,
+                     'created_at': row.created_at.isoformat(timespec='seconds')}
+                    for row in conn.execute(query)]
+    
+    def _start_poller(self):
+        # Once per process, after gunicorn forks
+        if self._poller_pid == os.getpid():
+            return
+        with self._lock:
+            if self._poller_pid == os.getpid():
+                return
+            self._poller_pid = os.getpid()
+            self._last_id = None
+        threading.Thread(target=self._poll_loop, name='order-events', daemon=True).start()
+    
+    def _poll_loop(self):
+        pruned_at = time.monotonic()
+        while True:
+            self._wake.wait(self.poll_interval)
+            self._wake.clear()
+            try:
+                if self._subscriptions and self._last_id is not None:
+                    self._poll()
+                if time.monotonic() - pruned_at >= 60:
+                    pruned_at = time.monotonic()
+                    self._prune()
+            except Exception as e:
+                print(f"Order event poll failed: {e}")
+    
+    def _poll(self):
+        events = self._read(after=self._last_id)
+        if not events:
+            return
+        with self._lock:
+            self._last_id = events[-1]['id']
+            targets = {}
+            for e in events:
+                for user_id in (e['buyer_id'], e['farmer_id']):
+                    for subscription in self._subscriptions.get(user_id, ()):
+                        targets.setdefault(subscription, []).append(e)
+        for subscription, subscription_events in targets.items():
+            subscription.push(subscription_events)
+    
+    def _prune(self):
+        from app.models import OrderEvent
+        cutoff = datetime.utcnow() - timedelta(seconds=self.retention)
+        with self._engine.begin() as conn:
+            conn.execute(OrderEvent.__table__.delete().where(OrderEvent.created_at < cutoff))
+
+order_events = OrderEventBroker()
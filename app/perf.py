@@ -0,0 +1,290 @@
+from collections import Counter, OrderedDict, deque
+from datetime import datetime
+from flask import g, has_request_context, request
+from sqlalchemy import event
+import json
+import os
+import re
+import sys
+import threading
+import time
+
+APP_DIR = os.path.dirname(os.path.abspath(__file__))
+
+_WHITESPACE = re.compile(r'\s+')
+_LITERALS = re.compile(r"'(?:[^']|'')*'|\b\d+(?:\.\d+)?\b")
+_PLACEHOLDER_LISTS = re.compile(r'\?(?:\s*,\s*\?)+')
+
+def fingerprint(statement):
+    """Normalize a SQL statement so repeats with different values compare equal"""
+    statement = _WHITESPACE.sub(' ', statement).strip()
+    statement = _LITERALS.sub('?', statement)
+    return _PLACEHOLDER_LISTS.sub('?', statement)
+
+class RequestProfile:
+    """SQL activity recorded for one request"""
+    
+    __slots__ = ('timestamp', 'method', 'path', 'endpoint', 'status',
+                 'statements', 'db_time', 'total_time', 'repeated')
+    
+    def __init__(self, method, path, endpoint, status, statements, db_time, total_time, repeated):
+        self.timestamp = datetime.utcnow()
+        self.method = method
+        self.path = path
+        self.endpoint = endpoint
+        self.status = status
+        self.statements = statements
+        self.db_time = db_time
+        self.total_time = total_time
+        self.repeated = repeated
+    
+    @property
+    def n_plus_one(self):
+        return bool(self.repeated)
+
+class SQLProfiler:
+    """Opt-in per-request SQL statement counter with N+1 detection.
+    
+    Enabled with SQL_PROFILING. Each request's statement count, DB time and
+    repeated statement fingerprints go into a ring buffer shown on
+    /admin/perf, and into an X-SQL-Profile header when the app is in debug.
+    """
+    
+    def __init__(self):
+        self.enabled = False
+        self.repeat_threshold = 3
+        self._profiles = deque(maxlen=200)
+        self._lock = threading.Lock()
+    
+    def init_app(self, app, *engines):
+        self.enabled = app.config['SQL_PROFILING']
+        if not self.enabled:
+            return
+        self.repeat_threshold = app.config['SQL_PROFILING_REPEAT_THRESHOLD']
+        self._profiles = deque(maxlen=app.config['SQL_PROFILING_BUFFER_SIZE'])
+        
+        for engine in engines:
+            event.listen(engine, 'before_cursor_execute', self._before_cursor_execute)
+            event.listen(engine, 'after_cursor_execute', self._after_cursor_execute)
+        
+        @app.before_request
+        def start_sql_profile():
+            g.sql_profile = {'started': time.perf_counter(), 'count': 0,
+                             'db_time': 0.0, 'fingerprints': Counter()}
+        
+        @app.after_request
+        def finish_sql_profile(response):
+            profile = self._finish(response)
+            if profile is not None and app.debug:
+                response.headers['X-SQL-Profile'] = (
+                    f"statements={profile.statements}; db_ms={profile.db_time * 1000:.1f}; "
+                    f"repeated={len(profile.repeated)}"
+                )
+            return response
+    
+    def recent(self, limit=50):
+        with self._lock:
+            profiles = list(self._profiles)
+        return profiles[::-1][:limit]
+    
+    def worst_routes(self, limit=20):
+        """Aggregate the ring buffer by endpoint, worst total DB time first"""
+        routes = {}
+        for profile in self.recent(limit=None):
+            route = routes.setdefault(profile.endpoint, {
+                'endpoint': profile.endpoint, 'requests': 0, 'statements': 0,
+                'max_statements': 0, 'db_time': 0.0, 'n_plus_one': 0
+            })
+            route['requests'] += 1
+            route['statements'] += profile.statements
+            route['max_statements'] = max(route['max_statements'], profile.statements)
+            route['db_time'] += profile.db_time
+            route['n_plus_one'] += profile.n_plus_one
+        for route in routes.values():
+            route['avg_statements'] = route['statements'] / route['requests']
+            route['avg_db_ms'] = route['db_time'] * 1000 / route['requests']
+        return sorted(routes.values(), key=lambda r: r['db_time'], reverse=True)[:limit]
+    
+    def clear(self):
+        with self._lock:
+            self._profiles.clear()
+    
+    def _before_cursor_execute(self, conn, cursor, statement, parameters, context, executemany):
+        # Kept on the execution context, so a statement that raises leaves nothing behind
+        if context is not None and has_request_context() and 'sql_profile' in g:
+            context._sql_profile_started = time.perf_counter()
+    
+    def _after_cursor_execute(self, conn, cursor, statement, parameters, context, executemany):
+        started = getattr(context, '_sql_profile_started', None)
+        if started is None or not has_request_context() or 'sql_profile' not in g:
+            return
+        profile = g.sql_profile
+        profile['count'] += 1
+        profile['db_time'] += time.perf_counter() - started
+        profile['fingerprints'][fingerprint(statement)] += 1
+    
+    def _finish(self, response):
+        data = g.pop('sql_profile', None)
+        if data is None:
+            return None
+        repeated = [(fp, count) for fp, count in data['fingerprints'].most_common()
+                    if count >= self.repeat_threshold]
+        profile = RequestProfile(
+            method=request.method,
+            path=request.path,
+            endpoint=request.endpoint or 'unknown',
+            status=response.status_code,
+            statements=data['count'],
+            db_time=data['db_time'],
+            total_time=time.perf_counter() - data['started'],
+            repeated=repeated
+        )
+        with self._lock:
+            self._profiles.append(profile)
+        return profile
+
+class SlowQueryLog:
+    """Records statements slower than SLOW_QUERY_THRESHOLD_MS.
+    
+    Each entry has the parameters, the route and the app code line that ran
+    it. The first time a fingerprint is seen its query plan is captured too
+    (EXPLAIN QUERY PLAN on SQLite, EXPLAIN elsewhere). Entries are kept in a
+    ring buffer and, with SLOW_QUERY_LOG_FILE set, appended as JSON lines to
+    a size-capped file so /admin/perf can show every worker's slow queries.
+    """
+    
+    def __init__(self):
+        self.enabled = False
+        self.threshold = 0.25
+        self.path = None
+        self.max_bytes = 5 * 1024 * 1024
+        self._entries = deque(maxlen=500)
+        self._explained = OrderedDict()
+        self._lock = threading.Lock()
+    
+    def init_app(self, app, *engines):
+        self.enabled = app.config['SLOW_QUERY_LOG']
+        if not self.enabled:
+            return
+        self.threshold = app.config['SLOW_QUERY_THRESHOLD_MS'] / 1000.0
+        self.path = app.config['SLOW_QUERY_LOG_FILE']
+        self.max_bytes = app.config['SLOW_QUERY_LOG_MAX_BYTES']
+        self._entries = deque(maxlen=app.config['SLOW_QUERY_LOG_SIZE'])
+        if self.path:
+            os.makedirs(os.path.dirname(os.path.abspath(self.path)), exist_ok=True)
+        
+        for engine in engines:
+            event.listen(engine, 'before_cursor_execute', self._before_cursor_execute)
+            event.listen(engine, 'after_cursor_execute', self._after_cursor_execute)
+    
+    def recent(self, limit=100):
+        """Newest first - from the shared file when there is one"""
+        if not self.path:
+            with self._lock:
+                entries = list(self._entries)
+            return entries[::-1][:limit]
+        
+        entries = []
+        for path in (self.path, self.path + '.1'):
+            try:
+                with open(path) as f:
+                    lines = f.readlines()
+            except OSError:
+                continue
+            for line in reversed(lines):
+                try:
+                    entries.append(json.loads(line))
+                except ValueError:
+                    continue
+                if len(entries) >= limit:
+                    return entries
+        return entries
+    
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self._explained.clear()
+    
+    def _before_cursor_execute(self, conn, cursor, statement, parameters, context, executemany):
+        if context is not None:
+            context._slow_query_started = time.perf_counter()
+    
+    def _after_cursor_execute(self, conn, cursor, statement, parameters, context, executemany):
+        started = getattr(context, '_slow_query_started', None)
+        if started is None:
+            return
+        duration = time.perf_counter() - started
+        if duration < self.threshold:
+            return
+        
+        statement_fingerprint = fingerprint(statement)
+        entry = {
+            'timestamp': datetime.utcnow().isoformat(timespec='seconds'),
+            'duration_ms': round(duration * 1000, 1),
+            'statement': statement,
+            'parameters': _truncate(repr(parameters), 500),
+            'fingerprint': statement_fingerprint,
+            'endpoint': (request.endpoint or 'unknown') if has_request_context() else None,
+            'path': f'{request.method} {request.path}' if has_request_context() else None,
+            'call_site': _call_site(),
+            'plan': None,
+        }
+        if not executemany and self._first_occurrence(statement_fingerprint):
+            entry['plan'] = _explain(conn.dialect.name, cursor.connection, statement, parameters)
+        
+        with self._lock:
+            self._entries.append(entry)
+        if self.path:
+            self._append(entry)
+    
+    def _first_occurrence(self, statement_fingerprint):
+        with self._lock:
+            if statement_fingerprint in self._explained:
+                return False
+            self._explained[statement_fingerprint] = True
+            if len(self._explained) > 10000:
+                self._explained.popitem(last=False)
+            return True
+    
+    def _append(self, entry):
+        line = json.dumps(entry, default=str) + '\n'
+        try:
+            with self._lock:
+                if os.path.exists(self.path) and os.path.getsize(self.path) + len(line) > self.max_bytes:
+                    # Keep one previous file so the page never starts empty
+                    os.replace(self.path, self.path + '.1')
+                with open(self.path, 'a') as f:
+                    f.write(line)
+        except OSError as e:
+            print(f"Slow query log write failed: {e}")
+
+def _call_site():
+    """First frame in the app's own code (routes, models, templates) outside this module"""
+    frame = sys._getframe(2)
+    while frame is not None:
+        filename = frame.f_code.co_filename
+        if filename.startswith(APP_DIR) and filename != __file__:
+            return f'{os.path.relpath(filename, os.path.dirname(APP_DIR))}:{frame.f_lineno} in {frame.f_code.co_name}'
+        frame = frame.f_back
+    return None
+
+def _explain(dialect_name, dbapi_connection, statement, parameters):
+    # Only plain reads - EXPLAIN on some dialects can have side effects otherwise
+    if statement.split(None, 1)[0].upper() not in ('SELECT', 'WITH'):
+        return None
+    prefix = 'EXPLAIN QUERY PLAN ' if dialect_name == 'sqlite' else 'EXPLAIN '
+    try:
+        cursor = dbapi_connection.cursor()
+        try:
+            cursor.execute(prefix + statement, parameters)
+            return [' | '.join(str(value) for value in row) for row in cursor.fetchall()]
+        finally:
+            cursor.close()
+    except Exception as e:
+        return [f'EXPLAIN failed: {e}']
+
+def _truncate(text, limit):
+    return text if len(text) <= limit else text[:limit] + '...'
+
+sql_profiler = SQLProfiler()
+slow_query_log = SlowQueryLog()
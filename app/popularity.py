@@ -0,0 +1,31 @@
+from sqlalchemy import func, select, update
+
+def decay_factor(interval_hours, half_life_days):
+    """Multiplier that halves a score every half_life_days, applied every interval_hours"""
+    return 0.5 ** (interval_hours / (half_life_days * 24))
+
+def record_sale(product, quantity):
+    """Add a sale to the product's score in the UPDATE itself, so concurrent checkouts don't collide"""
+    from app.models import Product
+    product.popularity_score = Product.popularity_score + quantity
+
+def decay(conn, factor):
+    """Scale every score by factor.
+    
+    Every product is scaled alike, so the popularity order - and with it
+    the catalog snapshot and cached cards - stays valid; updated_at is left
+    alone for the same reason.
+    """
+    from app.models import Product
+    return conn.execute(update(Product).where(Product.popularity_score > 0).values(
+        popularity_score=Product.popularity_score * factor,
+        updated_at=Product.updated_at)).rowcount
+
+def recompute(conn, first_product_id=1):
+    """Reset scores to units sold, for products from first_product_id on"""
+    from app.models import OrderItem, Product
+    sold = (select(OrderItem.product_id, func.sum(OrderItem.quantity).label('quantity'))
+            .where(OrderItem.product_id >= first_product_id)
+            .group_by(OrderItem.product_id).subquery())
+    return conn.execute(update(Product).where(Product.id == sold.c.product_id).values(
+        popularity_score=sold.c.quantity, updated_at=Product.updated_at)).rowcount
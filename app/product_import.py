@@ -0,0 +1,236 @@
+from datetime import datetime
+from sqlalchemy import bindparam, insert, select, update
+from app import inventory
+from app.images import ALLOWED_EXTENSIONS, image_importer
+from app.models import InventoryMovement, Product
+import csv
+import io
+import math
+import os
+import zipfile
+
+# CSV columns, in export order; rows are matched to products by farmer and sku
+COLUMNS = ('sku', 'name', 'description', 'price', 'quantity', 'unit', 'category', 'organic', 'available', 'image')
+REQUIRED = ('sku', 'name', 'price', 'quantity')
+MAX_LENGTHS = {'sku': 64, 'name': 100, 'unit': 20, 'category': 50}
+TRUE_VALUES = {'1', 'true', 'yes', 'y'}
+FALSE_VALUES = {'0', 'false', 'no', 'n', ''}
+
+class ImportReport:
+    """Outcome of an import: counts, (line, sku, message) for rejected rows,
+    and (line, message) in stopped if the file could not be read to the end"""
+    
+    def __init__(self, max_errors=1000):
+        self.created = 0
+        self.updated = 0
+        self.images = 0
+        self.rejected = 0
+        self.errors = []
+        self.max_errors = max_errors
+        self.stopped = None
+    
+    def error(self, line, sku, message):
+        self.rejected += 1
+        if len(self.errors) < self.max_errors:
+            self.errors.append((line, sku, message))
+    
+    def as_dict(self):
+        return {'created': self.created, 'updated': self.updated, 'images': self.images,
+                'rejected': self.rejected,
+                'errors': [{'line': line, 'sku': sku, 'message': message} for line, sku, message in self.errors],
+                'stopped': {'line': self.stopped[0], 'message': self.stopped[1]} if self.stopped else None}
+
+def _parse(row, columns):
+    """Typed values for the columns present in a CSV row, or raises ValueError"""
+    values = {}
+    for column in columns:
+        raw = (row.get(column) or '').strip()
+        if column in REQUIRED and not raw:
+            raise ValueError(f"{column} is required")
+        if column in MAX_LENGTHS and len(raw) > MAX_LENGTHS[column]:
+            raise ValueError(f"{column} is longer than {MAX_LENGTHS[column]} characters")
+        if column == 'price':
+            try:
+                raw = float(raw)
+            except ValueError:
+                raise ValueError(f"price {raw!r} is not a number")
+            if not math.isfinite(raw):
+                raise ValueError("price must be a finite number")
+            if raw < 0:
+                raise ValueError("price can't be negative")
+        elif column == 'quantity':
+            try:
+                raw = int(raw)
+            except ValueError:
+                raise ValueError(f"quantity {raw!r} is not a whole number")
+            if raw < 0:
+                raise ValueError("quantity can't be negative")
+        elif column in ('organic', 'available'):
+            if raw.lower() not in TRUE_VALUES | FALSE_VALUES:
+                raise ValueError(f"{column} {raw!r} is not yes or no")
+            raw = raw.lower() in TRUE_VALUES if raw else column == 'available'
+        elif column in ('unit', 'category'):
+            raw = raw or None
+        values[column] = raw
+    if values.get('unit', 'piece') is None:
+        values['unit'] = 'piece'
+    return values
+
+def _image_source(image, members):
+    """How a row's image column is loaded: ('url', url), ('zip', member), or None to keep the current image"""
+    if not image or image.startswith('uploads/'):
+        # Empty, or a path from an export
+        return None
+    if image.startswith(('http://', 'https://')):
+        return 'url', image
+    info = members.get(os.path.basename(image))
+    if info is None:
+        raise ValueError(f"image {image!r} is not a URL or a file in the images zip")
+    return 'zip', info
+
+def import_products(engine, farmer_id, stream, images=None, chunk_size=500, max_errors=1000):
+    """Create or update the farmer's products from a CSV file.
+    
+    The file is read as a stream and handled chunk_size rows at a time:
+    existing products are looked up with one query, then inserted and
+    updated with one executemany each, in one transaction per chunk, so a
+    bad chunk never leaves half its rows behind. Stock changes go through
+    the inventory ledger. Images referenced by URL or by a file in the
+    images zip are loaded in the background after their chunk commits.
+    If the file turns unreadable part way (bad UTF-8, a malformed or
+    oversized field) the rows before it are still imported and the report
+    says where it stopped. Returns an ImportReport.
+    """
+    report = ImportReport(max_errors)
+    reader = csv.DictReader(io.TextIOWrapper(stream, encoding='utf-8-sig', newline=''))
+    header = [name.strip().lower() for name in reader.fieldnames or ()]
+    missing = [column for column in REQUIRED if column not in header]
+    if missing:
+        report.error(1, None, f"missing column(s): {', '.join(missing)}")
+        return report
+    reader.fieldnames = header
+    columns = [column for column in COLUMNS if column in header]
+    images_zip = zipfile.ZipFile(images) if images is not None else None
+    members = {os.path.basename(info.filename): info
+               for info in (images_zip.infolist() if images_zip else ()) if not info.is_dir()}
+    
+    seen = {}  # sku -> line, across the whole file
+    chunk = []
+    try:
+        for row in reader:
+            line = reader.line_num
+            sku = (row.get('sku') or '').strip()
+            try:
+                values = _parse(row, columns)
+                if sku in seen:
+                    raise ValueError(f"duplicate sku (first on line {seen[sku]})")
+                image = _image_source(values.pop('image', None), members)
+            except ValueError as e:
+                report.error(line, sku or None, str(e))
+                continue
+            seen[sku] = line
+            chunk.append((line, values, image))
+            if len(chunk) >= chunk_size:
+                _import_chunk(engine, farmer_id, chunk, columns, images_zip, report)
+                chunk = []
+    except csv.Error as e:
+        # The underlying reader has counted the line it choked on; the DictReader hasn't
+        report.stopped = (reader.reader.line_num, f"could not read this line ({e}); it and the rest of the file were not imported")
+    except UnicodeDecodeError:
+        # Decoded ahead in blocks, so the bad bytes are only known to come after the last row read
+        report.stopped = (reader.line_num + 1, "the file is not UTF-8 text from around this line; "
+                                               "it and the rest of the file were not imported")
+    if chunk:
+        _import_chunk(engine, farmer_id, chunk, columns, images_zip, report)
+    return report
+
+def _import_chunk(engine, farmer_id, chunk, columns, images_zip, report):
+    fields = [column for column in columns if column not in ('sku', 'quantity', 'image')]
+    try:
+        with engine.begin() as conn:
+            existing = {sku: (product_id, quantity) for sku, product_id, quantity in conn.execute(
+                select(Product.sku, Product.id, Product.quantity).where(
+                    Product.farmer_id == farmer_id, Product.sku.in_([values['sku'] for _, values, _ in chunk])))}
+            new = [values for _, values, _ in chunk if values['sku'] not in existing]
+            changed = [values for _, values, _ in chunk if values['sku'] in existing]
+            
+            movements = []
+            if changed:
+                # quantity + delta, as in inventory.adjust, so a sale made meanwhile isn't overwritten
+                deltas = [values['quantity'] - (existing[values['sku']][1] or 0) for values in changed]
+                conn.execute(update(Product).where(Product.id == bindparam('product_id')).values(
+                    quantity=Product.quantity + bindparam('delta'),
+                    **{field: bindparam(f'new_{field}') for field in fields}), [
+                    {'product_id': existing[values['sku']][0], 'delta': delta,
+                     **{f'new_{field}': values[field] for field in fields}}
+                    for values, delta in zip(changed, deltas)])
+                movements += [{'product_id': existing[values['sku']][0], 'delta': delta,
+                               'reason': inventory.RESTOCK if delta > 0 else inventory.ADJUSTMENT}
+                              for values, delta in zip(changed, deltas) if delta]
+            if new:
+                conn.execute(insert(Product), [
+                    {'farmer_id': farmer_id, 'description': '', 'available': True, 'organic': False, **values} for values in new])
+                existing.update((sku, (product_id, 0)) for sku, product_id in conn.execute(
+                    select(Product.sku, Product.id).where(
+                        Product.farmer_id == farmer_id, Product.sku.in_([values['sku'] for values in new]))))
+                movements += [{'product_id': existing[values['sku']][0], 'delta': values['quantity'],
+                               'reason': inventory.INITIAL} for values in new if values['quantity']]
+            if movements:
+                now = datetime.utcnow()
+                conn.execute(insert(InventoryMovement), [{**m, 'order_id': None, 'created_at': now} for m in movements])
+    except Exception as e:
+        # The database's message can name tables and constraints; it goes to the log only
+        print(f"Product import for farmer {farmer_id} failed on lines {chunk[0][0]}-{chunk[-1][0]}: {e}")
+        for line, values, _ in chunk:
+            report.error(line, values['sku'], "not saved: a database error stopped this batch of rows, please try again")
+        return
+    report.created += len(new)
+    report.updated += len(changed)
+    
+    for line, values, image in chunk:
+        if image is None:
+            continue
+        kind, source = image
+        product_id = existing[values['sku']][0]
+        if kind == 'url':
+            image_importer.fetch(product_id, source)
+            report.images += 1
+            continue
+        extension = source.filename.rsplit('.', 1)[-1].lower()
+        if extension not in ALLOWED_EXTENSIONS or source.file_size > image_importer.max_bytes:
+            report.error(line, values['sku'], f"image {source.filename!r} is not a PNG, JPEG or GIF under "
+                                              f"{image_importer.max_bytes} bytes; the product was saved without it")
+            continue
+        # Copied now, while the upload is still open
+        with images_zip.open(source) as member:
+            filepath, path = image_importer.copy(member, f"import.{extension}")
+        image_importer.attach(product_id, filepath, path)
+        report.images += 1
+
+def export_products(engine, farmer_id, batch_size=1000):
+    """The farmer's products as CSV text, yielded batch_size rows at a time"""
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+    writer.writerow(COLUMNS)
+    yield buffer.getvalue()
+    last_id = 0
+    while True:
+        with engine.connect() as conn:
+            rows = conn.execute(select(Product.id, *[getattr(Product, column) for column in COLUMNS])
+                                .where(Product.farmer_id == farmer_id, Product.id > last_id)
+                                .order_by(Product.id).limit(batch_size)).all()
+        if not rows:
+            return
+        buffer.seek(0)
+        buffer.truncate()
+        for row in rows:
+            writer.writerow([_export_value(value) for value in row[1:]])
+        yield buffer.getvalue()
+        last_id = rows[-1].id
+
+def _export_value(value):
+    if value is None:
+        return ''
+    if isinstance(value, bool):
+        return 'yes' if value else 'no'
+    return value
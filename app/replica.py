@@ -0,0 +1,118 @@
+from fnmatch import fnmatchcase
+from flask import g, has_request_context, request, session
+from flask_sqlalchemy.session import Session
+from sqlalchemy import event, text
+import threading
+import time
+
+REPLICA_BIND = 'replica'
+
+class RoutingSession(Session):
+    """Session that sends SELECTs of replica-eligible requests to the replica bind"""
+    
+    def get_bind(self, mapper=None, clause=None, bind=None, **kwargs):
+        if (bind is None and not self._flushing and clause is not None and clause.is_select
+                and replica_router.use_replica()):
+            return self._db.engines[REPLICA_BIND]
+        return super().get_bind(mapper=mapper, clause=clause, bind=bind, **kwargs)
+
+@event.listens_for(RoutingSession, 'after_flush')
+def _after_flush(session, flush_context):
+    # Later reads in this request, and the user's next few requests, must
+    # see what was just written
+    if has_request_context():
+        g.db_use_replica = False
+        g.db_wrote = True
+
+class ReplicaRouter:
+    """Routes read-only requests to a replica database.
+    
+    GET/HEAD requests to REPLICA_ENDPOINTS read from the REPLICA_DATABASE_URL
+    bind; everything else, any request after a flush, and a user's requests
+    for REPLICA_READ_YOUR_WRITES seconds after their own write use the
+    primary. The replica is only used while its heartbeat is less than
+    REPLICA_MAX_LAG seconds behind.
+    """
+    
+    def __init__(self):
+        self.enabled = False
+        self.endpoints = []
+        self.read_your_writes = 5
+        self.max_lag = 10
+        self.check_interval = 2
+        self.lag = None
+        self._checked_at = 0.0
+        self._check_lock = threading.Lock()
+        self._db = None
+    
+    def configure(self, app):
+        """Register the replica bind; call before db.init_app"""
+        url = app.config['REPLICA_DATABASE_URL']
+        if url:
+            app.config.setdefault('SQLALCHEMY_BINDS', {})[REPLICA_BIND] = url
+    
+    def init_app(self, app, db):
+        self.enabled = bool(app.config['REPLICA_DATABASE_URL'])
+        if not self.enabled:
+            return
+        self._db = db
+        self.endpoints = [p.strip() for p in app.config['REPLICA_ENDPOINTS'].split(',') if p.strip()]
+        self.read_your_writes = app.config['REPLICA_READ_YOUR_WRITES']
+        self.max_lag = app.config['REPLICA_MAX_LAG']
+        self.check_interval = app.config['REPLICA_LAG_CHECK_INTERVAL']
+        
+        @app.before_request
+        def choose_database():
+            g.db_use_replica = self._eligible()
+        
+        @app.after_request
+        def remember_write(response):
+            if g.pop('db_wrote', False) and self.read_your_writes > 0:
+                session['db_primary_until'] = time.time() + self.read_your_writes
+            return response
+    
+    def use_replica(self):
+        return self.enabled and has_request_context() and g.get('db_use_replica', False)
+    
+    def _eligible(self):
+        if request.method not in ('GET', 'HEAD') or not request.endpoint:
+            return False
+        if not any(fnmatchcase(request.endpoint, pattern) for pattern in self.endpoints):
+            return False
+        if session.get('db_primary_until', 0) > time.time():
+            return False
+        return self.replica_healthy()
+    
+    def replica_healthy(self):
+        if time.monotonic() - self._checked_at >= self.check_interval:
+            # One thread refreshes, the rest go with the last known lag
+            if self._check_lock.acquire(blocking=False):
+                try:
+                    self.lag = self.check_lag()
+                    self._checked_at = time.monotonic()
+                finally:
+                    self._check_lock.release()
+        return self.lag is not None and self.lag <= self.max_lag
+    
+    def check_lag(self):
+        """Beat on the primary, then return seconds since the replica's last beat (None if unknown)"""
+        now = time.time()
+        try:
+            heartbeat(self._db.engines[None], now)
+            with self._db.engines[REPLICA_BIND].connect() as conn:
+                beat_at = conn.execute(text('SELECT beat_at FROM replica_heartbeat WHERE id = 1')).scalar()
+        except Exception as e:
+            print(f"Replica lag check failed: {e}")
+            return None
+        return None if beat_at is None else max(0.0, now - beat_at)
+
+def heartbeat(engine, now=None):
+    """Record the current time on the primary; replication carries it to the replica"""
+    now = time.time() if now is None else now
+    with engine.begin() as conn:
+        updated = conn.execute(text('UPDATE replica_heartbeat SET beat_at = :now WHERE id = 1'),
+                               {'now': now}).rowcount
+        if not updated:
+            conn.execute(text('INSERT INTO replica_heartbeat (id, beat_at) VALUES (1, :now)'), {'now': now})
+
+replica_router = ReplicaRouter()
@@ -1,8 +1,11 @@
-from flask import Blueprint, render_template, request, redirect, url_for, flash, jsonify
+from flask import Blueprint, abort, render_template, request, redirect, url_for, flash, jsonify
 from flask_login import login_required, current_user
-from app.models import User, Product, Order, OrderItem, UserRole, OrderStatus
+from app.models import User, Product, Order, OrderItem, ArchivedOrder, ArchivedOrderItem, UserRole, OrderStatus
 from app import db
-from sqlalchemy import func
+from app.archive import all_orders, all_order_items, get_order
+from app.perf import slow_query_log, sql_profiler
+from sqlalchemy import func, case, literal, union_all
+from sqlalchemy.orm import joinedload, selectinload, contains_eager
 from datetime import datetime, timedelta
 
 admin_bp = Blueprint('admin', __name__)
@@ -27,17 +30,21 @@ def dashboard():
     total_buyers = User.query.filter_by(role=UserRole.BUYER).count()
     pending_farmers = User.query.filter_by(role=UserRole.FARMER, is_approved=False).count()
     total_products = Product.query.count()
-    total_orders = Order.query.count()
+    total_orders = Order.query.count() + ArchivedOrder.query.count()
     
     # Recent orders
-    recent_orders = Order.query.order_by(Order.created_at.desc()).limit(10).all()
+    recent_orders = Order.query.options(
+        joinedload(Order.buyer),
+        joinedload(Order.farmer)
+    ).order_by(Order.created_at.desc()).limit(10).all()
     
     # Sales statistics (last 30 days)
     thirty_days_ago = datetime.utcnow() - timedelta(days=30)
-    recent_sales = Order.query.filter(
-        Order.created_at >= thirty_days_ago,
-        Order.status.in_([OrderStatus.COMPLETED, OrderStatus.READY])
-    ).with_entities(func.sum(Order.total_price)).scalar() or 0
+    orders = all_orders()
+    recent_sales = db.session.query(func.sum(orders.c.total_price)).filter(
+        orders.c.created_at >= thirty_days_ago,
+        orders.c.status.in_([OrderStatus.COMPLETED, OrderStatus.READY])
+    ).scalar() or 0
     
     return render_template('admin/dashboard.html',
                          total_users=total_users,
@@ -53,8 +60,61 @@ def dashboard():
 @login_required
 @admin_required
 def manage_farmers():
-    farmers = User.query.filter_by(role=UserRole.FARMER).order_by(User.created_at.desc()).all()
-    return render_template('admin/manage_farmers.html', farmers=farmers)
+    page = request.args.get('page', 1, type=int)
+    search = request.args.get('search', '')
+    
+    farmers_query = User.query.filter(User.role == UserRole.FARMER)
+    if search:
+        farmers_query = farmers_query.filter(
+            User.username.ilike(f'%{search}%') |
+            User.email.ilike(f'%{search}%') |
+            User.location.ilike(f'%{search}%')
+        )
+    order = (User.created_at.desc(), User.id.desc())
+    per_page = 20
+    
+    # Per-farmer product/order counts and revenue in one grouped subquery,
+    # so the page never touches farmer.products; only the farmers on this
+    # page are aggregated
+    page_ids = farmers_query.with_entities(User.id).order_by(*order).limit(per_page).offset(
+        (max(page, 1) - 1) * per_page
+    ).subquery()
+    orders = all_orders()
+    activity = union_all(
+        db.select(
+            Product.farmer_id.label('farmer_id'),
+            literal(1).label('is_product'),
+            literal(0).label('is_order'),
+            literal(0.0).label('revenue')
+        ).where(Product.farmer_id.in_(db.select(page_ids.c.id))),
+        db.select(
+            orders.c.farmer_id,
+            literal(0),
+            literal(1),
+            case((orders.c.status == OrderStatus.CANCELLED, 0.0), else_=orders.c.total_price)
+        ).where(orders.c.farmer_id.in_(db.select(page_ids.c.id)))
+    ).subquery()
+    farmer_stats = db.select(
+        activity.c.farmer_id,
+        func.sum(activity.c.is_product).label('product_count'),
+        func.sum(activity.c.is_order).label('order_count'),
+        func.sum(activity.c.revenue).label('revenue')
+    ).group_by(activity.c.farmer_id).subquery()
+    
+    query = farmers_query.with_entities(
+        User,
+        func.coalesce(farmer_stats.c.product_count, 0),
+        func.coalesce(farmer_stats.c.order_count, 0),
+        func.coalesce(farmer_stats.c.revenue, 0.0)
+    ).outerjoin(farmer_stats, farmer_stats.c.farmer_id == User.id)
+    
+    farmers = query.order_by(*order).paginate(
+        page=page, per_page=per_page, error_out=False
+    )
+    
+    return render_template('admin/manage_farmers.html',
+                         farmers=farmers,
+                         search=search)
 
 @admin_bp.route('/admin/farmers/<int:farmer_id>/approve', methods=['POST'])
 @login_required
@@ -66,6 +126,7 @@ def approve_farmer(farmer_id):
         return jsonify({'success': False, 'message': 'User is not a farmer'}), 400
     
     farmer.is_approved = True
+    farmer.invalidate_cache()
     db.session.commit()
     
     return jsonify({'success': True, 'message': 'Farmer approved successfully'})
@@ -83,6 +144,7 @@ def reject_farmer(farmer_id):
     Product.query.filter_by(farmer_id=farmer.id).delete()
     
     # Delete farmer account
+    farmer.invalidate_cache()
     db.session.delete(farmer)
     db.session.commit()
     
@@ -94,25 +156,38 @@ def reject_farmer(farmer_id):
 def manage_orders():
     page = request.args.get('page', 1, type=int)
     status_filter = request.args.get('status', '')
+    archived = request.args.get('archived', type=int) == 1
     
-    query = Order.query
+    # Live and archived orders are listed separately so this page only reads one table
+    model = ArchivedOrder if archived else Order
+    query = model.query.options(
+        joinedload(model.buyer),
+        joinedload(model.farmer)
+    )
     
     if status_filter:
         query = query.filter_by(status=OrderStatus(status_filter))
     
-    orders = query.order_by(Order.created_at.desc()).paginate(
+    orders = query.order_by(model.created_at.desc()).paginate(
         page=page, per_page=20, error_out=False
     )
     
     return render_template('admin/manage_orders.html', 
                          orders=orders,
-                         status_filter=status_filter)
+                         status_filter=status_filter,
+                         archived=archived)
 
 @admin_bp.route('/admin/orders/<int:order_id>')
 @login_required
 @admin_required
 def order_detail(order_id):
-    order = Order.query.get_or_404(order_id)
+    order = get_order(
+        order_id,
+        joinedload(Order.buyer),
+        selectinload(Order.items).joinedload(OrderItem.product).joinedload(Product.farmer)
+    )
+    if order is None:
+        abort(404)
     return render_template('admin/order_detail.html', order=order)
 
 @admin_bp.route('/admin/products')
@@ -122,7 +197,7 @@ def manage_products():
     page = request.args.get('page', 1, type=int)
     search = request.args.get('search', '')
     
-    query = Product.query.join(User)
+    query = Product.query.join(User).options(contains_eager(Product.farmer))
     
     if search:
         query = query.filter(
@@ -197,7 +272,12 @@ def delete_user(user_id):
     # Delete user's orders
     Order.query.filter_by(buyer_id=user.id).delete()
     Order.query.filter_by(farmer_id=user.id).delete()
+    archived_ids = db.select(ArchivedOrder.id).where(
+        (ArchivedOrder.buyer_id == user.id) | (ArchivedOrder.farmer_id == user.id))
+    ArchivedOrderItem.query.filter(ArchivedOrderItem.order_id.in_(archived_ids)).delete(synchronize_session=False)
+    ArchivedOrder.query.filter(ArchivedOrder.id.in_(archived_ids)).delete(synchronize_session=False)
     
+    user.invalidate_cache()
     db.session.delete(user)
     db.session.commit()
     
@@ -211,6 +291,7 @@ def block_user(user_id):
         return jsonify({'success': False, 'message': 'Cannot block your own account'}), 400
     user = User.query.get_or_404(user_id)
     user.is_blocked = True
+    user.invalidate_cache()
     db.session.commit()
     return jsonify({'success': True, 'message': 'User blocked successfully'})
 
@@ -222,6 +303,7 @@ def unblock_user(user_id):
         return jsonify({'success': False, 'message': 'Cannot unblock your own account'}), 400
     user = User.query.get_or_404(user_id)
     user.is_blocked = False
+    user.invalidate_cache()
     db.session.commit()
     return jsonify({'success': True, 'message': 'User unblocked successfully'})
 
@@ -229,38 +311,54 @@ def unblock_user(user_id):
 @login_required
 @admin_required
 def reports():
+    # Reports cover archived orders too
+    orders = all_orders()
+    items = all_order_items()
+    
     # Sales report
     sales_data = db.session.query(
-        func.date(Order.created_at).label('date'),
-        func.sum(Order.total_price).label('total_sales'),
-        func.count(Order.id).label('order_count')
+        func.date(orders.c.created_at).label('date'),
+        func.sum(orders.c.total_price).label('total_sales'),
+        func.count(orders.c.id).label('order_count')
     ).filter(
-        Order.status.in_([OrderStatus.COMPLETED, OrderStatus.READY])
+        orders.c.status.in_([OrderStatus.COMPLETED, OrderStatus.READY])
     ).group_by(
-        func.date(Order.created_at)
+        func.date(orders.c.created_at)
     ).order_by(
-        func.date(Order.created_at).desc()
+        func.date(orders.c.created_at).desc()
     ).limit(30).all()
     
     # Top products
     top_products = db.session.query(
         Product.name,
-        func.sum(OrderItem.quantity).label('total_sold'),
-        func.sum(OrderItem.quantity * OrderItem.price).label('total_revenue')
-    ).join(OrderItem).group_by(Product.id).order_by(
-        func.sum(OrderItem.quantity).desc()
+        func.sum(items.c.quantity).label('total_sold'),
+        func.sum(items.c.quantity * items.c.price).label('total_revenue')
+    ).join(items, items.c.product_id == Product.id).group_by(Product.id).order_by(
+        func.sum(items.c.quantity).desc()
     ).limit(10).all()
     
     # Top farmers
     top_farmers = db.session.query(
         User.username,
-        func.count(Order.id).label('order_count'),
-        func.sum(Order.total_price).label('total_revenue')
-    ).join(Order, User.id == Order.farmer_id).group_by(User.id).order_by(
-        func.sum(Order.total_price).desc()
+        func.count(orders.c.id).label('order_count'),
+        func.sum(orders.c.total_price).label('total_revenue')
+    ).join(orders, User.id == orders.c.farmer_id).group_by(User.id).order_by(
+        func.sum(orders.c.total_price).desc()
     ).limit(10).all()
     
     return render_template('admin/reports.html',
                          sales_data=sales_data,
                          top_products=top_products,
-                         top_farmers=top_farmers) 
\ No newline at end of file
+                         top_farmers=top_farmers) 
+
+@admin_bp.route('/admin/perf')
+@login_required
+@admin_required
+def perf():
+    return render_template('admin/perf.html',
+                         enabled=sql_profiler.enabled,
+                         worst_routes=sql_profiler.worst_routes(),
+                         recent_requests=sql_profiler.recent(50),
+                         slow_query_log_enabled=slow_query_log.enabled,
+                         slow_query_threshold_ms=slow_query_log.threshold * 1000,
+                         slow_queries=slow_query_log.recent(100))
\ No newline at end of file
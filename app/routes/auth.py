@@ -1,7 +1,8 @@
 from flask import Blueprint, render_template, redirect, url_for, flash, request
 from flask_login import login_user, logout_user, login_required, current_user
-from app.models import User, UserRole
+from app.models import User, UserRole, password_hash_method
 from app import db
+from app.login_security import hash_pool, login_throttle, HashPoolBusy
 from werkzeug.security import generate_password_hash
 import re
 
@@ -20,15 +21,34 @@ def login():
             flash('Please fill in all fields.', 'error')
             return render_template('auth/login.html')
         
+        # Reject floods before spending any CPU on password hashing
+        if not login_throttle.allow(request.remote_addr, email):
+            flash('Too many login attempts. Please wait a minute and try again.', 'error')
+            return render_template('auth/login.html'), 429
+        
         user = User.query.filter_by(email=email).first()
         
-        if user and user.check_password(password):
+        try:
+            password_ok = user is not None and hash_pool.run(user.check_password, password)
+        except (HashPoolBusy, TimeoutError):
+            flash('We are handling a lot of logins right now. Please try again shortly.', 'error')
+            return render_template('auth/login.html'), 503
+        
+        if password_ok:
             if user.is_blocked:
                 flash('Your account has been blocked by an admin. Please contact support.', 'error')
                 return render_template('auth/login.html')
             if user.role == UserRole.FARMER and not user.is_approved:
                 flash('Your account is pending approval by an admin.', 'warning')
                 return render_template('auth/login.html')
+            # Upgrade hashes made with older parameters while we have the password;
+            # if the pool is busy it waits for the next login
+            if user.password_needs_rehash():
+                try:
+                    user.password_hash = hash_pool.run(generate_password_hash, password, password_hash_method())
+                    db.session.commit()
+                except (HashPoolBusy, TimeoutError):
+                    pass
             login_user(user)
             next_page = request.args.get('next')
             if user.role == UserRole.ADMIN:
@@ -89,7 +109,12 @@ def signup():
             phone=phone,
             is_approved=role != 'farmer'  # Only buyers are auto-approved
         )
-        user.set_password(password)
+        # Hashed on the pool, like logins, so a burst of signups can't tie up request threads
+        try:
+            user.password_hash = hash_pool.run(generate_password_hash, password, password_hash_method())
+        except (HashPoolBusy, TimeoutError):
+            flash('We are handling a lot of signups right now. Please try again shortly.', 'error')
+            return render_template('auth/signup.html'), 503
         
         db.session.add(user)
         db.session.commit()
@@ -118,6 +143,7 @@ def edit_profile():
         current_user.username = request.form.get('username')
         current_user.location = request.form.get('location')
         current_user.phone = request.form.get('phone')
+        current_user.invalidate_cache()
         
         db.session.commit()
         flash('Profile updated successfully!', 'success')
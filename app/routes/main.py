@@ -1,14 +1,64 @@
 from flask import Blueprint, render_template, request, jsonify, flash, redirect, url_for
-from app.models import Product, User, UserRole
+from app.models import Product, User, UserRole, password_hash_method
 from app import db
-from sqlalchemy import or_
+from app.catalog import catalog, product_api_dict, API_FIELDS, DEFAULT_API_FIELDS
+from app.fast_json import json_response
+from app.metrics import metrics
+from app.login_security import hash_pool, HashPoolBusy
+from sqlalchemy import func, or_
+from sqlalchemy.orm import contains_eager
+from werkzeug.security import generate_password_hash
 
 main_bp = Blueprint('main', __name__)
 
+# ?sort= values for /products and /api/products (the catalog snapshot supports the same ones)
+API_SORTS = {
+    'id': (Product.id,),
+    'newest': (Product.created_at.desc(), Product.id.desc()),
+    'price_asc': (Product.price, Product.id),
+    'price_desc': (Product.price.desc(), Product.id.desc()),
+    'name': (func.lower(Product.name), Product.id),  # case-insensitive, like the snapshot
+    'popular': (Product.popularity_score.desc(), Product.id.desc()),
+}
+
+# Labels for the /products sort menu
+SORT_LABELS = {
+    'id': 'Default',
+    'popular': 'Best selling',
+    'newest': 'Newest',
+    'price_asc': 'Price: low to high',
+    'price_desc': 'Price: high to low',
+    'name': 'Name',
+}
+
+# Most ids /api/products/batch answers in one request
+PRODUCT_BATCH_MAX = 250
+# Largest id SQLite (and the driver) can bind
+PRODUCT_ID_MAX = 2 ** 63 - 1
+
+def _api_fields():
+    """The ?fields= selection, or None if it names an unknown field"""
+    fields = request.args.get('fields', '')
+    if not fields:
+        return DEFAULT_API_FIELDS
+    fields = tuple(dict.fromkeys(f.strip() for f in fields.split(',') if f.strip()))
+    if not fields or any(f not in API_FIELDS for f in fields):
+        return None
+    return fields
+
+def _api_products(products, fields):
+    # Snapshot records carry a prebuilt dict; ORM objects are converted here
+    dicts = [p.api_dict() if hasattr(p, 'api_dict') else product_api_dict(p) for p in products]
+    return [{f: d[f] for f in fields} for d in dicts]
+
+def _invalid_fields():
+    return json_response({'success': False,
+                          'message': f'fields must be a comma-separated list of: {", ".join(API_FIELDS)}'}, 400)
+
 @main_bp.route('/')
 def index():
     # Get featured products (available products from approved farmers)
-    featured_products = Product.query.join(User).filter(
+    featured_products = Product.query.join(User).options(contains_eager(Product.farmer)).filter(
         Product.available == True,
         User.is_approved == True,
         User.role == UserRole.FARMER
@@ -31,9 +81,28 @@ def products():
     category = request.args.get('category', '')
     min_price = request.args.get('min_price', type=float)
     max_price = request.args.get('max_price', type=float)
+    sort = request.args.get('sort', 'id')
+    if sort not in API_SORTS:
+        sort = 'id'
     
-    # Build query
-    query = Product.query.join(User).filter(
+    if catalog.enabled:
+        # Served from the in-memory snapshot without touching the database
+        snapshot = catalog.snapshot()
+        products = snapshot.page(snapshot.query(search=search, category=category, min_price=min_price,
+                                                max_price=max_price, sort=sort, search_location=True),
+                                 page, 12)
+        return render_template('main/products.html',
+                             products=products,
+                             categories=snapshot.categories,
+                             search=search,
+                             category=category,
+                             min_price=min_price,
+                             max_price=max_price,
+                             sort=sort,
+                             sorts=SORT_LABELS)
+    
+    # Build query - the farmer is loaded with the product for the card cache key
+    query = Product.query.join(User).options(contains_eager(Product.farmer)).filter(
         Product.available == True,
         User.is_approved == True,
         User.role == UserRole.FARMER
@@ -58,6 +127,8 @@ def products():
     if max_price is not None:
         query = query.filter(Product.price <= max_price)
     
+    query = query.order_by(*API_SORTS[sort])
+    
     # Pagination
     products = query.paginate(
         page=page, per_page=12, error_out=False
@@ -75,7 +146,9 @@ def products():
                          search=search,
                          category=category,
                          min_price=min_price,
-                         max_price=max_price)
+                         max_price=max_price,
+                         sort=sort,
+                         sorts=SORT_LABELS)
 
 @main_bp.route('/product/<int:product_id>')
 def product_detail(product_id):
@@ -103,7 +176,7 @@ def search():
     if not query:
         return redirect(url_for('main.products'))
     
-    products = Product.query.join(User).filter(
+    products = Product.query.join(User).options(contains_eager(Product.farmer)).filter(
         Product.available == True,
         User.is_approved == True,
         User.role == UserRole.FARMER,
@@ -125,38 +198,88 @@ def api_products():
     page = request.args.get('page', 1, type=int)
     search = request.args.get('search', '')
     category = request.args.get('category', '')
+    min_price = request.args.get('min_price', type=float)
+    max_price = request.args.get('max_price', type=float)
+    organic = request.args.get('organic')
+    organic = None if organic in (None, '') else organic.lower() in ('1', 'true', 'yes')
+    sort = request.args.get('sort', 'id')
+    fields = _api_fields()
+    if fields is None:
+        return _invalid_fields()
     
-    query = Product.query.join(User).filter(
-        Product.available == True,
-        User.is_approved == True,
-        User.role == UserRole.FARMER
-    )
-    
-    if search:
-        query = query.filter(
-            or_(
-                Product.name.ilike(f'%{search}%'),
-                Product.description.ilike(f'%{search}%')
-            )
+    if catalog.enabled:
+        snapshot = catalog.snapshot()
+        products = snapshot.page(snapshot.query(search=search, category=category, min_price=min_price,
+                                                max_price=max_price, organic=organic, sort=sort),
+                                 page, 12)
+    else:
+        query = Product.query.join(User).options(contains_eager(Product.farmer)).filter(
+            Product.available == True,
+            User.is_approved == True,
+            User.role == UserRole.FARMER
         )
+        
+        if search:
+            query = query.filter(
+                or_(
+                    Product.name.ilike(f'%{search}%'),
+                    Product.description.ilike(f'%{search}%')
+                )
+            )
+        
+        if category:
+            query = query.filter(Product.category == category)
+        if min_price is not None:
+            query = query.filter(Product.price >= min_price)
+        if max_price is not None:
+            query = query.filter(Product.price <= max_price)
+        if organic is not None:
+            query = query.filter(Product.organic == organic)
+        
+        query = query.order_by(*API_SORTS.get(sort, API_SORTS['id']))
+        products = query.paginate(page=page, per_page=12, error_out=False)
     
-    if category:
-        query = query.filter(Product.category == category)
-    
-    products = query.paginate(page=page, per_page=12, error_out=False)
-    
-    return jsonify({
-        'products': [{
-            'id': p.id,
-            'name': p.name,
-            'price': p.price,
-            'image': p.image,
-            'farmer_name': p.farmer.username,
-            'location': p.farmer.location
-        } for p in products.items],
+    return json_response({
+        'products': _api_products(products.items, fields),
         'has_next': products.has_next,
         'has_prev': products.has_prev,
-        'page': page
+        'page': page,
+        'total': products.total
+    })
+
+@main_bp.route('/api/products/batch')
+def api_products_batch():
+    """Look up specific products, e.g. for cart and wishlist widgets"""
+    try:
+        ids = [int(i) for i in request.args.get('ids', '').split(',') if i.strip()]
+        if any(not 1 <= i <= PRODUCT_ID_MAX for i in ids):
+            raise ValueError()
+    except ValueError:
+        return json_response({'success': False, 'message': 'ids must be a comma-separated list of product ids'}, 400)
+    ids = list(dict.fromkeys(ids))
+    if len(ids) > PRODUCT_BATCH_MAX:
+        return json_response({'success': False, 'message': f'At most {PRODUCT_BATCH_MAX} ids per request'}, 400)
+    fields = _api_fields()
+    if fields is None:
+        return _invalid_fields()
+    
+    if catalog.enabled:
+        snapshot = catalog.snapshot()
+        found = {i: snapshot.get(i) for i in ids}
+    else:
+        found = {}
+        if ids:
+            found = {p.id: p for p in Product.query.join(User).options(contains_eager(Product.farmer)).filter(
+                Product.id.in_(ids),
+                Product.available == True,
+                User.is_approved == True,
+                User.role == UserRole.FARMER
+            )}
+    
+    products = [found[i] for i in ids if found.get(i) is not None]
+    return json_response({
+        'products': _api_products(products, fields),
+        'missing': [i for i in ids if found.get(i) is None]
     })
 
 @main_bp.route('/about')
@@ -171,6 +294,11 @@ def health_check():
         'message': 'Farmers Market Hub is running'
     }), 200
 
+@main_bp.route('/metrics')
+def metrics_endpoint():
+    """Prometheus scrape endpoint"""
+    return metrics.response()
+
 @main_bp.route('/become-farmer', methods=['GET', 'POST'])
 def become_farmer():
     if request.method == 'POST':
@@ -192,7 +320,11 @@ def become_farmer():
         new_user.location = address
         new_user.role = UserRole.FARMER
         new_user.is_approved = False
-        new_user.set_password('changeme123')
+        try:
+            new_user.password_hash = hash_pool.run(generate_password_hash, 'changeme123', password_hash_method())
+        except (HashPoolBusy, TimeoutError):
+            flash('We are handling a lot of applications right now. Please try again shortly.', 'error')
+            return render_template('become_farmer.html'), 503
         db.session.add(new_user)
         db.session.commit()
         flash('Your application has been submitted! We will contact you soon.', 'success')
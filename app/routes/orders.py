@@ -1,8 +1,12 @@
-from flask import Blueprint, render_template, request, redirect, url_for, flash, jsonify, session
+from flask import Blueprint, Response, abort, render_template, request, redirect, url_for, flash, jsonify, session
 from flask_login import login_required, current_user
-from app.models import Product, Order, OrderItem, UserRole, OrderStatus, DeliveryType
+from app.models import Product, Order, OrderItem, ArchivedOrder, UserRole, OrderStatus, DeliveryType
+from app.archive import get_order
 from app import db
 from app.email_utils import send_order_confirmation, send_order_notification
+from app.metrics import metrics
+from app import inventory, popularity
+from app.order_events import order_events
 import json
 
 orders_bp = Blueprint('orders', __name__)
@@ -150,6 +154,8 @@ def checkout():
             })
             total += item_total
     if not cart_data:
+        if request.method == 'POST':
+            metrics.inc('checkout_outcomes_total', outcome='empty_cart')
         flash('Your cart is empty.', 'warning')
         return redirect(url_for('orders.cart'))
     
@@ -173,6 +179,7 @@ def checkout():
         notes = request.form.get('notes', '')
         
         if not all([shipping_address, shipping_city, shipping_state, shipping_zip]):
+            metrics.inc('checkout_outcomes_total', outcome='invalid_shipping')
             flash('Please provide complete shipping information.', 'error')
             return render_template('orders/checkout.html', cart_items=cart_items, total=total)
         
@@ -204,14 +211,27 @@ def checkout():
                 db.session.add(order_item)
                 
                 # Update product quantity
-                product.quantity -= quantity
-                if product.quantity <= 0:
-                    product.available = False
+                inventory.adjust(db.session, product, -quantity, inventory.SALE, order.id)
+                popularity.record_sale(product, quantity)
             
             order.calculate_total()
             orders_created.append(order)
         
+        # Quantities were decremented in SQL; reload them to catch a concurrent sell-out
+        db.session.flush()
+        for items in farmer_orders.values():
+            for item_data in items:
+                product = item_data['product']
+                if product.quantity < 0:
+                    db.session.rollback()
+                    metrics.inc('checkout_outcomes_total', outcome='sold_out')
+                    flash(f'Sorry, {product.name} sold out while you were checking out.', 'error')
+                    return redirect(url_for('orders.cart'))
+                if product.quantity <= 0:
+                    product.available = False
+        
         db.session.commit()
+        metrics.inc('checkout_outcomes_total', outcome='success')
         
         # Clear cart
         clear_cart()
@@ -234,17 +254,23 @@ def checkout():
 def my_orders():
     if current_user.role == UserRole.BUYER:
         orders = Order.query.filter_by(buyer_id=current_user.id).order_by(Order.created_at.desc()).all()
+        orders += ArchivedOrder.query.filter_by(buyer_id=current_user.id).order_by(ArchivedOrder.created_at.desc()).all()
     elif current_user.role == UserRole.FARMER:
         orders = Order.query.filter_by(farmer_id=current_user.id).order_by(Order.created_at.desc()).all()
+        orders += ArchivedOrder.query.filter_by(farmer_id=current_user.id).order_by(ArchivedOrder.created_at.desc()).all()
     else:
         orders = []
+    # Archived orders are older by update time, not necessarily by creation
+    orders.sort(key=lambda o: o.created_at, reverse=True)
     
     return render_template('orders/my_orders.html', orders=orders)
 
 @orders_bp.route('/order/<int:order_id>')
 @login_required
 def order_detail(order_id):
-    order = Order.query.get_or_404(order_id)
+    order = get_order(order_id)
+    if order is None:
+        abort(404)
     
     # Check access
     if current_user.role == UserRole.BUYER and order.buyer_id != current_user.id:
@@ -278,7 +304,23 @@ def update_order_status(order_id):
         print("Invalid status value")
         return jsonify({'success': False, 'message': 'Invalid status'}), 400
 
+    if order.status == OrderStatus.CANCELLED and new_status != OrderStatus.CANCELLED.value:
+        # Its stock has been returned and may be sold already, so a cancelled
+        # order stays cancelled; the buyer can order again
+        print("Cannot reopen a cancelled order")
+        return jsonify({'success': False, 'message': 'Cancelled orders cannot be reopened'}), 400
+
+    cancelling = new_status == OrderStatus.CANCELLED.value and order.status != OrderStatus.CANCELLED
     order.status = OrderStatus(new_status)
+    if cancelling:
+        # Cancelling returns the items to stock
+        products = [(item.product, item.quantity) for item in order.items if item.product]
+        for product, quantity in products:
+            inventory.adjust(db.session, product, quantity, inventory.CANCELLATION, order.id)
+        db.session.flush()
+        for product, quantity in products:
+            if product.quantity == quantity:
+                product.available = True  # it had sold out
     db.session.commit()
     print(f"Order {order_id} status updated to {order.status.value}")
 
@@ -290,6 +332,22 @@ def update_order_status(order_id):
 
     return jsonify({'success': True, 'status': order.status.value})
 
+@orders_bp.route('/api/orders/stream')
+@login_required
+def order_stream():
+    """Server-sent events with status changes to the current user's orders"""
+    if current_user.is_admin() or not order_events.enabled:
+        return jsonify({'success': False, 'message': 'Order stream not available'}), 404
+    
+    subscription = order_events.subscribe(current_user.id, request.headers.get('Last-Event-ID', type=int))
+    if subscription is None:
+        # EventSource gives up for good on any status but 200, so answer with
+        # an empty stream that only asks it to reconnect in 30 seconds
+        return Response('retry: 30000\n\n', mimetype='text/event-stream', headers={'Cache-Control': 'no-cache'})
+    
+    return Response(order_events.stream(subscription), mimetype='text/event-stream',
+                    headers={'Cache-Control': 'no-cache', 'X-Accel-Buffering': 'no'})
+
 @orders_bp.route('/api/cart-count')
 def cart_count():
     if not current_user.is_authenticated or current_user.is_admin():
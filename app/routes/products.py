@@ -1,18 +1,20 @@
-from flask import Blueprint, render_template, request, redirect, url_for, flash, current_app
+from flask import Blueprint, Response, render_template, request, redirect, url_for, flash, current_app, jsonify, stream_with_context
 from flask_login import login_required, current_user
 from app.models import Product, UserRole
-from app import db
+from app import db, images, inventory
+from app.product_import import export_products, import_products
+from app.metrics import metrics
+import csv
 import os
 from werkzeug.utils import secure_filename
-from PIL import Image
 import uuid
+import zipfile
 
 products_bp = Blueprint('products', __name__)
 
 def allowed_file(filename):
-    ALLOWED_EXTENSIONS = {'png', 'jpg', 'jpeg', 'gif'}
     return '.' in filename and \
-           filename.rsplit('.', 1)[1].lower() in ALLOWED_EXTENSIONS
+           filename.rsplit('.', 1)[1].lower() in images.ALLOWED_EXTENSIONS
 
 def save_image(file):
     if file and allowed_file(file.filename):
@@ -25,13 +27,22 @@ def save_image(file):
         file.save(filepath)
         
         # Resize image for web
-        with Image.open(filepath) as img:
-            img.thumbnail((800, 800))  # Max dimensions
-            img.save(filepath, quality=85, optimize=True)
+        metrics.inc('image_processing_queue_depth')
+        try:
+            images.resize(filepath)
+        finally:
+            metrics.dec('image_processing_queue_depth')
         
         return f"uploads/{unique_filename}"
     return None
 
+def sku_taken(sku, product_id=None):
+    """Whether another of the current farmer's products already uses sku"""
+    query = Product.query.filter(Product.farmer_id == current_user.id, Product.sku == sku)
+    if product_id is not None:
+        query = query.filter(Product.id != product_id)
+    return db.session.query(query.exists()).scalar()
+
 @products_bp.route('/farmer/products')
 @login_required
 def farmer_products():
@@ -42,6 +53,55 @@ def farmer_products():
     products = Product.query.filter_by(farmer_id=current_user.id).order_by(Product.created_at.desc()).all()
     return render_template('products/farmer_products.html', products=products)
 
+@products_bp.route('/farmer/products/import', methods=['GET', 'POST'])
+@login_required
+def import_products_csv():
+    if not current_user.is_farmer():
+        flash('Access denied. Farmers only.', 'error')
+        return redirect(url_for('main.index'))
+    
+    if not current_user.is_approved:
+        flash('Your account needs to be approved before you can add products.', 'warning')
+        return redirect(url_for('products.farmer_products'))
+    
+    if request.method == 'POST':
+        file = request.files.get('file')
+        if not file or not file.filename:
+            flash('Please choose a CSV file to import.', 'error')
+            return render_template('products/import_products.html')
+        images_zip = request.files.get('images')
+        images_zip = images_zip.stream if images_zip and images_zip.filename else None
+        
+        try:
+            report = import_products(db.engine, current_user.id, file.stream, images=images_zip,
+                                     chunk_size=current_app.config['PRODUCT_IMPORT_CHUNK_SIZE'],
+                                     max_errors=current_app.config['PRODUCT_IMPORT_MAX_ERRORS'])
+        except (UnicodeDecodeError, csv.Error, zipfile.BadZipFile) as e:
+            # Only the header and the images zip can fail this way; a bad row
+            # further down ends the import with a partial report instead
+            flash(f'Could not read the upload: {e}', 'error')
+            return render_template('products/import_products.html')
+        metrics.inc('product_import_rows_total', report.created, outcome='created')
+        metrics.inc('product_import_rows_total', report.updated, outcome='updated')
+        metrics.inc('product_import_rows_total', report.rejected, outcome='rejected')
+        
+        if request.accept_mimetypes.best == 'application/json':
+            return jsonify(report.as_dict())
+        return render_template('products/import_products.html', report=report)
+    
+    return render_template('products/import_products.html')
+
+@products_bp.route('/farmer/products/export')
+@login_required
+def export_products_csv():
+    if not current_user.is_farmer():
+        flash('Access denied. Farmers only.', 'error')
+        return redirect(url_for('main.index'))
+    
+    rows = export_products(db.engine, current_user.id)
+    return Response(stream_with_context(rows), mimetype='text/csv',
+                    headers={'Content-Disposition': 'attachment; filename=products.csv'})
+
 @products_bp.route('/farmer/products/new', methods=['GET', 'POST'])
 @login_required
 def new_product():
@@ -61,12 +121,17 @@ def new_product():
         category = request.form.get('category')
         unit = request.form.get('unit')
         organic = 'organic' in request.form
+        sku = request.form.get('sku', '').strip() or None
         
         # Validation
         if not all([name, price, stock, category, unit]):
             flash('Please fill in all required fields.', 'error')
             return render_template('products/new_product.html')
         
+        if sku and sku_taken(sku):
+            flash(f'You already have a product with SKU {sku}.', 'error')
+            return render_template('products/new_product.html')
+        
         try:
             price = float(price)
             stock = int(stock)
@@ -83,6 +148,7 @@ def new_product():
         
         # Create product
         product = Product(
+            sku=sku,
             name=name,
             description=description,
             price=price,
@@ -96,6 +162,8 @@ def new_product():
         )
         
         db.session.add(product)
+        db.session.flush()
+        inventory.append(db.session, product.id, stock, inventory.INITIAL)
         db.session.commit()
         
         flash('Product added successfully!', 'success')
@@ -118,10 +186,17 @@ def edit_product(product_id):
         return redirect(url_for('products.farmer_products'))
     
     if request.method == 'POST':
+        sku = request.form.get('sku', '').strip() or None
+        if sku and sku_taken(sku, product.id):
+            flash(f'You already have a product with SKU {sku}.', 'error')
+            return render_template('products/edit_product.html', product=product)
+        product.sku = sku
         product.name = request.form.get('name')
         product.description = request.form.get('description', '')
         product.price = float(request.form.get('price'))
-        product.quantity = int(request.form.get('stock'))
+        stock = int(request.form.get('stock'))
+        delta = stock - (product.quantity or 0)
+        inventory.adjust(db.session, product, delta, inventory.RESTOCK if delta > 0 else inventory.ADJUSTMENT)
         product.category = request.form.get('category')
         product.unit = request.form.get('unit')
         product.organic = 'organic' in request.form
@@ -0,0 +1,47 @@
+from sqlalchemy import event
+from sqlalchemy.engine import make_url
+
+# PRAGMAs applied to every new connection when SQLITE_PROFILE=production
+PRODUCTION_PRAGMAS = {
+    'journal_mode': 'WAL',
+    'synchronous': 'NORMAL',
+    'temp_store': 'MEMORY',
+}
+
+def is_file_sqlite(database_url):
+    url = make_url(database_url)
+    return url.get_backend_name() == 'sqlite' and url.database not in (None, '', ':memory:')
+
+def configure_engine_options(app):
+    """Set SQLALCHEMY_ENGINE_OPTIONS for the selected SQLite profile"""
+    if app.config['SQLITE_PROFILE'] != 'production':
+        return
+    if not is_file_sqlite(app.config['SQLALCHEMY_DATABASE_URI']):
+        return
+    
+    options = app.config.setdefault('SQLALCHEMY_ENGINE_OPTIONS', {})
+    # Keep a few connections per worker open so the PRAGMAs and page cache
+    # are not rebuilt on every request
+    options.setdefault('pool_size', app.config['SQLITE_POOL_SIZE'])
+    options.setdefault('max_overflow', app.config['SQLITE_MAX_OVERFLOW'])
+    connect_args = options.setdefault('connect_args', {})
+    # sqlite3's own lock wait, in seconds; busy_timeout below covers the rest
+    connect_args.setdefault('timeout', app.config['SQLITE_BUSY_TIMEOUT'] / 1000.0)
+    connect_args.setdefault('check_same_thread', False)
+
+def init_app(app, engine):
+    """Apply the production PRAGMAs to every connection the engine opens"""
+    if app.config['SQLITE_PROFILE'] != 'production' or engine.dialect.name != 'sqlite':
+        return
+    
+    pragmas = dict(PRODUCTION_PRAGMAS)
+    pragmas['busy_timeout'] = app.config['SQLITE_BUSY_TIMEOUT']
+    pragmas['mmap_size'] = app.config['SQLITE_MMAP_SIZE']
+    pragmas['cache_size'] = app.config['SQLITE_CACHE_SIZE']
+    
+    @event.listens_for(engine, 'connect')
+    def set_sqlite_pragmas(dbapi_connection, connection_record):
+        cursor = dbapi_connection.cursor()
+        for name, value in pragmas.items():
+            cursor.execute(f'PRAGMA {name}={value}')
+        cursor.close()
@@ -0,0 +1,79 @@
+from jinja2 import FileSystemBytecodeCache, TemplateError
+import os
+import shutil
+import threading
+import time
+
+class StartupTimer:
+    """Wall-clock cost of each create_app stage plus the first request"""
+    
+    def __init__(self, started=None):
+        self.started = started if started is not None else time.perf_counter()
+        self.stages = []
+        self._last = self.started
+    
+    def mark(self, stage):
+        now = time.perf_counter()
+        self.stages.append((stage, now - self._last))
+        self._last = now
+    
+    def add(self, stage, seconds):
+        self.stages.append((stage, seconds))
+    
+    def report(self):
+        total = sum(seconds for _, seconds in self.stages)
+        lines = ["Startup timing report:"]
+        for stage, seconds in self.stages:
+            lines.append(f"  {stage:<16} {seconds * 1000:8.1f} ms")
+        lines.append(f"  {'total':<16} {total * 1000:8.1f} ms")
+        return '\n'.join(lines)
+
+def init_app(app, timer):
+    """Record the first request's cost and optionally print the report"""
+    app.extensions['startup_timer'] = timer
+    state = {'started': None, 'done': False}
+    lock = threading.Lock()
+    
+    @app.before_request
+    def start_first_request_timer():
+        if state['started'] is None and not state['done']:
+            state['started'] = time.perf_counter()
+    
+    @app.after_request
+    def stop_first_request_timer(response):
+        if state['done'] or state['started'] is None:
+            return response
+        with lock:
+            if state['done']:
+                return response
+            state['done'] = True
+        timer.add('first_request', time.perf_counter() - state['started'])
+        if app.config['STARTUP_REPORT']:
+            print(timer.report())
+        return response
+
+def configure_template_cache(app):
+    """Load compiled templates from JINJA_BYTECODE_CACHE_DIR instead of recompiling per worker"""
+    cache_dir = app.config['JINJA_BYTECODE_CACHE_DIR']
+    if not cache_dir:
+        return
+    os.makedirs(cache_dir, mode=0o700, exist_ok=True)
+    app.jinja_env.bytecode_cache = FileSystemBytecodeCache(cache_dir)
+
+def precompile_templates(app, clear=True):
+    """Compile every template (filling the bytecode cache); returns (count, [(name, error)])"""
+    cache_dir = app.config['JINJA_BYTECODE_CACHE_DIR']
+    if clear and cache_dir:
+        # Bytecode from an older release would otherwise be reused as long
+        # as the template source is unchanged
+        shutil.rmtree(cache_dir, ignore_errors=True)
+        configure_template_cache(app)
+    
+    names = app.jinja_env.list_templates(extensions=['html', 'txt', 'xml'])
+    errors = []
+    for name in names:
+        try:
+            app.jinja_env.get_template(name)
+        except TemplateError as e:
+            errors.append((name, e))
+    return len(names), errors
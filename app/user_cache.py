@@ -0,0 +1,84 @@
+from collections import OrderedDict
+from sqlalchemy import inspect
+from sqlalchemy.orm import make_transient_to_detached
+from app import db
+import threading
+import time
+
+class UserCache:
+    """Per-process LRU + TTL cache of User rows for Flask-Login's user_loader.
+    
+    Entries are detached User snapshots that get merged into the request
+    session without a query. Once an entry is older than the TTL it is
+    revalidated against User.cache_version, so a change made by another
+    worker is picked up within USER_CACHE_TTL seconds.
+    """
+    
+    def __init__(self, maxsize=1024, ttl=30):
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+    
+    def init_app(self, app):
+        self.maxsize = app.config.get('USER_CACHE_SIZE', self.maxsize)
+        self.ttl = app.config.get('USER_CACHE_TTL', self.ttl)
+        self.clear()
+    
+    def get(self, user_id):
+        """Return a session-attached User for user_id, or None if it no longer exists"""
+        from app.models import User
+        
+        if self.ttl <= 0 or self.maxsize <= 0:
+            return db.session.get(User, user_id)
+        
+        with self._lock:
+            entry = self._entries.get(user_id)
+            if entry is not None:
+                self._entries.move_to_end(user_id)
+        
+        if entry is not None:
+            snapshot, version, expires_at = entry
+            if time.monotonic() < expires_at:
+                return db.session.merge(snapshot, load=False)
+            
+            # Expired - a version check is enough if nobody touched the row
+            row = db.session.query(User.cache_version).filter_by(id=user_id).first()
+            if row is not None and (row.cache_version or 0) == version:
+                self._store(user_id, snapshot, version)
+                return db.session.merge(snapshot, load=False)
+        
+        user = db.session.get(User, user_id)
+        if user is None:
+            self.evict(user_id)
+            return None
+        
+        self._store(user_id, self._snapshot(user), user.cache_version or 0)
+        return user
+    
+    def evict(self, user_id):
+        with self._lock:
+            self._entries.pop(user_id, None)
+    
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+    
+    def _store(self, user_id, snapshot, version):
+        with self._lock:
+            self._entries[user_id] = (snapshot, version, time.monotonic() + self.ttl)
+            self._entries.move_to_end(user_id)
+            while len(self._entries) > self.maxsize:
+                self._entries.popitem(last=False)
+    
+    @staticmethod
+    def _snapshot(user):
+        """Copy the loaded column values into a detached instance"""
+        mapper = inspect(type(user))
+        snapshot = mapper.class_(**{
+            attr.key: getattr(user, attr.key) for attr in mapper.column_attrs
+        })
+        make_transient_to_detached(snapshot)
+        return snapshot
+
+user_cache = UserCache()
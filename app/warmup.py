@@ -0,0 +1,150 @@
+from sqlalchemy import func, select, text
+from sqlalchemy.exc import OperationalError
+from app.catalog import catalog
+from app.metrics import metrics
+from app.user_cache import user_cache
+from urllib.parse import urlencode
+import time
+
+# Tables whose pages every shopper's request reads, hottest first
+HOT_TABLES = ('product', 'user', 'order', 'order_item')
+
+# Pages worth rendering once before real traffic; category, sort and
+# product pages are added from the catalog
+HOT_PAGES = ('/', '/products', '/products?page=2', '/api/products', '/login', '/signup', '/about')
+
+# Best sellers whose product pages are rendered
+HOT_PRODUCTS = 12
+
+# Recent buyers loaded into the user cache, on top of the approved farmers
+HOT_BUYERS = 200
+
+def warm_up(app, budget):
+    """Prime caches so the first shoppers don't pay for cold ones.
+    
+    Stages run in order - database pages, then the catalog snapshot, then
+    the users most likely to be logged in, then hot pages through the test
+    client - until budget seconds are used up; whatever is left over is
+    skipped, and a table scan still running at the deadline is interrupted.
+    Returns [(stage, seconds, done, total)].
+    """
+    deadline = time.perf_counter() + budget
+    report = []
+    with app.app_context():
+        for stage, run in (('database', _read_pages), ('catalog', _prime_catalog), ('users', _load_users),
+                           ('pages', _touch_pages)):
+            started = time.perf_counter()
+            done, total = run(app, deadline)
+            report.append((stage, time.perf_counter() - started, done, total))
+    return report
+
+def format_report(report):
+    lines = ["Warm-up report:"]
+    for stage, seconds, done, total in report:
+        skipped = f" ({total - done} skipped, over budget)" if done < total else ""
+        lines.append(f"  {stage:<10} {seconds * 1000:8.1f} ms  {done}/{total}{skipped}")
+    lines.append(f"  {'total':<10} {sum(seconds for _, seconds, _, _ in report) * 1000:8.1f} ms")
+    return '\n'.join(lines)
+
+def _read_pages(app, deadline):
+    # A full scan of each hot table and each of its indexes pulls their
+    # pages into the OS page cache, which every worker's connection shares
+    from app import db
+    engine = db.engines[None]
+    if engine.dialect.name != 'sqlite':
+        return 0, 0
+    quote = engine.dialect.identifier_preparer.quote
+    statements = []
+    for name in HOT_TABLES:
+        table = db.metadata.tables[name]
+        last = list(table.columns)[-1].name
+        statements.append(f"SELECT COUNT({quote(last)}) FROM {quote(name)} NOT INDEXED")
+        for index in sorted(table.indexes, key=lambda i: i.name):
+            column = list(index.columns)[0].name
+            statements.append(f"SELECT COUNT({quote(column)}) FROM {quote(name)} INDEXED BY {quote(index.name)}")
+    
+    done = 0
+    with engine.connect() as conn:
+        # A scan of a big table can outlast the budget on its own, so SQLite
+        # is asked every few thousand instructions whether to give up
+        dbapi_connection = conn.connection.dbapi_connection
+        dbapi_connection.set_progress_handler(lambda: time.perf_counter() >= deadline, 10000)
+        try:
+            for statement in statements:
+                if time.perf_counter() >= deadline:
+                    break
+                try:
+                    conn.execute(text(statement))
+                except OperationalError:
+                    if time.perf_counter() < deadline:
+                        raise
+                    # Interrupted at the deadline
+                    conn.rollback()
+                    break
+                done += 1
+        finally:
+            dbapi_connection.set_progress_handler(None, 0)
+    return done, len(statements)
+
+def _prime_catalog(app, deadline):
+    if not catalog.enabled or time.perf_counter() >= deadline:
+        return 0, int(catalog.enabled)
+    catalog.snapshot()
+    return 1, 1
+
+def _load_users(app, deadline):
+    # Farmers manage their shops and recent buyers check their orders, so
+    # their first request after a restart would otherwise miss the cache
+    from app import db
+    from app.models import Order, User, UserRole
+    if user_cache.ttl <= 0 or user_cache.maxsize <= 0:
+        return 0, 0
+    farmers = select(User.id).where(User.role == UserRole.FARMER, User.is_approved == True)
+    buyers = (select(Order.buyer_id).group_by(Order.buyer_id)
+              .order_by(func.max(Order.created_at).desc()).limit(HOT_BUYERS))
+    user_ids = list(dict.fromkeys(list(db.session.scalars(farmers)) + list(db.session.scalars(buyers))))
+    user_ids = user_ids[:user_cache.maxsize]
+    done = 0
+    try:
+        for user_id in user_ids:
+            if time.perf_counter() >= deadline:
+                break
+            user_cache.get(user_id)
+            done += 1
+    finally:
+        db.session.remove()
+    return done, len(user_ids)
+
+def _hot_urls():
+    urls = list(HOT_PAGES)
+    if catalog.enabled:
+        from app.routes.main import SORT_LABELS
+        snapshot = catalog.snapshot()
+        urls += [f'/products?{urlencode({"sort": sort})}' for sort in SORT_LABELS if sort != 'id']
+        urls += [f'/products?{urlencode({"category": category})}' for category in snapshot.categories]
+        urls += [f'/product/{product.id}'
+                 for product in snapshot.page(snapshot.query(sort='popular'), 1, HOT_PRODUCTS).items]
+    return urls
+
+def _touch_pages(app, deadline):
+    # Renders templates and fills the fragment cache (and its shared
+    # directory); not counted in the request metrics
+    if time.perf_counter() >= deadline:
+        # Listing the catalog's pages would build the snapshot
+        return 0, len(HOT_PAGES)
+    urls = _hot_urls()
+    client = app.test_client()
+    metrics_enabled, metrics.enabled = metrics.enabled, False
+    done = 0
+    try:
+        for url in urls:
+            if time.perf_counter() >= deadline:
+                break
+            response = client.get(url)
+            if response.status_code >= 500:
+                print(f"Warm-up request {url} failed with {response.status_code}")
+            response.close()
+            done += 1
+    finally:
+        metrics.enabled = metrics_enabled
+    return done, len(urls)
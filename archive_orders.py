@@ -0,0 +1,36 @@
+#!/usr/bin/env python3
+"""
+Order archival
+Moves COMPLETED and CANCELLED orders last updated more than
+ORDER_ARCHIVE_AFTER_DAYS ago, with their items, into the archive tables.
+Order pages and reports read both, so nothing disappears for users. Run
+it from cron, e.g. nightly:
+
+    python archive_orders.py
+    python archive_orders.py --days 30 --limit 50000
+"""
+
+from app import create_app, db
+from app.archive import archive_orders
+import argparse
+import time
+
+def main():
+    parser = argparse.ArgumentParser(description='Move finished orders into the archive tables')
+    parser.add_argument('--days', type=float, help='archive orders finished more than this many days ago '
+                                                   '(default ORDER_ARCHIVE_AFTER_DAYS)')
+    parser.add_argument('--chunk-size', type=int, help='orders per transaction (default ORDER_ARCHIVE_CHUNK_SIZE)')
+    parser.add_argument('--limit', type=int, help='stop after this many orders')
+    args = parser.parse_args()
+    
+    app = create_app()
+    days = args.days if args.days is not None else app.config['ORDER_ARCHIVE_AFTER_DAYS']
+    chunk_size = args.chunk_size or app.config['ORDER_ARCHIVE_CHUNK_SIZE']
+    
+    with app.app_context():
+        started = time.perf_counter()
+        moved = archive_orders(db.engines[None], days, chunk_size=chunk_size, limit=args.limit)
+        print(f"Archived {moved:,} orders older than {days:g} days in {time.perf_counter() - started:.1f}s")
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,87 @@
+"""
+Scaled benchmark dataset
+Bulk-inserts farmers, buyers, products and orders with SQLAlchemy Core so
+a database with tens of thousands of rows is ready in seconds.
+"""
+
+from datetime import datetime, timedelta
+import random
+
+PASSWORD = 'bench123'
+CATEGORIES = ['Vegetables', 'Fruits', 'Dairy & Eggs', 'Pantry', 'Herbs', 'Meat', 'Bakery']
+PRODUCE = ['Tomatoes', 'Sweet Corn', 'Eggs', 'Apples', 'Strawberries', 'Honey', 'Lettuce',
+           'Bell Peppers', 'Basil', 'Carrots', 'Potatoes', 'Spinach', 'Goat Cheese', 'Sourdough',
+           'Blueberries', 'Kale', 'Onions', 'Garlic', 'Peaches', 'Maple Syrup']
+ADJECTIVES = ['Fresh', 'Organic', 'Heirloom', 'Local', 'Farm', 'Sweet', 'Wild', 'Golden']
+LOCATIONS = ['Green Valley', 'Sunny Acres', 'Organic Hills', 'River Bend', 'Oak Ridge',
+             'Cedar Creek', 'Willow Farm', 'Maple Grove']
+
+def seed(db, farmers=200, products=5000, buyers=1000, orders=20000, seed=42, chunk_size=5000):
+    """Fill an empty schema and return ids useful to the scenarios"""
+    from app.models import User, UserRole, Product, Order, OrderItem, OrderStatus, DeliveryType
+    
+    rng = random.Random(seed)
+    now = datetime.utcnow()
+    password_hash = _password_hash(User)
+    
+    def insert(model, rows):
+        for start in range(0, len(rows), chunk_size):
+            db.session.execute(db.insert(model), rows[start:start + chunk_size])
+    
+    users = [dict(username='admin', email='admin@bench.local', role=UserRole.ADMIN,
+                  is_approved=True, is_blocked=False, password_hash=password_hash, created_at=now)]
+    users += [dict(username=f'farmer{i}', email=f'farmer{i}@bench.local', role=UserRole.FARMER,
+                   is_approved=i == 0 or rng.random() < 0.95, is_blocked=False, password_hash=password_hash,
+                   location=f'{rng.choice(LOCATIONS)} Farm {i}', created_at=now - timedelta(days=rng.randint(0, 720)))
+              for i in range(farmers)]
+    users += [dict(username=f'buyer{i}', email=f'buyer{i}@bench.local', role=UserRole.BUYER,
+                   is_approved=True, is_blocked=False, password_hash=password_hash,
+                   location=rng.choice(LOCATIONS), created_at=now - timedelta(days=rng.randint(0, 720)))
+              for i in range(buyers)]
+    insert(User, users)
+    
+    farmer_ids = [row.id for row in db.session.query(User.id).filter(User.role == UserRole.FARMER)]
+    buyer_ids = [row.id for row in db.session.query(User.id).filter(User.role == UserRole.BUYER)]
+    
+    rows = []
+    for i in range(products):
+        name = f'{rng.choice(ADJECTIVES)} {rng.choice(PRODUCE)}'
+        rows.append(dict(name=name, description=f'{name} grown at our farm, lot {i}',
+                         price=round(rng.uniform(0.5, 40), 2), quantity=10 ** 7,
+                         unit=rng.choice(['lb', 'each', 'dozen', 'jar', 'bundle']),
+                         organic=rng.random() < 0.4, available=rng.random() < 0.9,
+                         pickup_available=True, delivery_available=rng.random() < 0.5,
+                         delivery_fee=rng.choice([0.0, 1.5, 2.5]), category=rng.choice(CATEGORIES),
+                         farmer_id=rng.choice(farmer_ids), created_at=now, updated_at=now))
+    insert(Product, rows)
+    product_rows = db.session.query(Product.id, Product.farmer_id, Product.price).all()
+    
+    statuses = list(OrderStatus)
+    order_rows, item_rows = [], []
+    next_order_id = (db.session.query(db.func.max(Order.id)).scalar() or 0) + 1
+    for order_id in range(next_order_id, next_order_id + orders):
+        product_id, farmer_id, price = rng.choice(product_rows)
+        quantity = rng.randint(1, 5)
+        created_at = now - timedelta(minutes=rng.randint(0, 60 * 24 * 365))
+        order_rows.append(dict(id=order_id, buyer_id=rng.choice(buyer_ids), farmer_id=farmer_id,
+                               status=rng.choice(statuses), total_price=price * quantity,
+                               delivery_type=DeliveryType.PICKUP, delivery_fee=0.0,
+                               created_at=created_at, updated_at=created_at))
+        item_rows.append(dict(order_id=order_id, product_id=product_id, quantity=quantity, price=price))
+    insert(Order, order_rows)
+    insert(OrderItem, item_rows)
+    db.session.commit()
+    
+    return {
+        'product_ids': [row.id for row in product_rows],
+        'buyer_email': 'buyer0@bench.local',
+        'farmer_email': 'farmer0@bench.local',
+        'admin_email': 'admin@bench.local',
+        'password': PASSWORD,
+    }
+
+def _password_hash(User):
+    # Hash once and share it - per-user hashing would dominate seeding time
+    user = User()
+    user.set_password(PASSWORD)
+    return user.password_hash
@@ -0,0 +1,286 @@
+#!/usr/bin/env python3
+"""
+Hot route benchmark suite
+Seeds a scaled database, then measures throughput and p50/p95/p99 latency
+of the busiest pages, either in-process with Flask's test client or over
+HTTP against a local gunicorn.
+
+Usage:
+    python benchmarks/hot_routes.py run --products 20000 --output before.json
+    python benchmarks/hot_routes.py run --gunicorn --concurrency 4 --output after.json
+    python benchmarks/hot_routes.py compare before.json after.json --threshold 10
+"""
+
+import argparse
+import http.cookiejar
+import json
+import os
+import platform
+import random
+import re
+import socket
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+import urllib.error
+import urllib.parse
+import urllib.request
+
+ROOT = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..')
+sys.path.insert(0, ROOT)
+
+SHIPPING = {'shipping_address': '1 Bench St', 'shipping_city': 'Bench',
+            'shipping_state': 'BS', 'shipping_zip': '00000'}
+
+# name -> (role that must be logged in, request function)
+SCENARIOS = {
+    'index': (None, lambda c, d, rng: c.get('/')),
+    'products': (None, lambda c, d, rng: c.get('/products?page=%d' % rng.randint(1, 20))),
+    'products_filtered': (None, lambda c, d, rng: c.get(
+        '/products?category=Vegetables&min_price=2&max_price=20&page=%d' % rng.randint(1, 5))),
+    'search': (None, lambda c, d, rng: c.get('/search?q=' + rng.choice(['tomato', 'honey', 'valley']))),
+    'api_products': (None, lambda c, d, rng: c.get('/api/products?category=Fruits&page=%d' % rng.randint(1, 10))),
+    'product_detail': (None, lambda c, d, rng: c.get('/product/%d' % rng.choice(d['product_ids']))),
+    'cart_add': ('buyer', lambda c, d, rng: c.post('/cart/add/%d' % rng.choice(d['product_ids']),
+                                                   {'quantity': 1})),
+    'cart_update': ('buyer', lambda c, d, rng: c.post('/cart/update/%d' % rng.choice(d['product_ids'][:50]),
+                                                      {'quantity': rng.randint(1, 3)})),
+    'checkout': ('buyer', lambda c, d, rng: (
+        c.post('/cart/add/%d' % rng.choice(d['product_ids']), {'quantity': 1}),
+        c.post('/checkout', SHIPPING))[-1]),
+    'my_orders': ('buyer', lambda c, d, rng: c.get('/my-orders')),
+    'admin_dashboard': ('admin', lambda c, d, rng: c.get('/admin')),
+    'admin_reports': ('admin', lambda c, d, rng: c.get('/admin/reports')),
+}
+
+class TestClient:
+    """Flask test client with CSRF disabled"""
+    
+    def __init__(self, app):
+        self.client = app.test_client()
+    
+    def get(self, path):
+        return self.client.get(path).status_code
+    
+    def post(self, path, data=None):
+        return self.client.post(path, data=data or {}).status_code
+
+class HTTPClient:
+    """Cookie-keeping urllib client that sends the page's CSRF token"""
+    
+    def __init__(self, base_url):
+        self.base_url = base_url.rstrip('/')
+        self.opener = urllib.request.build_opener(
+            urllib.request.HTTPCookieProcessor(http.cookiejar.CookieJar()), _NoRedirect())
+        self.csrf_token = None
+    
+    def get(self, path):
+        status, body = self._request(path)
+        match = re.search(rb'name="csrf-token" content="([^"]+)"', body)
+        if match:
+            self.csrf_token = match.group(1).decode()
+        return status
+    
+    def post(self, path, data=None):
+        if self.csrf_token is None:
+            self.get('/login')
+        data = dict(data or {}, csrf_token=self.csrf_token)
+        return self._request(path, urllib.parse.urlencode(data).encode())[0]
+    
+    def _request(self, path, data=None):
+        try:
+            with self.opener.open(self.base_url + path, data=data, timeout=30) as response:
+                return response.status, response.read()
+        except urllib.error.HTTPError as e:
+            return e.code, e.read()
+
+class _NoRedirect(urllib.request.HTTPRedirectHandler):
+    def redirect_request(self, *args, **kwargs):
+        return None
+
+def percentile(sorted_values, pct):
+    if not sorted_values:
+        return 0.0
+    index = min(len(sorted_values) - 1, int(round(pct / 100.0 * (len(sorted_values) - 1))))
+    return sorted_values[index]
+
+def measure(make_client, dataset, name, iterations, warmup, concurrency, seed):
+    role, scenario = SCENARIOS[name]
+    latencies, errors = [], [0]
+    lock = threading.Lock()
+    
+    def worker(index):
+        client = make_client()
+        if role:
+            status = client.post('/login', {'email': dataset[f'{role}_email'], 'password': dataset['password']})
+            if status != 302:
+                raise RuntimeError(f'{name}: login as {role} failed with {status}')
+        rng = random.Random(seed + index)
+        for _ in range(warmup):
+            scenario(client, dataset, rng)
+        local, local_errors = [], 0
+        for _ in range(iterations // concurrency):
+            started = time.perf_counter()
+            status = scenario(client, dataset, rng)
+            local.append(time.perf_counter() - started)
+            if status >= 400:
+                local_errors += 1
+        with lock:
+            latencies.extend(local)
+            errors[0] += local_errors
+    
+    started = time.perf_counter()
+    threads = [threading.Thread(target=worker, args=(i,)) for i in range(concurrency)]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    elapsed = time.perf_counter() - started
+    
+    latencies.sort()
+    return {
+        'requests': len(latencies),
+        'errors': errors[0],
+        'throughput': len(latencies) / elapsed if elapsed else 0.0,
+        'p50_ms': percentile(latencies, 50) * 1000,
+        'p95_ms': percentile(latencies, 95) * 1000,
+        'p99_ms': percentile(latencies, 99) * 1000,
+    }
+
+def prepare_database(args, db_path):
+    os.environ['DATABASE_URL'] = f'sqlite:///{db_path}'
+    os.environ['DB_CREATE_ALL'] = 'True'
+    # Every benchmark thread logs in from the same address
+    os.environ['LOGIN_IP_BURST'] = '100000'
+    os.environ['LOGIN_EMAIL_BURST'] = '100000'
+    from app import create_app, db
+    from benchmarks import dataset
+    
+    app = create_app()
+    app.config['WTF_CSRF_ENABLED'] = False
+    with app.app_context():
+        started = time.perf_counter()
+        data = dataset.seed(db, farmers=args.farmers, products=args.products,
+                            buyers=args.buyers, orders=args.orders, seed=args.seed)
+        print(f"Seeded {args.products} products, {args.orders} orders in {time.perf_counter() - started:.1f}s")
+    return app, data
+
+def start_gunicorn(db_path, workers):
+    with socket.socket() as s:
+        s.bind(('127.0.0.1', 0))
+        port = s.getsockname()[1]
+    env = dict(os.environ, DATABASE_URL=f'sqlite:///{db_path}', DB_CREATE_ALL='False',
+               PORT=str(port), WEB_CONCURRENCY=str(workers))
+    proc = subprocess.Popen([sys.executable, '-m', 'gunicorn', 'run:app', '--bind', f'127.0.0.1:{port}'],
+                            cwd=ROOT, env=env, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+    base_url = f'http://127.0.0.1:{port}'
+    for _ in range(100):
+        try:
+            urllib.request.urlopen(base_url + '/health', timeout=1)
+            return proc, base_url
+        except OSError:
+            time.sleep(0.1)
+    proc.terminate()
+    raise RuntimeError('gunicorn did not start')
+
+def run(args):
+    names = args.scenarios.split(',') if args.scenarios else list(SCENARIOS)
+    with tempfile.TemporaryDirectory() as tmp:
+        db_path = args.db or os.path.join(tmp, 'bench.db')
+        app, data = prepare_database(args, db_path)
+        
+        proc = None
+        if args.gunicorn:
+            proc, base_url = start_gunicorn(db_path, args.workers)
+            make_client = lambda: HTTPClient(base_url)
+        else:
+            make_client = lambda: TestClient(app)
+        
+        results = {}
+        try:
+            for name in names:
+                results[name] = measure(make_client, data, name, args.iterations, args.warmup,
+                                        args.concurrency, args.seed)
+                r = results[name]
+                print(f"{name:<18} {r['throughput']:8.1f} req/s  p50 {r['p50_ms']:7.2f} ms  "
+                      f"p95 {r['p95_ms']:7.2f} ms  p99 {r['p99_ms']:7.2f} ms  errors {r['errors']}")
+        finally:
+            if proc:
+                proc.terminate()
+                proc.wait()
+    
+    report = {
+        'created_at': time.strftime('%Y-%m-%dT%H:%M:%S'),
+        'python': platform.python_version(),
+        'mode': 'gunicorn' if args.gunicorn else 'test_client',
+        'dataset': {'farmers': args.farmers, 'products': args.products,
+                    'buyers': args.buyers, 'orders': args.orders, 'seed': args.seed},
+        'concurrency': args.concurrency,
+        'results': results,
+    }
+    if args.output:
+        with open(args.output, 'w') as f:
+            json.dump(report, f, indent=2)
+        print(f"Results written to {args.output}")
+
+def compare(args):
+    with open(args.baseline) as f:
+        baseline = json.load(f)['results']
+    with open(args.candidate) as f:
+        candidate = json.load(f)['results']
+    
+    regressions = 0
+    print(f"{'scenario':<18} {'req/s':>18} {'p95 ms':>20} {'p99 ms':>20}")
+    for name in sorted(set(baseline) & set(candidate)):
+        old, new = baseline[name], candidate[name]
+        throughput_change = _change(old['throughput'], new['throughput'])
+        p95_change = _change(old['p95_ms'], new['p95_ms'])
+        p99_change = _change(old['p99_ms'], new['p99_ms'])
+        regressed = (throughput_change < -args.threshold or p95_change > args.threshold
+                     or new['errors'] > old['errors'])
+        regressions += regressed
+        print(f"{name:<18} {new['throughput']:9.1f} ({throughput_change:+6.1f}%) "
+              f"{new['p95_ms']:10.2f} ({p95_change:+6.1f}%) "
+              f"{new['p99_ms']:10.2f} ({p99_change:+6.1f}%)"
+              f"{'  REGRESSION' if regressed else ''}")
+    print(f"\n{regressions} regression(s) beyond {args.threshold}%")
+    return 1 if regressions else 0
+
+def _change(old, new):
+    return (new - old) / old * 100 if old else 0.0
+
+def main():
+    parser = argparse.ArgumentParser(description='Hot route benchmark suite')
+    sub = parser.add_subparsers(dest='command', required=True)
+    
+    run_parser = sub.add_parser('run', help='seed a database and benchmark the scenarios')
+    run_parser.add_argument('--farmers', type=int, default=200)
+    run_parser.add_argument('--products', type=int, default=5000)
+    run_parser.add_argument('--buyers', type=int, default=1000)
+    run_parser.add_argument('--orders', type=int, default=20000)
+    run_parser.add_argument('--seed', type=int, default=42)
+    run_parser.add_argument('--iterations', type=int, default=200, help='measured requests per scenario')
+    run_parser.add_argument('--warmup', type=int, default=10, help='unmeasured requests per client')
+    run_parser.add_argument('--concurrency', type=int, default=1)
+    run_parser.add_argument('--scenarios', help='comma-separated subset of: ' + ', '.join(SCENARIOS))
+    run_parser.add_argument('--gunicorn', action='store_true', help='benchmark a local gunicorn over HTTP')
+    run_parser.add_argument('--workers', type=int, default=2, help='gunicorn workers')
+    run_parser.add_argument('--db', help='SQLite file to seed (default: temporary)')
+    run_parser.add_argument('--output', help='write results as JSON')
+    
+    compare_parser = sub.add_parser('compare', help='flag regressions between two result files')
+    compare_parser.add_argument('baseline')
+    compare_parser.add_argument('candidate')
+    compare_parser.add_argument('--threshold', type=float, default=10.0,
+                                help='allowed change in percent before flagging')
+    
+    args = parser.parse_args()
+    if args.command == 'run':
+        run(args)
+    else:
+        sys.exit(compare(args))
+
+if __name__ == '__main__':
+    main()
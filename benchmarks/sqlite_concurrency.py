@@ -0,0 +1,129 @@
+#!/usr/bin/env python3
+"""
+SQLite concurrency benchmark
+Runs several worker processes doing a mix of catalog reads and checkouts
+against the same SQLite file, once per SQLITE_PROFILE, and prints the
+throughput and error count of each run.
+
+Usage: python benchmarks/sqlite_concurrency.py [--workers 4] [--seconds 10]
+"""
+
+import argparse
+import multiprocessing
+import os
+import random
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+
+FARMERS = 20
+PRODUCTS_PER_FARMER = 25
+BUYER_PASSWORD = 'bench123'
+
+def make_app(db_path, profile):
+    os.environ['DATABASE_URL'] = f'sqlite:///{db_path}'
+    os.environ['SQLITE_PROFILE'] = profile
+    # Every worker logs in once from the same test-client address
+    os.environ.setdefault('LOGIN_IP_BURST', '1000')
+    from app import create_app
+    app = create_app()
+    app.config['WTF_CSRF_ENABLED'] = False
+    return app
+
+def seed(db_path, profile, workers):
+    from app import db
+    from app.models import User, UserRole, Product
+    
+    app = make_app(db_path, profile)
+    with app.app_context():
+        db.create_all()
+        for i in range(FARMERS):
+            farmer = User(username=f'farmer{i}', email=f'farmer{i}@bench.local',
+                          role=UserRole.FARMER, is_approved=True, location=f'Farm {i}')
+            farmer.set_password(BUYER_PASSWORD)
+            db.session.add(farmer)
+        db.session.flush()
+        farmer_ids = [u.id for u in User.query.filter_by(role=UserRole.FARMER)]
+        categories = ['Vegetables', 'Fruits', 'Dairy & Eggs', 'Pantry', 'Herbs']
+        for farmer_id in farmer_ids:
+            for j in range(PRODUCTS_PER_FARMER):
+                db.session.add(Product(name=f'Product {farmer_id}-{j}', price=1 + j % 10,
+                                       quantity=10 ** 9, category=categories[j % len(categories)],
+                                       farmer_id=farmer_id, available=True))
+        for w in range(workers):
+            buyer = User(username=f'buyer{w}', email=f'buyer{w}@bench.local',
+                         role=UserRole.BUYER, is_approved=True)
+            buyer.set_password(BUYER_PASSWORD)
+            db.session.add(buyer)
+        db.session.commit()
+        return [p.id for p in Product.query.all()]
+
+def worker(db_path, profile, index, product_ids, seconds, write_ratio, results):
+    # Checkout prints e-mail failures when SMTP is not configured
+    sys.stdout = open(os.devnull, 'w')
+    app = make_app(db_path, profile)
+    client = app.test_client()
+    client.post('/login', data={'email': f'buyer{index}@bench.local', 'password': BUYER_PASSWORD})
+    rng = random.Random(index)
+    reads = checkouts = errors = 0
+    
+    deadline = time.perf_counter() + seconds
+    while time.perf_counter() < deadline:
+        if rng.random() < write_ratio:
+            client.post(f'/cart/add/{rng.choice(product_ids)}', data={'quantity': 1})
+            response = client.post('/checkout', data={
+                'shipping_address': '1 Bench St', 'shipping_city': 'Bench',
+                'shipping_state': 'BS', 'shipping_zip': '00000'
+            })
+            if response.status_code == 302:
+                checkouts += 1
+            else:
+                errors += 1
+        else:
+            response = client.get(f'/products?page={rng.randint(1, 5)}')
+            if response.status_code == 200:
+                reads += 1
+            else:
+                errors += 1
+    
+    results.put((reads, checkouts, errors))
+
+def run(profile, workers, seconds, write_ratio):
+    with tempfile.TemporaryDirectory() as tmp:
+        db_path = os.path.join(tmp, 'bench.db')
+        product_ids = seed(db_path, profile, workers)
+        
+        ctx = multiprocessing.get_context('spawn')
+        results = ctx.Queue()
+        procs = [ctx.Process(target=worker, args=(db_path, profile, i, product_ids,
+                                                  seconds, write_ratio, results))
+                 for i in range(workers)]
+        for p in procs:
+            p.start()
+        totals = [sum(col) for col in zip(*[results.get() for _ in procs])]
+        for p in procs:
+            p.join()
+    
+    reads, checkouts, errors = totals
+    print(f"{profile:>10}: {reads / seconds:8.1f} reads/s  {checkouts / seconds:8.1f} checkouts/s  "
+          f"{errors:6d} errors")
+    return totals
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--workers', type=int, default=4)
+    parser.add_argument('--seconds', type=float, default=10)
+    parser.add_argument('--write-ratio', type=float, default=0.2,
+                        help='fraction of operations that are checkouts')
+    parser.add_argument('--profiles', default='default,production')
+    args = parser.parse_args()
+    
+    print(f"{args.workers} workers, {args.seconds}s per profile, "
+          f"{args.write_ratio:.0%} checkouts")
+    for profile in args.profiles.split(','):
+        run(profile, args.workers, args.seconds, args.write_ratio)
+
+if __name__ == '__main__':
+    main()
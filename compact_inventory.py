@@ -0,0 +1,46 @@
+#!/usr/bin/env python3
+"""
+Inventory compaction
+Folds the inventory_movement ledger into per-product snapshots so a
+product's stock is its snapshot plus a short tail of movements, then
+checks Product.quantity against the ledger. Run it from cron, or keep it
+running:
+
+    python compact_inventory.py
+    python compact_inventory.py --every 300
+    python compact_inventory.py --fix
+"""
+
+from app import create_app, db, inventory
+import argparse
+import time
+
+def main():
+    parser = argparse.ArgumentParser(description='Compact the inventory ledger and reconcile stock')
+    parser.add_argument('--every', type=float, metavar='SECONDS', help='keep compacting every SECONDS')
+    parser.add_argument('--fix', action='store_true',
+                        help='set Product.quantity to the ledger stock where they disagree')
+    args = parser.parse_args()
+    
+    app = create_app()
+    grace = app.config['INVENTORY_COMPACT_GRACE_SECONDS']
+    chunk_size = app.config['INVENTORY_COMPACT_CHUNK_SIZE']
+    
+    with app.app_context():
+        while True:
+            started = time.perf_counter()
+            with db.engine.begin() as conn:
+                opened = inventory.open_balances(conn)
+            products, folded = inventory.compact(db.engine, grace_seconds=grace, chunk_size=chunk_size)
+            print(f"Opened {opened:,} balances, folded {folded:,} movements into {products:,} snapshots "
+                  f"in {(time.perf_counter() - started) * 1000:.0f} ms")
+            with db.engine.begin() as conn:
+                mismatches = inventory.reconcile(conn, fix=args.fix)
+            for product_id, quantity, ledger in mismatches:
+                print(f"Product {product_id}: quantity {quantity}, ledger {ledger}" + (" (fixed)" if args.fix else ""))
+            if not args.every:
+                break
+            time.sleep(args.every)
+
+if __name__ == '__main__':
+    main()
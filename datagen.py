@@ -0,0 +1,338 @@
+#!/usr/bin/env python3
+"""
+High-volume synthetic data generator
+Creates production-scale farmers, buyers, products and orders with
+realistic skew: a few farmers own most of the catalog, product and buyer
+activity follow a Zipf distribution, and order dates peak in summer and
+on market days. Rows are generated in deterministic chunks (optionally by
+several processes) and written with bulk Core inserts.
+
+Usage: python seed_data.py --farmers 10000 --products 1000000 \\
+           --buyers 500000 --order-items 5000000 --workers 4
+"""
+
+from bisect import bisect_right
+from datetime import datetime, timedelta
+from math import gcd, sin, pi
+import multiprocessing
+import random
+import time
+
+CATEGORIES = ['Vegetables', 'Fruits', 'Dairy & Eggs', 'Pantry', 'Herbs', 'Meat', 'Bakery', 'Flowers']
+PRODUCE = {
+    'Vegetables': ['Tomatoes', 'Sweet Corn', 'Lettuce', 'Bell Peppers', 'Carrots', 'Potatoes', 'Kale', 'Onions'],
+    'Fruits': ['Apples', 'Strawberries', 'Blueberries', 'Peaches', 'Plums', 'Pears', 'Melons'],
+    'Dairy & Eggs': ['Eggs', 'Goat Cheese', 'Butter', 'Yogurt', 'Raw Milk'],
+    'Pantry': ['Honey', 'Maple Syrup', 'Jam', 'Pickles', 'Salsa'],
+    'Herbs': ['Basil', 'Parsley', 'Cilantro', 'Mint', 'Rosemary'],
+    'Meat': ['Chicken', 'Ground Beef', 'Pork Chops', 'Sausages'],
+    'Bakery': ['Sourdough', 'Rye Bread', 'Muffins', 'Pie'],
+    'Flowers': ['Sunflowers', 'Tulips', 'Mixed Bouquet'],
+}
+ADJECTIVES = ['Fresh', 'Organic', 'Heirloom', 'Local', 'Farm', 'Sweet', 'Wild', 'Golden', 'Free-Range']
+UNITS = ['lb', 'each', 'dozen', 'jar', 'bundle', 'pint', 'head']
+PLACES = ['Green Valley', 'Sunny Acres', 'Organic Hills', 'River Bend', 'Oak Ridge', 'Cedar Creek',
+          'Willow', 'Maple Grove', 'Pine Hollow', 'Clover Field', 'Stone Brook', 'Red Barn']
+
+# Set by _init_worker in each process
+_plan = None
+
+class Plan:
+    """Sizes, id offsets and skew parameters shared by every chunk"""
+    
+    def __init__(self, farmers, products, buyers, order_items, seed=42, chunk_size=20000,
+                 zipf_s=1.0, days=730, password_hash='', id_offsets=None, now=None):
+        self.farmers = farmers
+        self.products = products
+        self.buyers = buyers
+        self.order_items = order_items
+        self.seed = seed
+        self.chunk_size = chunk_size
+        self.zipf_s = zipf_s
+        self.days = days
+        self.password_hash = password_hash
+        # Midnight, so the same seed gives the same rows all day
+        self.now = now or datetime.utcnow().replace(hour=0, minute=0, second=0, microsecond=0)
+        offsets = id_offsets or {}
+        self.user_offset = offsets.get('user', 1)
+        self.product_offset = offsets.get('product', 1)
+        self.order_offset = offsets.get('order', 1)
+        self.database_url = 'sqlite://'
+        
+        # A few farmers own most of the catalog: farmer f gets a share
+        # proportional to 1 / (f + 1) ** 0.8, as a contiguous id range
+        weights = [1.0 / (f + 1) ** 0.8 for f in range(farmers)]
+        scale = products / sum(weights) if farmers else 0
+        counts = [int(w * scale) for w in weights]
+        for f in range(products - sum(counts)):
+            counts[f % farmers] += 1
+        self.farmer_starts = []
+        start = 0
+        for count in counts:
+            self.farmer_starts.append(start)
+            start += count
+        self.farmer_counts = counts
+        
+        # Permutation so popular products are spread across farmers
+        self.product_stride = _coprime_stride(products)
+        self.buyer_stride = _coprime_stride(buyers)
+    
+    def farmer_of(self, product_index):
+        return bisect_right(self.farmer_starts, product_index) - 1
+    
+    def chunks(self, total):
+        return range((total + self.chunk_size - 1) // self.chunk_size)
+
+def _coprime_stride(n):
+    stride = 7919  # any prime larger than typical chunk patterns
+    while n and gcd(stride, n) != 1:
+        stride += 2
+    return stride
+
+def _rng(kind, chunk):
+    return random.Random(f'{_plan.seed}:{kind}:{chunk}')
+
+def _zipf_index(rng, n, s):
+    """0-based rank drawn from a continuous Zipf(s) approximation"""
+    u = rng.random()
+    if abs(s - 1.0) < 1e-9:
+        rank = (n + 1) ** u
+    else:
+        rank = (((n + 1) ** (1 - s) - 1) * u + 1) ** (1 / (1 - s))
+    return min(int(rank), n) - 1
+
+def _product_category(index):
+    return CATEGORIES[(index * 40503) % len(CATEGORIES)]
+
+def _product_price(index):
+    # Deterministic so order items can quote the product's price without a lookup
+    return round(0.5 + ((index * 2654435761) % 3950) / 100.0, 2)
+
+def _order_date(rng):
+    """Seasonal: busier in summer and on Saturdays (market day)"""
+    while True:
+        created_at = _plan.now - timedelta(minutes=rng.randint(0, _plan.days * 24 * 60))
+        season = 0.6 + 0.4 * sin(2 * pi * (created_at.timetuple().tm_yday - 100) / 365.0)
+        market_day = 1.0 if created_at.weekday() == 5 else 0.55
+        if rng.random() < season * market_day:
+            return created_at
+
+def _init_worker(plan):
+    global _plan
+    _plan = plan
+
+def generate_users(chunk):
+    from app.models import UserRole
+    plan = _plan
+    rng = _rng('users', chunk)
+    total = plan.farmers + plan.buyers
+    rows = []
+    for n in range(chunk * plan.chunk_size, min(total, (chunk + 1) * plan.chunk_size)):
+        is_farmer = n < plan.farmers
+        number = n if is_farmer else n - plan.farmers
+        kind = 'farmer' if is_farmer else 'buyer'
+        place = rng.choice(PLACES)
+        rows.append({
+            'id': plan.user_offset + n,
+            'username': f'gen_{kind}{number}',
+            'email': f'{kind}{number}@gen.farmersmarket.test',
+            'password_hash': plan.password_hash,
+            'role': UserRole.FARMER if is_farmer else UserRole.BUYER,
+            'is_approved': rng.random() < 0.95 if is_farmer else True,
+            'is_blocked': rng.random() < 0.002,
+            'location': f'{place} Farm' if is_farmer else place,
+            'phone': f'555-{rng.randint(1000, 9999)}',
+            'created_at': plan.now - timedelta(days=rng.randint(0, plan.days)),
+            'cache_version': 0,
+        })
+    return rows
+
+def generate_products(chunk):
+    plan = _plan
+    rng = _rng('products', chunk)
+    rows = []
+    for i in range(chunk * plan.chunk_size, min(plan.products, (chunk + 1) * plan.chunk_size)):
+        category = _product_category(i)
+        name = f'{rng.choice(ADJECTIVES)} {rng.choice(PRODUCE[category])}'
+        created_at = plan.now - timedelta(days=rng.randint(0, plan.days))
+        rows.append({
+            'id': plan.product_offset + i,
+            'name': name,
+            'description': f'{name} from {rng.choice(PLACES)}, harvested weekly.',
+            'price': _product_price(i),
+            'quantity': rng.randint(0, 500),
+            'unit': rng.choice(UNITS),
+            'organic': rng.random() < 0.35,
+            'image': None,
+            'available': rng.random() < 0.9,
+            'pickup_available': True,
+            'delivery_available': rng.random() < 0.4,
+            'delivery_fee': rng.choice([0.0, 1.5, 2.5, 4.0]),
+            'category': category,
+            'farmer_id': plan.user_offset + plan.farmer_of(i),
+            'created_at': created_at,
+            'updated_at': created_at,
+        })
+    return rows
+
+def generate_orders(chunk):
+    """Orders and their items for one chunk of exactly chunk_size items"""
+    from app.models import OrderStatus, DeliveryType
+    plan = _plan
+    rng = _rng('orders', chunk)
+    first_item = chunk * plan.chunk_size
+    items_left = min(plan.chunk_size, plan.order_items - first_item)
+    # Order ids are reserved per chunk so chunks stay independent
+    order_id = plan.order_offset + first_item
+    orders, items = [], []
+    while items_left > 0:
+        product = (_zipf_index(rng, plan.products, plan.zipf_s) * plan.product_stride) % plan.products
+        farmer = plan.farmer_of(product)
+        buyer = (_zipf_index(rng, plan.buyers, 0.7) * plan.buyer_stride) % plan.buyers
+        
+        count = min(items_left, 1 + min(4, int(rng.expovariate(0.7))))
+        start, size = plan.farmer_starts[farmer], plan.farmer_counts[farmer]
+        picked = {product}
+        while len(picked) < min(count, size):
+            picked.add(start + rng.randrange(size))
+        
+        created_at = _order_date(rng)
+        age_days = (plan.now - created_at).days
+        if rng.random() < 0.05:
+            status = OrderStatus.CANCELLED
+        elif age_days > 3:
+            status = OrderStatus.COMPLETED
+        else:
+            status = rng.choice([OrderStatus.PENDING, OrderStatus.CONFIRMED,
+                                 OrderStatus.PREPARING, OrderStatus.READY])
+        delivery = rng.random() < 0.3
+        delivery_fee = 2.5 if delivery else 0.0
+        
+        subtotal = 0.0
+        for p in picked:
+            quantity = rng.randint(1, 5)
+            price = _product_price(p)
+            subtotal += price * quantity
+            items.append({'order_id': order_id, 'product_id': plan.product_offset + p,
+                          'quantity': quantity, 'price': price})
+        orders.append({
+            'id': order_id,
+            'buyer_id': plan.user_offset + plan.farmers + buyer,
+            'farmer_id': plan.user_offset + farmer,
+            'status': status,
+            'total_price': round(subtotal + delivery_fee, 2),
+            'delivery_type': DeliveryType.DELIVERY if delivery else DeliveryType.PICKUP,
+            'delivery_address': f'{rng.randint(1, 999)} Main St' if delivery else None,
+            'delivery_fee': delivery_fee,
+            'notes': None,
+            'created_at': created_at,
+            'updated_at': created_at,
+        })
+        order_id += 1
+        items_left -= len(picked)
+    return orders, items
+
+class _TableWriter:
+    """INSERT compiled for the target dialect, with its bind processors.
+    
+    Rows are converted to DBAPI values in the generating process, so the
+    writing process only has to hand them to executemany.
+    """
+    
+    def __init__(self, table, dialect):
+        compiled = table.insert().compile(dialect=dialect)
+        self.sql = compiled.string
+        self.positional = compiled.positional
+        self.keys = list(compiled.positiontup) if compiled.positional else list(compiled.construct_params())
+        self.defaults = {}
+        self.processors = {}
+        for column in table.columns:
+            if column.default is not None and column.default.is_scalar:
+                self.defaults[column.key] = column.default.arg
+            processor = column.type.dialect_impl(dialect).bind_processor(dialect)
+            if processor:
+                self.processors[column.key] = processor
+    
+    def convert(self, rows):
+        converted = []
+        for row in rows:
+            values = []
+            for key in self.keys:
+                value = row.get(key, self.defaults.get(key))
+                processor = self.processors.get(key)
+                values.append(processor(value) if processor and value is not None else value)
+            converted.append(tuple(values) if self.positional else dict(zip(self.keys, values)))
+        return converted
+
+_writers = {}
+
+def _writer(table_name):
+    from app import db
+    from sqlalchemy.engine import make_url
+    if table_name not in _writers:
+        dialect = make_url(_plan.database_url).get_dialect()()
+        _writers[table_name] = _TableWriter(db.metadata.tables[table_name], dialect)
+    return _writers[table_name]
+
+GENERATORS = {
+    'users': (generate_users, ['user']),
+    'products': (generate_products, ['product']),
+    'orders': (generate_orders, ['order', 'order_item']),
+}
+
+def _run_chunk(task):
+    kind, chunk = task
+    fn, table_names = GENERATORS[kind]
+    result = fn(chunk)
+    batches = result if isinstance(result, tuple) else (result,)
+    return [(name, _writer(name).convert(rows)) for name, rows in zip(table_names, batches)]
+
+def generate(db, farmers=10000, products=1000000, buyers=500000, order_items=5000000,
+             seed=42, workers=0, chunk_size=20000):
+    """Append generated rows to the current app's database"""
+    from app.models import User, Product, Order
+    
+    if farmers < 1 or buyers < 1 or (order_items and products < 1):
+        raise ValueError('order items need at least one farmer, buyer and product')
+    
+    sample = User()
+    sample.set_password('password123')
+    plan = Plan(farmers, products, buyers, order_items, seed=seed, chunk_size=chunk_size,
+                password_hash=sample.password_hash, id_offsets={
+                    'user': (db.session.query(db.func.max(User.id)).scalar() or 0) + 1,
+                    'product': (db.session.query(db.func.max(Product.id)).scalar() or 0) + 1,
+                    'order': (db.session.query(db.func.max(Order.id)).scalar() or 0) + 1,
+                })
+    plan.database_url = db.engine.url.render_as_string(hide_password=False)
+    db.session.commit()
+    
+    _init_worker(plan)
+    pool = None
+    if workers > 1:
+        pool = multiprocessing.get_context().Pool(workers, initializer=_init_worker, initargs=(plan,))
+        mapper = lambda fn, tasks: pool.imap(fn, tasks)
+    else:
+        mapper = map
+    
+    def load(label, kind, total):
+        started = time.perf_counter()
+        rows_written = 0
+        for batches in mapper(_run_chunk, [(kind, chunk) for chunk in plan.chunks(total)]):
+            # One transaction per chunk keeps memory and lock time bounded
+            with db.engine.begin() as conn:
+                for table_name, rows in batches:
+                    if rows:
+                        conn.exec_driver_sql(_writer(table_name).sql, rows)
+                        rows_written += len(rows)
+        elapsed = time.perf_counter() - started
+        print(f"   • {label}: {rows_written:,} rows in {elapsed:.1f}s "
+              f"({rows_written / elapsed if elapsed else 0:,.0f} rows/s)")
+    
+    try:
+        load('users', 'users', farmers + buyers)
+        load('products', 'products', products)
+        load('orders + items', 'orders', order_items)
+    finally:
+        if pool:
+            pool.close()
+            pool.join()
@@ -0,0 +1,42 @@
+#!/usr/bin/env python3
+"""
+Popularity decay
+Scales every product's popularity_score so older sales count for less;
+a score halves every POPULARITY_HALF_LIFE_DAYS. Run it from cron every
+POPULARITY_DECAY_INTERVAL_HOURS, or keep it running:
+
+    python decay_popularity.py
+    python decay_popularity.py --every
+"""
+
+from app import create_app, db, popularity
+import argparse
+import time
+
+def main():
+    parser = argparse.ArgumentParser(description='Decay product popularity scores')
+    parser.add_argument('--every', action='store_true',
+                        help='keep decaying every POPULARITY_DECAY_INTERVAL_HOURS')
+    parser.add_argument('--recompute', action='store_true',
+                        help='reset scores to units sold before decaying (e.g. after a bulk import)')
+    args = parser.parse_args()
+    
+    app = create_app()
+    interval = app.config['POPULARITY_DECAY_INTERVAL_HOURS']
+    factor = popularity.decay_factor(interval, app.config['POPULARITY_HALF_LIFE_DAYS'])
+    
+    with app.app_context():
+        if args.recompute:
+            with db.engine.begin() as conn:
+                print(f"Recomputed {popularity.recompute(conn):,} product scores")
+        while True:
+            started = time.perf_counter()
+            with db.engine.begin() as conn:
+                count = popularity.decay(conn, factor)
+            print(f"Decayed {count:,} product scores by {factor:.4f} in {(time.perf_counter() - started) * 1000:.0f} ms")
+            if not args.every:
+                break
+            time.sleep(interval * 3600)
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,67 @@
+"""
+Gunicorn settings
+Loaded automatically by `gunicorn run:app` from the project root.
+"""
+
+import os
+
+# Order streams (/api/orders/stream) stay open for minutes. gevent workers
+# hold thousands of idle ones cheaply; without gevent, threaded workers cap
+# the streams at half their threads so ordinary requests always get one
+try:
+    import gevent  # noqa: F401 - in requirements.txt
+    default_worker_class = 'gevent'
+except ImportError:
+    default_worker_class = 'gthread'
+worker_class = os.environ.get('GUNICORN_WORKER_CLASS', default_worker_class)
+if worker_class == 'gevent':
+    # Patched here, before the master preloads the app, so the locks,
+    # threads and sockets it creates are gevent ones in every worker; the
+    # gevent worker only patches after the fork, which is too late for them
+    from gevent import monkey
+    monkey.patch_all()
+
+import shutil
+import tempfile
+
+bind = f"0.0.0.0:{os.environ.get('PORT', 5000)}"
+workers = int(os.environ.get('WEB_CONCURRENCY', 2))
+threads = int(os.environ.get('GUNICORN_THREADS', 16))
+worker_connections = int(os.environ.get('GUNICORN_WORKER_CONNECTIONS', 2000))
+if worker_class != 'gevent':
+    os.environ.setdefault('ORDER_STREAM_MAX_CONNECTIONS', str(max(threads // 2, 1)))
+    # Admission slots (app/admission.py) come out of the threads the streams leave,
+    # less two that stay free to turn requests away quickly
+    streams = int(os.environ['ORDER_STREAM_MAX_CONNECTIONS'])
+    os.environ.setdefault('ADMISSION_CAPACITY', str(max(threads - streams - 2, 2)))
+
+# Import the app once in the master so workers fork with warm modules
+preload_app = os.environ.get('GUNICORN_PRELOAD', 'True').lower() == 'true'
+
+# Workers share their metrics through this directory (see app/metrics.py)
+metrics_dir = os.environ.setdefault(
+    'METRICS_MULTIPROC_DIR', os.path.join(tempfile.gettempdir(), 'farmers-market-metrics'))
+
+def on_starting(server):
+    """Start every deploy with empty metric files"""
+    shutil.rmtree(metrics_dir, ignore_errors=True)
+    os.makedirs(metrics_dir, exist_ok=True)
+
+def post_worker_init(worker):
+    """Warm this worker's own caches - catalog snapshot, users, fragments - before it takes traffic"""
+    from run import app
+    from app import warmup
+    # worker.timeout is half the configured timeout, so the master never
+    # kills a worker for warming up
+    budget = min(app.config['WARMUP_BUDGET_SECONDS'], worker.timeout)
+    if budget > 0:
+        worker.log.info(warmup.format_report(warmup.warm_up(app, budget)))
+
+def post_fork(server, worker):
+    """Drop database connections inherited from the master process"""
+    if not preload_app:
+        return
+    from run import app
+    from app import db
+    with app.app_context():
+        db.engine.dispose(close=False)
@@ -0,0 +1,43 @@
+"""Make order and order_item ids AUTOINCREMENT
+
+Revision ID: b5c2d8e7f419
+Revises: f3b9d1e4a682
+Create Date: 2026-10-19 21:14:26.903518
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'b5c2d8e7f419'
+down_revision = 'f3b9d1e4a682'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    # Only SQLite reuses the ids of deleted rows; the tables are rebuilt
+    # with AUTOINCREMENT and their counters start past every archived id
+    if op.get_bind().dialect.name != 'sqlite':
+        return
+    for table, archive in (('order', 'order_archive'), ('order_item', 'order_item_archive')):
+        with op.batch_alter_table(table, schema=None, recreate='always',
+                                  table_kwargs={'sqlite_autoincrement': True}) as batch_op:
+            pass
+        op.execute(sa.text(
+            "DELETE FROM sqlite_sequence WHERE name = :table"
+        ).bindparams(table=table))
+        op.execute(sa.text(
+            f'INSERT INTO sqlite_sequence (name, seq) SELECT :table, MAX(COALESCE((SELECT MAX(id) FROM "{table}"), 0), '
+            f'COALESCE((SELECT MAX(id) FROM "{archive}"), 0))'
+        ).bindparams(table=table))
+
+
+def downgrade():
+    if op.get_bind().dialect.name != 'sqlite':
+        return
+    for table in ('order_item', 'order'):
+        with op.batch_alter_table(table, schema=None, recreate='always',
+                                  table_kwargs={'sqlite_autoincrement': False}) as batch_op:
+            pass
@@ -4,14 +4,15 @@ Database seeding script for test data
 Creates test users, products, and orders for demonstration
 """
 
-from app import create_app, db
+from app import create_app, db, inventory, popularity
 from app.models import User, UserRole, Product, Order, OrderItem, OrderStatus, DeliveryType
 from datetime import datetime, timedelta
+import argparse
 import random
 import os
 
-def seed_database():
-    """Seed the database with test data"""
+def seed_database(volume=None):
+    """Seed the database with test data, plus generated volume data if requested"""
     app = create_app()
     
     with app.app_context():
@@ -300,6 +301,9 @@ def seed_database():
         order2.calculate_total()
         
         db.session.commit()
+        with db.engine.begin() as conn:
+            popularity.recompute(conn)
+            inventory.open_balances(conn)
         
         print("✅ Database seeded successfully!")
         print("\n🔑 Test Credentials:")
@@ -323,6 +327,41 @@ def seed_database():
         print(f"   • {len(farmers) + 2} users (1 admin, 1 buyer, {len(farmers)} farmers)")
         print(f"   • {len(products)} products")
         print(f"   • 2 sample orders")
+        
+        if volume:
+            import datagen
+            print(f"\n🏭 Generating volume data (seed {volume['seed']})...")
+            started = datetime.utcnow()
+            datagen.generate(db, **volume)
+            with db.engine.begin() as conn:
+                popularity.recompute(conn)
+                inventory.open_balances(conn)
+            print(f"✅ Volume data generated in {(datetime.utcnow() - started).total_seconds():.0f}s")
+            print("   Generated users log in with password: password123")
+
+def parse_args():
+    parser = argparse.ArgumentParser(description='Seed the database with demo and optional volume data')
+    parser.add_argument('--large', action='store_true',
+                        help='production-scale preset: 10k farmers, 1M products, 500k buyers, 5M order items')
+    parser.add_argument('--farmers', type=int, help='generated farmers')
+    parser.add_argument('--products', type=int, help='generated products')
+    parser.add_argument('--buyers', type=int, help='generated buyers')
+    parser.add_argument('--order-items', type=int, help='generated order items')
+    parser.add_argument('--seed', type=int, default=42, help='random seed (same seed, same data)')
+    parser.add_argument('--workers', type=int, default=0, help='processes generating rows')
+    parser.add_argument('--chunk-size', type=int, default=20000, help='rows per insert transaction')
+    args = parser.parse_args()
+    
+    sizes = {'farmers': args.farmers, 'products': args.products,
+             'buyers': args.buyers, 'order_items': args.order_items}
+    if not args.large and all(v is None for v in sizes.values()):
+        return None
+    
+    defaults = ({'farmers': 10000, 'products': 1000000, 'buyers': 500000, 'order_items': 5000000}
+                if args.large else {'farmers': 100, 'products': 10000, 'buyers': 1000, 'order_items': 50000})
+    volume = {k: v if v is not None else defaults[k] for k, v in sizes.items()}
+    volume.update(seed=args.seed, workers=args.workers, chunk_size=args.chunk_size)
+    return volume
 
 if __name__ == '__main__':
-    seed_database()
\ No newline at end of file
+    seed_database(parse_args())
\ No newline at end of file
@@ -0,0 +1,56 @@
+#!/usr/bin/env python3
+"""
+Replica sync for local development
+Copies the primary SQLite database onto the REPLICA_DATABASE_URL file, the
+way streaming replication would on a real database. Run it once after
+seeding and again whenever the replica should catch up:
+
+    REPLICA_DATABASE_URL=sqlite:////tmp/replica.db python sync_replica.py
+    REPLICA_DATABASE_URL=sqlite:////tmp/replica.db python sync_replica.py --every 5
+"""
+
+from app import create_app, db
+from app.replica import REPLICA_BIND, heartbeat
+from app.sqlite_profile import is_file_sqlite
+from sqlalchemy.engine import make_url
+import argparse
+import sqlite3
+import time
+
+def sync(primary_url, replica_url):
+    """Beat on the primary, then copy it page by page into the replica"""
+    heartbeat(db.engines[None])
+    source = sqlite3.connect(make_url(primary_url).database)
+    target = sqlite3.connect(make_url(replica_url).database)
+    try:
+        source.backup(target)
+    finally:
+        target.close()
+        source.close()
+
+def main():
+    parser = argparse.ArgumentParser(description='Copy the primary SQLite database to the replica')
+    parser.add_argument('--every', type=float, help='keep syncing every N seconds')
+    args = parser.parse_args()
+    
+    app = create_app()
+    primary_url = app.config['SQLALCHEMY_DATABASE_URI']
+    replica_url = app.config['REPLICA_DATABASE_URL']
+    if not replica_url:
+        raise SystemExit('REPLICA_DATABASE_URL is not set')
+    if not (is_file_sqlite(primary_url) and is_file_sqlite(replica_url)):
+        raise SystemExit('sync_replica.py only copies SQLite files - use the database\'s own replication')
+    
+    with app.app_context():
+        # Release pooled replica connections so the copy isn't blocked
+        db.engines[REPLICA_BIND].dispose()
+        while True:
+            started = time.perf_counter()
+            sync(primary_url, replica_url)
+            print(f"Replica synced in {(time.perf_counter() - started) * 1000:.0f} ms")
+            if not args.every:
+                break
+            time.sleep(args.every)
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,26 @@
+"""
+Shared fixtures
+Each module gets its own app on a throwaway SQLite database filled with the
+benchmark dataset (see benchmarks/dataset.py).
+"""
+
+import pytest
+
+@pytest.fixture(scope='module')
+def make_app(tmp_path_factory):
+    """Factory for an app seeded with the benchmark dataset, at dataset.seed's keyword sizes"""
+    def make(**sizes):
+        from app import create_app, db
+        from benchmarks import dataset
+        directory = tmp_path_factory.mktemp('app')
+        with pytest.MonkeyPatch.context() as env:
+            env.setenv('DATABASE_URL', f"sqlite:///{directory / 'test.db'}")
+            env.setenv('UPLOAD_FOLDER', str(directory / 'uploads'))
+            env.setenv('METRICS_MULTIPROC_DIR', str(directory / 'metrics'))
+            env.setenv('DB_CREATE_ALL', 'true')
+            app = create_app()
+        app.config.update(TESTING=True, WTF_CSRF_ENABLED=False)
+        with app.app_context():
+            app.dataset = dataset.seed(db, **sizes)
+        return app
+    return make
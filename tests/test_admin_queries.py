@@ -0,0 +1,64 @@
+"""
+Admin page query counts
+Every admin page must run a fixed number of SQL statements however many
+farmers, products and orders there are - a count that grows with the data
+is an N+1 query. Each page is checked against two dataset sizes.
+"""
+
+from sqlalchemy import event
+import pytest
+
+SMALL = dict(farmers=5, products=20, buyers=5, orders=20)
+LARGE = dict(farmers=20, products=80, buyers=20, orders=80)
+
+# Statements per page once the admin's session is loaded
+ADMIN_PAGES = {
+    '/admin': 9,
+    '/admin/farmers': 2,
+    '/admin/orders': 2,
+    '/admin/orders/{order_id}': 2,
+    '/admin/products': 2,
+    '/admin/users': 2,
+    '/admin/reports': 3,
+}
+
+def login(client, email, password):
+    response = client.post('/login', data={'email': email, 'password': password})
+    assert response.status_code == 302, f"login as {email} failed"
+    return client
+
+class QueryCounter:
+    """Counts the SQL statements run on the app's engine inside the block"""
+    
+    def __init__(self, app):
+        from app import db
+        with app.app_context():
+            self.engine = db.engine
+        self.count = 0
+    
+    def __enter__(self):
+        event.listen(self.engine, 'before_cursor_execute', self._count)
+        return self
+    
+    def __exit__(self, *exc):
+        event.remove(self.engine, 'before_cursor_execute', self._count)
+    
+    def _count(self, *args):
+        self.count += 1
+
+@pytest.fixture(scope='module', params=[SMALL, LARGE], ids=['small', 'large'])
+def admin(request, make_app):
+    app = make_app(**request.param)
+    client = login(app.test_client(), app.dataset['admin_email'], app.dataset['password'])
+    return app, client
+
+@pytest.mark.parametrize('path, expected', ADMIN_PAGES.items(), ids=list(ADMIN_PAGES))
+def test_admin_page_query_count(admin, path, expected):
+    app, client = admin
+    path = path.format(order_id=1)
+    # The first request loads the session user and warms per-process caches
+    assert client.get(path).status_code == 200
+    with QueryCounter(app) as queries:
+        response = client.get(path)
+    assert response.status_code == 200
+    assert queries.count == expected, f"{path} ran {queries.count} statements, expected {expected}"
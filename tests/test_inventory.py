@@ -0,0 +1,79 @@
+"""
+Inventory ledger
+Product.quantity is what pages read; the ledger (snapshots plus the
+movements after them) must always agree with it, before and after
+compaction.
+"""
+
+from sqlalchemy import select
+import pytest
+
+SHIPPING = {'shipping_address': '1 Main St', 'shipping_city': 'Town', 'shipping_state': 'CA', 'shipping_zip': '90000'}
+
+def login(client, email, password):
+    response = client.post('/login', data={'email': email, 'password': password})
+    assert response.status_code == 302, f"login as {email} failed"
+    return client
+
+@pytest.fixture(scope='module')
+def app(make_app):
+    from app import db, inventory
+    app = make_app(farmers=3, products=12, buyers=2, orders=0)
+    with app.app_context():
+        with db.engine.begin() as conn:
+            inventory.open_balances(conn)
+    return app
+
+def ledger_matches(app):
+    from app import db, inventory
+    from app.models import Product
+    with app.app_context(), db.engine.connect() as conn:
+        quantities = dict(conn.execute(select(Product.id, Product.quantity)).all())
+        assert inventory.stock(conn, quantities) == quantities
+        assert inventory.reconcile(conn) == []
+
+def farmer0_products(app):
+    from app import db
+    from app.models import Product, User
+    with app.app_context():
+        return db.session.execute(select(Product.id, Product.quantity).join(User, User.id == Product.farmer_id)
+                                  .where(User.email == app.dataset['farmer_email'], Product.quantity > 2)
+                                  .order_by(Product.id)).all()
+
+def buy(app, product_id, quantity):
+    from app.models import Order
+    client = login(app.test_client(), app.dataset['buyer_email'], app.dataset['password'])
+    client.post(f'/cart/add/{product_id}', data={'quantity': quantity})
+    assert client.post('/checkout', data=SHIPPING).status_code == 302
+    with app.app_context():
+        return Order.query.order_by(Order.id.desc()).first().id
+
+def test_ledger_follows_checkout_and_cancellation(app):
+    from app import db, inventory
+    (product_id, quantity), (other_id, _) = farmer0_products(app)[:2]
+    order_id = buy(app, product_id, 2)
+    buy(app, other_id, 1)
+    assert dict(farmer0_products(app))[product_id] == quantity - 2
+    ledger_matches(app)
+    
+    farmer = login(app.test_client(), app.dataset['farmer_email'], app.dataset['password'])
+    assert farmer.post(f'/order/{order_id}/update-status', data={'status': 'cancelled'}).get_json()['success']
+    ledger_matches(app)
+    
+    with app.app_context():
+        assert inventory.compact(db.engine, grace_seconds=0)[1] > 0
+    ledger_matches(app)
+    
+    # A tail after the snapshot
+    buy(app, product_id, 1)
+    ledger_matches(app)
+
+def test_reconcile_finds_and_fixes_drift(app):
+    from app import db, inventory
+    from app.models import Product
+    product_id, quantity = farmer0_products(app)[0]
+    with app.app_context(), db.engine.begin() as conn:
+        conn.execute(db.update(Product).where(Product.id == product_id).values(quantity=quantity + 5))
+        assert inventory.stock(conn, [product_id]) == {product_id: quantity}
+        assert inventory.reconcile(conn, fix=True) == [(product_id, quantity + 5, quantity)]
+    ledger_matches(app)
@@ -0,0 +1,43 @@
+"""
+Product API
+/api/products/batch answers the same from the database, the in-memory
+catalog snapshot and the shared catalog file.
+"""
+
+import pytest
+
+SIZES = dict(farmers=3, products=20, buyers=1, orders=0)
+
+@pytest.fixture(scope='module', params=['database', 'snapshot', 'file'])
+def app(request, make_app, tmp_path_factory):
+    with pytest.MonkeyPatch.context() as env:
+        env.setenv('CATALOG_SNAPSHOT', 'false' if request.param == 'database' else 'true')
+        if request.param == 'file':
+            env.setenv('CATALOG_FILE', str(tmp_path_factory.mktemp('catalog') / 'catalog.bin'))
+        return make_app(**SIZES)
+
+def batch(app, ids, **params):
+    with app.app_context():
+        return app.test_client().get('/api/products/batch', query_string={'ids': ids, **params})
+
+def test_batch_returns_products_in_request_order(app):
+    ids = app.dataset['product_ids'][:3]
+    response = batch(app, ','.join(map(str, reversed(ids))) + ',999999', fields='id')
+    assert response.status_code == 200
+    body = response.get_json()
+    assert body['missing'] == [999999]
+    assert [p['id'] for p in body['products']] == [i for i in reversed(ids) if i not in body['missing']]
+
+@pytest.mark.parametrize('ids', ['0', '-1', str(2 ** 63), '1,' + str(2 ** 64), 'a'])
+def test_batch_rejects_ids_out_of_range(app, ids):
+    assert batch(app, ids).status_code == 400
+
+def test_snapshot_records_are_decoded_once(app):
+    from app.catalog import catalog
+    if not catalog.enabled:
+        pytest.skip('no catalog snapshot')
+    with app.app_context():
+        snapshot = catalog.snapshot()
+        product_id = next(i for i in app.dataset['product_ids'] if snapshot.get(i) is not None)
+        assert snapshot.get(product_id) is snapshot.get(product_id)
+        assert snapshot.get(product_id).api_dict() is snapshot.get(product_id).api_dict()
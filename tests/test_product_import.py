@@ -0,0 +1,66 @@
+"""
+Product CSV import
+A file that can't be read to the end still imports the rows before the bad
+spot, and the report says where it stopped.
+"""
+
+import csv
+import io
+import pytest
+
+HEADER = b'sku,name,price,quantity\n'
+
+def rows(start, count):
+    return b''.join(f'IMP-{i},Imported carrot {i},1.50,10\n'.encode() for i in range(start, start + count))
+
+def login(client, email, password):
+    response = client.post('/login', data={'email': email, 'password': password})
+    assert response.status_code == 302, f"login as {email} failed"
+    return client
+
+@pytest.fixture(scope='module')
+def farmer(make_app):
+    app = make_app(farmers=2, products=5, buyers=1, orders=0)
+    client = login(app.test_client(), app.dataset['farmer_email'], app.dataset['password'])
+    return app, client
+
+def upload(client, body, accept='application/json'):
+    return client.post('/farmer/products/import', data={'file': (io.BytesIO(body), 'products.csv')},
+                       headers={'Accept': accept}, content_type='multipart/form-data')
+
+def imported_skus(app):
+    from app import db
+    from app.models import Product
+    with app.app_context():
+        return {sku for sku, in db.session.query(Product.sku).filter(Product.sku.like('IMP-%'))}
+
+def oversized(sku):
+    return f'{sku},'.encode() + b'x' * (csv.field_size_limit() + 1) + b',1.00,1\n'
+
+def test_csv_error_stops_with_partial_report(farmer):
+    app, client = farmer
+    response = upload(client, HEADER + rows(0, 3) + oversized('IMP-X') + rows(3, 2))
+    assert response.status_code == 200
+    report = response.get_json()
+    assert report['created'] == 3
+    assert report['stopped']['line'] == 5
+    assert imported_skus(app) == {'IMP-0', 'IMP-1', 'IMP-2'}
+
+def test_bad_utf8_stops_with_partial_report(farmer):
+    app, client = farmer
+    # Well past the first block the decoder reads, so the rows before it parse
+    good = rows(100, 400)
+    response = upload(client, HEADER + good + b'IMP-BAD,Caf\xe9,1.00,1\n' + rows(500, 2))
+    assert response.status_code == 200
+    report = response.get_json()
+    assert report['created'] > 0
+    assert 1 < report['stopped']['line'] <= 402
+    skus = imported_skus(app)
+    assert len(skus & {f'IMP-{i}' for i in range(100, 500)}) == report['created']
+    assert not skus & {'IMP-BAD', 'IMP-500', 'IMP-501'}
+
+def test_stopped_import_page_names_the_line(farmer):
+    app, client = farmer
+    response = upload(client, HEADER + oversized('IMP-Y'), accept='text/html')
+    assert response.status_code == 200
+    assert b'Import stopped at line' in response.data